@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Catalog of a static files folder, built once at startup
+# Keyed by URL path ("sprites/0001_house_1_m.swf"), each entry has size, mtime, content hash and MIME type.
+# Hashes are kept in a manifest file between runs and only recomputed for files whose size or mtime changed.
+
+MANIFEST_WORKERS = int(os.environ.get("MANIFEST_WORKERS", 8))
+
+mimetypes.add_type("application/x-shockwave-flash", ".swf")
+mimetypes.add_type("application/wasm", ".wasm")
+
+def guess_mimetype(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+class AssetEntry():
+    __slots__ = ("path", "file", "size", "mtime", "hash", "mimetype", "variants")
+
+    def __init__(self, path: str, file: str, size: int, mtime: int, hash: str = None):
+        self.path = path
+        self.file = file
+        self.size = size
+        self.mtime = mtime # ns
+        self.hash = hash
+        self.mimetype = guess_mimetype(path)
+        self.variants = {} # encoding -> (file, size)
+
+def hash_file(file: str) -> str:
+    h = hashlib.sha1()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _scan(root: str) -> dict:
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            file = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(file)
+            except OSError:
+                continue
+            path = os.path.relpath(file, root).replace(os.sep, "/")
+            entries[path] = AssetEntry(path, file, st.st_size, st.st_mtime_ns)
+    return entries
+
+def _read_manifest_file(manifest_file: str) -> dict:
+    if not manifest_file or not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.decoder.JSONDecodeError):
+        print(f" [!] Ignoring corrupted asset manifest {manifest_file}")
+        return {}
+
+def _write_manifest_file(manifest_file: str, entries: dict):
+    tmp = manifest_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({path: [e.size, e.mtime, e.hash] for path, e in entries.items()}, f)
+    os.replace(tmp, manifest_file)
+
+def build_manifest(root: str, manifest_file: str = None, variants_root: str = None) -> dict:
+    start = time.perf_counter()
+    entries = _scan(root)
+
+    # Reuse hashes of unchanged files
+    known = _read_manifest_file(manifest_file)
+    to_hash = []
+    for path, entry in entries.items():
+        k = known.get(path)
+        if k and k[0] == entry.size and k[1] == entry.mtime:
+            entry.hash = k[2]
+        else:
+            to_hash.append(entry)
+
+    # hashlib releases the GIL, so threads hash in parallel
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=MANIFEST_WORKERS) as pool:
+            for entry, digest in zip(to_hash, pool.map(lambda e: hash_file(e.file), to_hash)):
+                entry.hash = digest
+        if manifest_file:
+            try:
+                _write_manifest_file(manifest_file, entries)
+            except OSError as e:
+                print(f" [!] Could not write asset manifest: {e}")
+
+    # Pre-built compressed variants (see static_assets.py --precompress)
+    if variants_root and os.path.isdir(variants_root):
+        for encoding, ext in (("br", ".br"), ("gzip", ".gz")):
+            for path, entry in entries.items():
+                variant = os.path.join(variants_root, path + ext)
+                try:
+                    st = os.stat(variant)
+                except OSError:
+                    continue
+                if st.st_mtime_ns >= entry.mtime:
+                    entry.variants[encoding] = (variant, st.st_size)
+
+    total = sum(e.size for e in entries.values())
+    print(f" * {len(entries)} files ({total / 1048576:.0f} MB) in {root}, {len(to_hash)} hashed, {time.perf_counter() - start:.2f}s")
+    return entries
+
+# Check game config against the assets
+
+def check_config_assets(entries: dict, config: dict, language: str = "en") -> dict:
+    missing = {"sprites": [], "thumbs": [], "images": [], "sounds": []}
+
+    for item in config["items"]:
+        img_name = item.get("img_name")
+        if not img_name:
+            continue
+        if f"sprites/{img_name}.swf" not in entries:
+            missing["sprites"].append(img_name)
+        if f"thumbs/{img_name}.jpg" not in entries:
+            missing["thumbs"].append(img_name)
+
+    for image, lang in config["images"].items():
+        if f"images/{lang or language}{image}" not in entries:
+            missing["images"].append(image)
+
+    for sound in config["sounds"]:
+        if f"sounds/{sound['file']}.mp3" not in entries:
+            missing["sounds"].append(sound["file"])
+
+    for kind in missing:
+        if missing[kind]:
+            names = ", ".join(sorted(set(missing[kind]))[:5])
+            print(f" [!] {len(missing[kind])} {kind} referenced by the game config are missing: {names}...")
+    return missing
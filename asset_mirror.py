@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import requests
+from flask import current_app, request, abort
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from asset_manifest import guess_mimetype
+import metrics
+
+# Asset mirror for slim builds shipped without the assets/ folder
+# Assets are fetched on demand from ASSETS_UPSTREAM (a folder or an http(s) URL) and kept in a disk cache.
+# - The cache is bounded to ASSETS_CACHE_MAX_MB, least recently used files are evicted first
+# - A miss is streamed to the client while it is written to the cache
+# - Concurrent misses for the same file wait for the first download instead of fetching it again
+# Downloads are written to "<file>.<pid>.<thread>.part" and renamed when complete. Workers sharing the
+# cache folder only delete each other's .part files once they are stale (not written for STALE_PART_SECONDS).
+
+ASSETS_UPSTREAM = os.environ.get("ASSETS_UPSTREAM", "").strip()
+ASSETS_CACHE_MAX_MB = int(os.environ.get("ASSETS_CACHE_MAX_MB", 1024))
+UPSTREAM_TIMEOUT = 30
+CHUNK_SIZE = 1 << 16
+STALE_PART_SECONDS = 10 * UPSTREAM_TIMEOUT
+
+class AssetMirror():
+    def __init__(self, upstream: str, cache_dir: str, max_bytes: int, max_age: int):
+        self.upstream = upstream
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.is_http = upstream.startswith("http://") or upstream.startswith("https://")
+        self.http = requests.Session() if self.is_http else None
+        self.lock = threading.Lock()
+        self.index = OrderedDict() # path -> (size, mtime), least recently used first
+        self.total = 0
+        self.inflight = {} # path -> threading.Event of the download in progress
+        self._load_cache()
+
+    def _load_cache(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached = []
+        now = time.time()
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                file = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(file)
+                except OSError:
+                    continue # renamed or removed by another worker
+                if filename.endswith(".part"):
+                    if now - st.st_mtime > STALE_PART_SECONDS:
+                        _remove(file) # interrupted download
+                    continue
+                cached.append((st.st_mtime_ns, os.path.relpath(file, self.cache_dir).replace(os.sep, "/"), st.st_size))
+        for mtime, path, size in sorted(cached):
+            self.index[path] = (size, mtime)
+            self.total += size
+        print(f" * Asset cache: {len(self.index)} files ({self.total / 1048576:.0f} MB) in {self.cache_dir}, upstream {self.upstream}")
+
+    # Serving
+
+    def send(self, path: str, retry: bool = True):
+        file = safe_join(self.cache_dir, path)
+        if file is None:
+            abort(404)
+
+        with self.lock:
+            cached = self.index.get(path)
+            if cached:
+                self.index.move_to_end(path)
+                leader = False
+            else:
+                event = self.inflight.get(path)
+                leader = event is None
+                if leader:
+                    event = self.inflight[path] = threading.Event()
+
+        if retry:
+            metrics.cache_requests.inc("assets", "hit" if cached else "miss" if leader else "wait")
+
+        if not cached and not leader:
+            # Someone else is downloading it
+            event.wait(UPSTREAM_TIMEOUT)
+            with self.lock:
+                cached = self.index.get(path)
+
+        if not leader:
+            response = self._send_cached(path, file, cached) if cached else None
+            if response is None:
+                # Upstream failed, or already evicted: try it ourselves once
+                if retry:
+                    return self.send(path, False)
+                abort(404)
+            return response
+
+        try:
+            size, chunks, source = self._open_upstream(path)
+        except Exception as e:
+            self._finish(path)
+            print(f" [!] Asset mirror: could not fetch {path}: {e}")
+            abort(502)
+        if chunks is None:
+            self._finish(path)
+            abort(404)
+
+        part = f"{file}.{os.getpid()}.{threading.get_ident()}.part"
+        response = current_app.response_class(self._stream(path, file, part, chunks), mimetype=guess_mimetype(path))
+        # The body may never be iterated (HEAD, or an error before it is sent): the download is
+        # released when the response is closed, which the WSGI server always does.
+        # Not direct_passthrough: werkzeug would hand the bare generator to the server and skip call_on_close
+        response.call_on_close(lambda: self._release(path, part, source))
+        if size is not None:
+            response.content_length = size
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def _send_cached(self, path: str, file: str, cached: tuple):
+        size, mtime = cached
+        try:
+            f = open(file, "rb")
+        except OSError:
+            # Evicted in the meantime
+            return None
+        response = current_app.response_class(wrap_file(request.environ, f), mimetype=guess_mimetype(path), direct_passthrough=True)
+        response.content_length = size
+        response.set_etag(f"{size}-{mtime}")
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+
+    # Upstream
+
+    def _open_upstream(self, path: str):
+        # Returns (size or None, chunk iterator, source to close), or (None, None, None) if upstream doesn't have it
+        if self.is_http:
+            r = self.http.get(self.upstream.rstrip("/") + "/" + path, stream=True, timeout=UPSTREAM_TIMEOUT)
+            if r.status_code == 404:
+                r.close()
+                return None, None, None
+            try:
+                r.raise_for_status()
+            except Exception:
+                r.close()
+                raise
+            size = r.headers.get("Content-Length")
+            return (int(size) if size else None), r.iter_content(CHUNK_SIZE), r
+
+        file = safe_join(self.upstream, path)
+        if file is None or not os.path.isfile(file):
+            return None, None, None
+        f = open(file, "rb")
+        return os.fstat(f.fileno()).st_size, iter(lambda: f.read(CHUNK_SIZE), b""), f
+
+    def _stream(self, path: str, file: str, part: str, chunks):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(part, "wb") as f:
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # Client went away: finish the download for the cache and whoever is waiting
+                for chunk in chunks:
+                    f.write(chunk)
+        os.replace(part, file)
+        st = os.stat(file)
+        with self.lock:
+            self.index[path] = (st.st_size, st.st_mtime_ns)
+            self.total += st.st_size
+            self._evict()
+
+    def _release(self, path: str, part: str, source):
+        # Runs when the leader's response is closed, after the body (if it was iterated at all)
+        source.close()
+        _remove(part) # left over if the download did not complete
+        self._finish(path)
+
+    def _finish(self, path: str):
+        with self.lock:
+            event = self.inflight.pop(path, None)
+        if event:
+            event.set()
+
+    def _evict(self):
+        # Called with the lock held
+        while self.total > self.max_bytes and len(self.index) > 1:
+            path, (size, mtime) = self.index.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, path))
+            except OSError:
+                pass
+
+def _remove(file: str):
+    try:
+        os.remove(file)
+    except OSError:
+        pass
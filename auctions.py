@@ -1,9 +1,32 @@
 import json
 import os
+import time
+import heapq
+import threading
+import atexit
+
+import codec
 
 from bundle import AUCTIONS_DIR, CONFIG_DIR
-from engine import timestamp_now
+from engine import timestamp_now, add_store_item
 from get_game_config import get_name_from_item_id
+from sessions import session, save_session
+
+# Auction House
+# - Auction configs are indexed by uuid
+# - A min-heap of (due time, uuid) tells which auctions have expired, so only those are looked at
+# - Expired auctions are settled by the background scheduler (scheduler.py), not by requests:
+#   the winner gets the unit in their store and the auction moves on to its next round
+# - State changes are written to auctions/auctions.json at most once every STATE_WRITE_DELAY seconds,
+#   by the scheduler thread, through a temporary file, and flushed at exit
+# - The state lives in the memory of one process: run a single worker (gunicorn -w 1, with threads
+#   for concurrency). Several workers would each hold their own copy and overwrite each other's file.
+
+# - Bids only lock their own auction; bid lists are replaced instead of appended to (copy-on-write),
+#   so state writes and readers never see a list being modified
+
+STATE_WRITE_DELAY = 2 # seconds
+MAX_BID_HISTORY = 50 # bids kept in betUsers/bidders per auction
 
 class AuctionHouse():
     def __init__(self):
@@ -22,6 +45,7 @@ class AuctionHouse():
             self.config = json.load(open(self.FILE_AH_CONFIG))
         else:
             print("No Auction House config exists")
+        self.configs = {str(auction["uuid"]): auction for auction in self.config["auctions"]}
 
         # STATE
         self.auction_state = {
@@ -29,29 +53,92 @@ class AuctionHouse():
         }
         if not os.path.exists(self.PATH_AH_STATE):
             os.makedirs(self.PATH_AH_STATE)
-        if os.path.exists(self.FILE_AH_CONFIG):
-            self.auction_state = json.load(open(self.FILE_AH_STATE))
-            self.auctions = self.auction_state["auctions"]
+        if os.path.exists(self.FILE_AH_STATE):
+            try:
+                self.auction_state = codec.load(open(self.FILE_AH_STATE, "rb"))
+            except json.decoder.JSONDecodeError:
+                print("Error: Corrupted Auction House state, starting over")
+        self.auctions = self.auction_state["auctions"]
+
+        self.lock = threading.RLock() # heap, state writes
+        self.bet_locks = {uuid: threading.Lock() for uuid in self.configs} # one per auction
+        self.expiry = [] # heap of (due time, uuid)
+        self.due = {} # uuid -> due time of its live heap entry
+        self.dirty = False # a state write is scheduled
+        self.awards = [] # (winner, unit) of settled auctions, given outside the locks
+        self.scheduler = None
+        atexit.register(self.flush)
 
         self.init_auctions()
 
     def init_auctions(self):
         updated = self._remove_auctions()
-        updated |= self.update_all_auctions(timestamp_now(), update=False)
+        time_now = timestamp_now()
+        for auction in self.config["auctions"]:
+            updated |= self.update_auction(auction, time_now)
 
         if updated:
             self._write_state()
+        self._give_awards()
+
+    def start_settlement(self, scheduler):
+        self.scheduler = scheduler
+        self._schedule_settlement()
+
+    def _schedule_settlement(self):
+        with self.lock:
+            if self.expiry:
+                self.scheduler.schedule(self.expiry[0][0], "auctions", self._settle)
+
+    def _settle(self):
+        self.update_all_auctions(timestamp_now())
+        self._schedule_settlement()
 
     def update_all_auctions(self, time_now: int, update: bool = True):
+        # Only auctions whose due time has passed are updated
         updated = False
-        for auction in self.config["auctions"]:
-            updated |= self.update_auction(auction, time_now)
-
-        if update and updated:
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= time_now:
+                due, uuid = heapq.heappop(self.expiry)
+                if self.due.get(uuid) != due:
+                    continue # rescheduled since
+                del self.due[uuid]
+                auction = self.configs.get(uuid)
+                if auction:
+                    updated |= self.update_auction(auction, time_now)
+
+        if self.awards:
+            # Written right away so a restart doesn't give the same unit twice
             self._write_state()
+            self._give_awards()
+        elif update and updated:
+            self._mark_dirty()
 
         return updated
 
+    def _give_awards(self):
+        with self.lock:
+            awards = self.awards
+            self.awards = []
+        for winner, unit in awards:
+            user_id = winner["user_id"]
+            name = get_name_from_item_id(unit)
+            save = session(user_id)
+            if not save:
+                print(f"Auction winner {user_id} of {name} not found!")
+                continue
+            default_map = save["playerInfo"]["default_map"]
+            add_store_item(save["maps"][default_map], unit)
+            save_session(user_id)
+            print(f"Auction for {name} won by {user_id} with a bet of {winner['bet']}")
+
+    def _schedule(self, uuid: str):
+        # Called with the lock held
+        due = self.auctions[uuid]["endDate"] + 1
+        if self.due.get(uuid) != due:
+            self.due[uuid] = due
+            heapq.heappush(self.expiry, (due, uuid))
+
     def _remove_auctions(self):
         # Remove auctions that don't exist in config anymore to allow for changes
         to_delete = []
@@ -65,23 +152,21 @@ class AuctionHouse():
         return len(to_delete) > 0
 
     def get_auction_config(self, uuid: str):
-        for auction in self.config["auctions"]:
-            if auction["uuid"] == uuid:
-                return auction
-
-        return None
+        return self.configs.get(uuid)
 
     def update_auction(self, auction: dict, time_now: int):
         uuid = str(auction["uuid"])
         seconds = auction["interval"] * 60
 
         updated = False
-        if uuid in self.auctions:
-            updated |= self._update_auction(self.auctions[uuid], uuid, auction, seconds, time_now)
-        else:
-            updated |= self._create_auction(uuid, auction, seconds, time_now)
+        with self.lock, self.bet_locks[uuid]:
+            if uuid in self.auctions:
+                updated |= self._update_auction(self.auctions[uuid], uuid, auction, seconds, time_now)
+            else:
+                updated |= self._create_auction(uuid, auction, seconds, time_now)
+            self._schedule(uuid)
 
-        return updated    
+        return updated
 
     # Creates auction on AH
     def _create_auction(self, uuid: str, auction: dict, seconds: int, time_now: int):
@@ -117,17 +202,16 @@ class AuctionHouse():
 
         # Just see if it needs updating
         if time_now > bet["endDate"]:
-            if len(bet["betUsers"]) > 0 and time_now - bet["endDate"] < 60:
-                return False
             difference = time_now - bet["endDate"]
-            
-            # TODO: rounds
 
-            # How many times this item has expired
+            # How many more rounds ended while nobody looked (e.g. server down)
             count_expired = difference // seconds
             # How many seconds should have passed since new entry was generated
             remaining = difference % seconds
 
+            if len(bet["betUsers"]) > 0:
+                self.awards.append((bet["betUsers"][-1], bet["idUnit"]))
+
             bet["level"] = auction["level"]
             bet["beginDate"] = time_now - remaining
             bet["endDate"] = bet["beginDate"] + seconds
@@ -135,28 +219,53 @@ class AuctionHouse():
             bet["currentPrice"] = auction["price"]
             bet["priceIncrement"] = auction["priceIncrement"]
             bet["betPrice"] = auction["betPrice"]
-            bet["round"] = 1
+            bet["round"] += 1 + count_expired
+            bet["betUsersPrev"] = bet["betUsers"] if count_expired == 0 else []
+            bet["prevRoundBidders"] = bet["bidders"] if count_expired == 0 else []
             bet["betUsers"] = []
-            bet["betUsersPrev"] = []
             bet["bidders"] = []
-            bet["prevRoundBidders"] = []
-            bet["userRounds"] = []
-
-            # print(json.dumps(bet, indent="\t"))
 
             name = get_name_from_item_id(auction["unit"])
-            print(f"Restarted auction for {name} as it expired! -> UUID: {uuid}")
+            print(f"Auction for {name} is now on round {bet['round']} -> UUID: {uuid}")
             return True
 
         return False
 
+    def _mark_dirty(self):
+        # Debounced _write_state
+        with self.lock:
+            if self.dirty:
+                return
+            if self.scheduler is None:
+                self._write_state()
+                return
+            self.dirty = True
+            self.scheduler.schedule(time.time() + STATE_WRITE_DELAY, "auction state", self.flush)
+
+    def flush(self):
+        with self.lock:
+            pending = self.dirty
+        if pending:
+            self._write_state()
+
     def _write_state(self):
+        with self.lock:
+            self.dirty = False
+            data = codec.dumps(self.auction_state)
+        tmp = f"{self.FILE_AH_STATE}.{os.getpid()}.tmp"
         try:
-            with open(self.FILE_AH_STATE, 'w') as f:
-                json.dump(self.auction_state, f, indent="\t")
-        except:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self.FILE_AH_STATE)
+        except OSError:
             print("Error: Could not write Auction House state to disk!")
 
+    def _copy_bet(self, uuid: str) -> dict:
+        # Copy handed out to the client, flags are added to it
+        # Lists are never modified in place, a shallow copy is enough
+        with self.bet_locks[uuid]:
+            return dict(self.auctions[uuid])
+
     def _set_bet_flags(self, bet: dict, user_id: str, checkFinish: int = 0):
         # Manage some flags
         bet["isPrivate"] = 0
@@ -175,38 +284,50 @@ class AuctionHouse():
                 if bet["isWinning"]:
                     bet["betWinner"] = user_id
 
+        # Winner of the round that just ended
+        betUsersPrev = bet["betUsersPrev"]
+        if checkFinish and len(betUsersPrev) > 0:
+            if betUsersPrev[-1]["user_id"] == user_id:
+                bet["betWinner"] = user_id
+
 ## FOR SERVER
 
-    def set_bet(self, user_id: str, uuid: str, bet_amount: int, bet_round: int):
-        if uuid in self.auctions:
+    def set_bet(self, user_id: str, uuid: str, bet_amount: int, bet_round: int, fb_name: str = "", fb_picture: str = "") -> str:
+        # Returns None if the bid was accepted, otherwise why it was rejected
+        if uuid not in self.auctions:
+            return "unknown auction"
+
+        with self.bet_locks[uuid]:
             auction = self.auctions[uuid]
+            if timestamp_now() >= auction["endDate"]:
+                return "auction finished"
+            if bet_round != auction["round"]:
+                return "wrong round"
+            if bet_amount < auction["currentPrice"]:
+                return "bid too low"
+            betUsers = auction["betUsers"]
+            if betUsers and betUsers[-1]["user_id"] == user_id:
+                return "already winning"
 
             user = {
                 "user_id": user_id,
-                "fb_name": "Test",
+                "fb_name": fb_name,
                 "bet": bet_amount,
-                "fb_picture": ""
-            }
-            bidder = {
-                "user_id": user_id,
-                "fb_name": "Test",
-                "bet": bet_amount,
-                "fb_picture": ""
+                "fb_picture": fb_picture
             }
 
-            auction["betUsers"].append(user)
-            auction["bidders"].append(bidder)
+            auction["betUsers"] = (betUsers + [user])[-MAX_BID_HISTORY:]
+            auction["bidders"] = (auction["bidders"] + [dict(user)])[-MAX_BID_HISTORY:]
             auction["currentPrice"] = bet_amount + auction["priceIncrement"]
 
-        pass
+        self._mark_dirty()
+        return None
 
     def get_auctions(self, user_id: str, level: int):
-        self.update_all_auctions(timestamp_now())
-
         bets = []
 
-        for uuid in self.auctions:
-            bet = json.loads(json.dumps(self.auctions[uuid]))
+        for uuid in list(self.auctions):
+            bet = self._copy_bet(uuid)
 
             self._set_bet_flags(bet, user_id)
 
@@ -219,12 +340,11 @@ class AuctionHouse():
             auction_data = self.get_auction_config(uuid)
             if not auction_data:
                 return None
-            if self.update_auction(auction_data, timestamp_now()):
-                self._write_state()
-            bet = json.loads(json.dumps(self.auctions[uuid]))
+
+            bet = self._copy_bet(uuid)
 
             self._set_bet_flags(bet, user_id, checkFinish)
 
             return bet
 
-        return None
\ No newline at end of file
+        return None
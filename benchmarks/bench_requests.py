@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# Request hot path benchmarks
+# Runs the server in-process (Flask test client) on a scratch copy of the data: the bundled
+# config, villages and quests are linked, saves/ only has synthetic saves (synthetic_saves.py)
+# for the login listing and the auction state starts empty. Nothing in the repository is written.
+#
+#   python benchmarks/bench_requests.py                  all scenarios
+#   python benchmarks/bench_requests.py -n 500 config    only some scenarios
+#   python benchmarks/bench_requests.py --json out.json  also write results as JSON
+#
+# For each scenario: p50/p99/mean latency, throughput and allocations per request (tracemalloc,
+# measured in a separate, shorter pass because tracing slows everything down).
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+from synthetic_saves import generate, write_saves
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINKED = ["assets", "stub", "templates", "villages", "config", "mods"]
+
+DYNAMIC_ROOT = "/dynamic/menvswomen/srvsexwars"
+CLIENT_ARGS = {"user_key": "bench", "language": "en"}
+
+def make_workdir(synthetic_saves: int) -> str:
+    workdir = tempfile.mkdtemp(prefix="sw-bench-")
+    for name in LINKED:
+        os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+    write_saves(generate(synthetic_saves, prefix="bench"), os.path.join(workdir, "saves"))
+    return workdir
+
+def load_server(workdir: str):
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    # Serve assets from the repo folder without building the assets manifest
+    os.environ.setdefault("ASSETS_UPSTREAM", os.path.join(REPO_DIR, "assets"))
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        import server
+    return server
+
+# Scenarios
+
+class Scenario():
+    def __init__(self, name: str, request):
+        self.name = name
+        self.request = request # client -> response
+
+def command_payload(commands: list) -> dict:
+    data = {
+        "first_number": 1,
+        "publishActions": "0",
+        "ts": int(time.time()),
+        "tries": 1,
+        "accessToken": "",
+        "commands": commands
+    }
+    return {"data": "0" * 64 + ";" + json.dumps(data)}
+
+def command_mix(USERID: str, save: dict):
+    # What a player session mostly sends: collecting, moving and rotating things,
+    # buying and selling, and the client's fast forwards
+    items = list(save["maps"][0]["items"].keys())
+    state = {"next": 100000}
+    rng = random.Random(1)
+
+    def request(client):
+        index = int(rng.choice(items))
+        new_index = state["next"]
+        state["next"] += 1
+        commands = [
+            [0, "collect", [index], [0] * 8],
+            [0, "move", [index, rng.randint(20, 60), rng.randint(20, 60), 0, ""], [0] * 8],
+            [0, "orient", [index, rng.randint(0, 3)], [0] * 8],
+            [0, "buy", [new_index, 26, 30, 30, 1, 0, 0, "bench"], [-10, 0, 0, 0, 0, 0, 0, 0]],
+            [0, "fast_forward", [1], [0] * 8],
+            [0, "fast_forward", [1], [0] * 8],
+            [0, "sell", [new_index, "SELL"], [5, 0, 0, 0, 0, 0, 0, 0]],
+            [0, "ping", [], [0] * 8],
+        ]
+        return client.post(DYNAMIC_ROOT + "/command.php", data={"USERID": USERID, **CLIENT_ARGS, **command_payload(commands)})
+    return request
+
+def scenarios(server) -> list:
+    import static_villages
+    USERID = server.new_village()
+    save = server.player_session(USERID)
+    neighbor = next(iter(static_villages.static_villages()))
+    quest = next(iter(static_villages.static_quests()))
+    players = [userid for userid in server.all_saves_userid() if userid != USERID]
+
+    def post(path, **values):
+        return lambda client: client.post(DYNAMIC_ROOT + path, data={"USERID": USERID, **CLIENT_ARGS, **values})
+
+    return [
+        Scenario("config", lambda client: client.get(DYNAMIC_ROOT + "/get_game_config.php", query_string={"USERID": USERID, **CLIENT_ARGS})),
+        Scenario("player_info_self", post("/get_player_info.php")),
+        Scenario("player_info_neighbor", post("/get_player_info.php", user=neighbor, map=0)),
+        Scenario("player_info_quest", post("/get_player_info.php", user=quest, map=0)),
+        *([Scenario("player_info_player", post("/get_player_info.php", user=players[0], map=0))] if players else []),
+        Scenario("command_mix", command_mix(USERID, save)),
+        Scenario("login_listing", lambda client: client.get("/")),
+        Scenario("auction_listing", post("/auctionhouse/", method="get_auctions")),
+    ]
+
+# Measurement
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+def run(scenario: Scenario, client, iterations: int, alloc_iterations: int) -> dict:
+    devnull = open(os.devnull, "w")
+    with contextlib.redirect_stdout(devnull):
+        for _ in range(min(10, iterations)):
+            response = scenario.request(client)
+            assert response.status_code == 200, f"{scenario.name}: HTTP {response.status_code}"
+
+        gc.collect()
+        times = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t = time.perf_counter_ns()
+            scenario.request(client)
+            times.append(time.perf_counter_ns() - t)
+        total = time.perf_counter() - start
+
+        tracemalloc.start()
+        peaks = []
+        for _ in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            scenario.request(client)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+
+    return {
+        "name": scenario.name,
+        "iterations": iterations,
+        "p50_ms": percentile(times, 50) / 1e6,
+        "p99_ms": percentile(times, 99) / 1e6,
+        "mean_ms": sum(times) / len(times) / 1e6,
+        "req_per_s": iterations / total,
+        "peak_alloc_kb": sum(peaks) / max(len(peaks), 1) / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the request hot paths")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--saves", type=int, default=200, help="synthetic saves for the login listing")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    workdir = make_workdir(args.saves)
+    try:
+        load_start = time.perf_counter()
+        server = load_server(workdir)
+        print(f"Server loaded in {time.perf_counter() - load_start:.2f}s ({args.saves} synthetic saves)")
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            selected = [s for s in scenarios(server) if not args.scenarios or s.name in args.scenarios]
+        client = server.app.test_client()
+
+        results = []
+        print(f"{'scenario':<22}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}{'alloc KB':>11}")
+        for scenario in selected:
+            result = run(scenario, client, args.iterations, args.alloc_iterations)
+            results.append(result)
+            print(f"{result['name']:<22}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['mean_ms']:>10.2f}{result['req_per_s']:>10.0f}{result['peak_alloc_kb']:>11.0f}")
+
+        if output:
+            with open(output, "w") as f:
+                json.dump({"python": sys.version.split()[0], "saves": args.saves, "results": results}, f, indent=4)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
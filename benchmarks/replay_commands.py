@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# Command stream replay
+# Plays back a command.php log recorded by the server (COMMAND_LOG=<file>, see command_recorder.py)
+# against a running server. Each USERID's stream is sent in order on its own connection, at the
+# recorded pace divided by --speed (--speed 0: as fast as possible); --concurrency streams are
+# replayed at the same time.
+# The target server must have the recorded villages, e.g. a copy of the saves/ folder.
+#
+#   COMMAND_LOG=commands.log python server.py                       record
+#   python benchmarks/replay_commands.py commands.log --speed 10 --concurrency 8
+#   python benchmarks/replay_commands.py commands.log --url http://127.0.0.1:5055 --speed 0
+
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+DYNAMIC_ROOT = "/dynamic/menvswomen/srvsexwars"
+
+def read_log(file: str) -> dict:
+    # USERID -> [(time, user_key, data)], in recorded order
+    # Logs recorded before user_key was logged have [time, USERID, data] lines, replayed with user_key "replay"
+    streams = {}
+    with open(file, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                entry = json.loads(line)
+                if len(entry) == 3:
+                    t, USERID, data = entry
+                    user_key = "replay"
+                else:
+                    t, USERID, user_key, data = entry
+            except ValueError:
+                print(f" [!] Skipping line {number}: not a log entry")
+                continue
+            streams.setdefault(USERID, []).append((t, user_key, data))
+    return streams
+
+class Stats():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        self.max_lag = 0.0
+
+    def add(self, latency: float, ok: bool, lag: float):
+        with self.lock:
+            self.latencies.append(latency)
+            self.errors += not ok
+            self.max_lag = max(self.max_lag, lag)
+
+    def report(self, elapsed: float):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            print(" [!] Nothing replayed.")
+            return
+        p = lambda q: latencies[min(len(latencies) - 1, round(q * (len(latencies) - 1)))] * 1000
+        print(f" * {len(latencies)} requests in {elapsed:.1f}s ({len(latencies) / elapsed:.0f} req/s), {self.errors} errors")
+        print(f" * latency p50 {p(0.5):.2f} ms, p99 {p(0.99):.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+        print(f" * max lag behind schedule {self.max_lag:.2f}s")
+
+class Connection():
+    def __init__(self, url: str):
+        self.url = urllib.parse.urlsplit(url)
+        self.conn = None
+
+    def post(self, path: str, values: dict) -> tuple:
+        body = urllib.parse.urlencode(values)
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        for attempt in range(2):
+            if self.conn is None:
+                connection = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+                self.conn = connection(self.url.netloc, timeout=30)
+            try:
+                self.conn.request("POST", self.url.path.rstrip("/") + path, body, headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                # Dropped keep-alive connection: reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+def replay_stream(url: str, USERID: str, events: list, t0: float, start: float, speed: float, stats: Stats):
+    connection = Connection(url)
+    for t, user_key, data in events:
+        lag = 0.0
+        if speed > 0:
+            delay = start + (t - t0) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag = -delay
+        sent = time.perf_counter()
+        try:
+            status, body = connection.post(DYNAMIC_ROOT + "/command.php", {"USERID": USERID, "user_key": user_key, "language": "en", "data": data})
+            ok = status == 200 and b"success" in body
+        except (OSError, http.client.HTTPException):
+            ok = False
+        stats.add(time.perf_counter() - sent, ok, lag)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded command.php log against a server")
+    parser.add_argument("log")
+    parser.add_argument("--url", default="http://127.0.0.1:5055")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed-up factor, 0 = no waiting")
+    parser.add_argument("--concurrency", type=int, default=4, help="streams replayed at the same time")
+    parser.add_argument("--users", type=int, help="only replay the first N USERIDs")
+    args = parser.parse_args()
+
+    streams = read_log(args.log)
+    if not streams:
+        sys.exit(" [!] Empty log.")
+    streams = sorted(streams.items(), key=lambda stream: stream[1][0][0])[:args.users]
+    t0 = streams[0][1][0][0]
+    print(f" [+] Replaying {sum(len(events) for _, events in streams)} requests from {len(streams)} players...")
+
+    stats = Stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for USERID, events in streams:
+            pool.submit(replay_stream, args.url, USERID, events, t0, start, args.speed, stats)
+    stats.report(time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
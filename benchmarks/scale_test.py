@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Scale test: how the server behaves as the number of player saves grows
+# For each N, a fresh process gets N synthetic saves (synthetic_saves.py), starts the server on
+# them (see bench_requests.py) and reports:
+# - startup load time of the saves
+# - memory held by the loaded saves (tracemalloc) and per village, and the process RSS
+# - p50/p99 latency of the requests whose cost depends on N: login listing, own village
+#   (neighbors list), another player's village, and a command.php mix
+#
+#   python benchmarks/scale_test.py                        N = 100, 500, 1000, 2000, 5000
+#   python benchmarks/scale_test.py -N 1000,10000 --compact   with COMPACT_VILLAGES=1
+#   python benchmarks/scale_test.py --json scale.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import contextlib
+import tracemalloc
+
+DEFAULT_SIZES = "100,500,1000,2000,5000"
+SCENARIOS = ["login_listing", "player_info_self", "player_info_player", "command_mix"]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def measure(count: int, iterations: int) -> dict:
+    # Runs in the child process
+    from bench_requests import make_workdir, load_server, scenarios, run
+
+    workdir = make_workdir(count)
+    try:
+        start = time.perf_counter()
+        server = load_server(workdir)
+        load_seconds = time.perf_counter() - start
+
+        import sessions
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            tracemalloc.start()
+            sessions.load_saves()
+            saves_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            selected = [s for s in scenarios(server) if s.name in SCENARIOS]
+
+        client = server.app.test_client()
+        results = {s.name: run(s, client, iterations, 0) for s in selected}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "saves": count,
+        "load_s": load_seconds,
+        "saves_mb": saves_bytes / 2 ** 20,
+        "kb_per_village": saves_bytes / max(count, 1) / 1024,
+        "rss_mb": rss_mb(),
+        "results": results,
+    }
+
+def run_child(count: int, iterations: int, compact: bool) -> dict:
+    env = dict(os.environ, COMPACT_VILLAGES="1" if compact else os.environ.get("COMPACT_VILLAGES", "0"))
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(count), "-n", str(iterations)],
+                            env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        print(output.stderr)
+        sys.exit(f"N={count} failed")
+    return json.loads(output.stdout.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and latency as the number of saves grows")
+    parser.add_argument("-N", "--sizes", default=DEFAULT_SIZES, help="comma separated save counts")
+    parser.add_argument("-n", "--iterations", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--compact", action="store_true", help="run with COMPACT_VILLAGES=1")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.iterations)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"{'saves':>7}{'load s':>8}{'saves MB':>10}{'KB/vill':>9}{'RSS MB':>8}" + "".join(f"{name + ' p50/p99':>32}" for name in SCENARIOS))
+    rows = []
+    for count in sizes:
+        row = run_child(count, args.iterations, args.compact)
+        rows.append(row)
+        latencies = ""
+        for name in SCENARIOS:
+            result = row["results"].get(name)
+            latencies += f"{result['p50_ms']:>22.2f} /{result['p99_ms']:>7.2f}" if result else f"{'-':>32}"
+        print(f"{count:>7}{row['load_s']:>8.2f}{row['saves_mb']:>10.1f}{row['kb_per_village']:>9.1f}{row['rss_mb']:>8.0f}" + latencies)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "compact": args.compact, "rows": rows}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Synthetic save generator
+# Makes any number of realistic player villages for scale testing. Each one starts from
+# villages/initial.json or one of the static villages and gets its own item count, level,
+# resources and inventory; items (with their stores and attributes) are taken from the
+# bundled villages, so the shapes are the ones the game really produces.
+#
+#   python benchmarks/synthetic_saves.py 5000 --out /tmp/saves       save files, as sessions.py writes them
+#   python benchmarks/synthetic_saves.py 5000 --jsonl /tmp/saves.jsonl   Firestore documents, one per line
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/synthetic_saves.py 5000 --firestore
+#
+# The JSON lines file holds {"id": USERID, "data": document} with the documents in the format
+# firebase_sessions.py stores (maps and privateState as JSON strings). --firestore writes the same
+# documents to the "saves" collection, and refuses to run unless FIRESTORE_EMULATOR_HOST is set.
+# Generation is deterministic for a given --seed.
+
+import os
+import sys
+import copy
+import json
+import random
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VILLAGES = os.path.join(REPO_DIR, "villages")
+SAVES_COLLECTION = "saves" # firebase_sessions.SAVES_COLLECTION
+
+MAX_ITEMS = 900 # biggest village in the bundle has ~600
+MAX_LEVEL = 60
+
+class Templates():
+    def __init__(self):
+        self.initial = _read(os.path.join(VILLAGES, "initial.json"))
+        self.villages = [_read(os.path.join(VILLAGES, file)) for file in sorted(os.listdir(VILLAGES))
+                         if file.endswith(".json") and file != "initial.json"]
+        # Pools shared by every generated village
+        self.items = [item for village in self.villages for item in village["maps"][0]["items"].values()]
+        self.inventory = sorted({key for village in self.villages for key in (village["privateState"].get("inventoryItems") or {})})
+
+def _read(file: str) -> dict:
+    with open(file, encoding="utf-8") as f:
+        return json.load(f)
+
+def item_count(rng: random.Random) -> int:
+    # Most players have small villages, a few have huge ones
+    return max(10, min(MAX_ITEMS, int(40 * rng.lognormvariate(0.8, 0.7))))
+
+def generate_village(templates: Templates, USERID: str, rng: random.Random) -> dict:
+    base = templates.initial if rng.random() < 0.2 else rng.choice(templates.villages)
+    village = copy.deepcopy(base)
+    village["version"] = "0.02a"
+
+    player = village["playerInfo"]
+    player["pid"] = USERID
+    player["name"] = f"Player {USERID[-6:]}"
+    player["pic"] = ""
+    player["cash"] = rng.randint(0, 2000)
+    player["completed_tutorial"] = 1
+    player["last_logged_in"] = rng.randint(1_600_000_000, 1_700_000_000)
+
+    map = village["maps"][player["default_map"]]
+    level = min(MAX_LEVEL, max(1, int(rng.triangular(1, MAX_LEVEL, 12))))
+    map["level"] = level
+    map["xp"] = level * level * rng.randint(50, 90)
+    for resource in ("gold", "wood", "oil", "steel"):
+        map[resource] = rng.randint(0, 50 * level * level)
+
+    count = item_count(rng)
+    own = list(map["items"].values())
+    items = rng.sample(own, min(count, len(own)))
+    items += [rng.choice(templates.items) for _ in range(count - len(items))]
+    map["items"] = {str(index): copy.deepcopy(item) for index, item in enumerate(items, start=1)}
+
+    village["privateState"]["inventoryItems"] = {key: rng.randint(1, 5) for key in rng.sample(templates.inventory, rng.randint(0, min(30, len(templates.inventory))))}
+    return village
+
+def generate(count: int, seed: int = 0, prefix: str = "synthetic"):
+    # Yields (USERID, village)
+    templates = Templates()
+    rng = random.Random(seed)
+    for i in range(count):
+        USERID = f"{prefix}-{i:06d}"
+        yield USERID, generate_village(templates, USERID, rng)
+
+# Outputs
+
+def write_saves(villages, out: str) -> int:
+    # Same format as sessions.save_session()
+    os.makedirs(out, exist_ok=True)
+    count = 0
+    for USERID, village in villages:
+        with open(os.path.join(out, f"{USERID}.save.json"), "w", encoding="utf-8") as f:
+            json.dump(village, f, indent=4, ensure_ascii=False)
+        count += 1
+    return count
+
+def firestore_document(village: dict) -> dict:
+    # Same document as firebase_sessions._village_to_firestore()
+    return {
+        "playerInfo": village["playerInfo"],
+        "maps_json": json.dumps(village["maps"], sort_keys=True, separators=(",", ":")),
+        "privateState_json": json.dumps(village["privateState"], sort_keys=True, separators=(",", ":")),
+        "version": village["version"],
+    }
+
+def write_jsonl(villages, out: str) -> int:
+    count = 0
+    with open(out, "w", encoding="utf-8") as f:
+        for USERID, village in villages:
+            f.write(json.dumps({"id": USERID, "data": firestore_document(village)}) + "\n")
+            count += 1
+    return count
+
+def write_firestore_emulator(villages, project: str) -> int:
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print(" [!] FIRESTORE_EMULATOR_HOST is not set, refusing to write synthetic saves to a real Firestore.")
+        sys.exit(1)
+    from google.cloud import firestore
+    client = firestore.Client(project=project)
+    collection = client.collection(SAVES_COLLECTION)
+    count = 0
+    batch = client.batch()
+    for USERID, village in villages:
+        batch.set(collection.document(USERID), firestore_document(village))
+        count += 1
+        if count % 400 == 0: # batches are limited to 500 writes
+            batch.commit()
+            batch = client.batch()
+    batch.commit()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic player villages")
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="synthetic", help="USERID prefix")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out", help="folder for .save.json files (e.g. saves)")
+    output.add_argument("--jsonl", help="file for the Firestore documents, one per line")
+    output.add_argument("--firestore", action="store_true", help="write to the Firestore emulator")
+    parser.add_argument("--project", default=os.environ.get("GOOGLE_CLOUD_PROJECT", "demo-socialwars"))
+    args = parser.parse_args()
+
+    villages = generate(args.count, args.seed, args.prefix)
+    if args.out:
+        written = write_saves(villages, args.out)
+    elif args.jsonl:
+        written = write_jsonl(villages, args.jsonl)
+    else:
+        written = write_firestore_emulator(villages, args.project)
+    print(f" [+] {written} villages generated.")
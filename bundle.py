@@ -20,4 +20,7 @@ BASE_DIR = "."
 # ASSETS_DIR = os.path.join(BASE_DIR, "assets")
 MODS_DIR = os.path.join(BASE_DIR, "mods")
 SAVES_DIR = os.path.join(BASE_DIR, "saves")
-AUCTIONS_DIR = os.path.join(BASE_DIR, "auctions")
\ No newline at end of file
+AUCTIONS_DIR = os.path.join(BASE_DIR, "auctions")
+ASSETS_VARIANTS_DIR = os.path.join(BASE_DIR, "assets_precompressed")
+ASSETS_MANIFEST_DIR = os.path.join(BASE_DIR, "assets_manifest")
+ASSETS_CACHE_DIR = os.path.join(BASE_DIR, "assets_cache")
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import math
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON codec used for saves, Firestore documents, auction state and game responses
+# - orjson is used when installed (JSON_CODEC=stdlib to disable it), stdlib json otherwise
+# - dumps() output is byte for byte what json.dumps(sort_keys=True, separators=(",", ":"),
+#   ensure_ascii=True) gives, which is what Flask sends and what the Flash client gets:
+#   orjson output that could differ (non-ASCII or DEL characters, floats python writes with
+#   an exponent, non-str keys, ints over 64 bits...) is done again with stdlib json
+# - stats counts calls, bytes, seconds and fallbacks, to measure serialization cost
+# - orjson reads integers that don't fit in 64 bits as floats, json keeps them exact. Game values
+#   never get that large, and looking for long digit runs would add ~65% to every decode.
+# - NaN and +-Infinity are not JSON, and the two libraries disagree on them (stdlib writes NaN,
+#   orjson null), so they are rejected with ValueError: loads() refuses the NaN/Infinity literals,
+#   which keeps them out of saves and responses (a literal too large for a float, like 1e400, still
+#   reads as inf), and dumps() raises on them with stdlib json. With orjson only a float passed as
+#   the value itself is checked: finding one nested would cost a walk as slow as stdlib json.
+
+JSON_CODEC = os.environ.get("JSON_CODEC", "orjson" if orjson else "stdlib")
+USE_ORJSON = orjson is not None and JSON_CODEC == "orjson"
+
+stats = {
+    "encode_calls": 0,
+    "encode_bytes": 0,
+    "encode_seconds": 0.0,
+    "encode_fallbacks": 0,
+    "decode_calls": 0,
+    "decode_bytes": 0,
+    "decode_seconds": 0.0,
+}
+
+# Floats orjson writes differently: python uses an exponent below 1e-4 ("1e-05", orjson "0.00001")
+# and its exponents have a sign and two digits ("1e+16", orjson "1e16").
+# Both checks may also hit inside strings, which only costs a fallback. The regex starts with a
+# literal so it is scanned quickly.
+_ORJSON_EXPONENT = re.compile(rb'e[-\d](?<=\de.)')
+
+def _orjson_mismatch(data: bytes) -> bool:
+    return not data.isascii() or b"\x7f" in data or b"0.0000" in data or _ORJSON_EXPONENT.search(data) is not None
+
+if USE_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+def _stdlib_dumpb(obj, default) -> bytes:
+    return json.dumps(obj, default=default, sort_keys=True, separators=(",", ":"), ensure_ascii=True, allow_nan=False).encode()
+
+def _reject_constant(name: str):
+    raise ValueError(f"{name} is not valid JSON")
+
+def dumpb(obj, default=None) -> bytes:
+    start = time.perf_counter()
+    data = None
+    if type(obj) is float and not math.isfinite(obj):
+        raise ValueError("Out of range float values are not JSON compliant")
+    if USE_ORJSON:
+        try:
+            data = orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass # JSONEncodeError, e.g. non-str keys: let json handle (or report) it
+        if data is not None and _orjson_mismatch(data):
+            data = None
+        if data is None:
+            stats["encode_fallbacks"] += 1
+    if data is None:
+        data = _stdlib_dumpb(obj, default)
+    stats["encode_calls"] += 1
+    stats["encode_bytes"] += len(data)
+    stats["encode_seconds"] += time.perf_counter() - start
+    return data
+
+def dumps(obj, default=None) -> str:
+    return dumpb(obj, default).decode()
+
+def loads(data):
+    start = time.perf_counter()
+    if USE_ORJSON:
+        try:
+            obj = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            obj = json.loads(data, parse_constant=_reject_constant) # a real error, raised again by json with its message
+    else:
+        obj = json.loads(data, parse_constant=_reject_constant)
+    stats["decode_calls"] += 1
+    stats["decode_bytes"] += len(data)
+    stats["decode_seconds"] += time.perf_counter() - start
+    return obj
+
+def load(f):
+    return loads(f.read())
+
+def dump_pretty(obj, f, default=None, ensure_ascii: bool = True):
+    # Save files (indent=4): stdlib json, orjson can only indent by 2
+    start = time.perf_counter()
+    json.dump(obj, f, indent=4, ensure_ascii=ensure_ascii, default=default)
+    stats["encode_calls"] += 1
+    stats["encode_seconds"] += time.perf_counter() - start
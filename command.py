@@ -1,43 +1,55 @@
-import json
-
+import metrics
+from tracing import span
 from sessions import session, save_session
-from get_game_config import get_name_from_item_id, get_attribute_from_item_id, get_attribute_from_goal_id, get_xp_from_level, get_weekly_reward_length, get_inventory_item_name, get_collection_name, get_collection_prize, get_premium_days
-from constants import Constant
-from engine import timestamp_now, apply_resources, map_add_item, map_add_item_from_item, map_get_item, map_pop_item, map_delete_item, push_unit, pop_unit, add_store_item, remove_store_item, bought_unit_add, unit_collection_complete, set_goals, inventory_set, inventory_add, inventory_remove, add_click, activate_item_click, buy_si_help, finish_si, push_dead_unit, resurrect_hero, push_queue_unit, pop_queue_unit, map_lose_item, push_queue_unit2
+from get_game_config import get_name_from_item_id, get_attribute_from_item_id, get_attribute_from_goal_id, get_weekly_reward_length, get_inventory_item_name, get_collection_name, get_collection_prize, get_premium_days
+from engine import timestamp_now, apply_resources, map_add_item, map_add_item_from_item, map_get_item, map_pop_item, map_delete_item, push_unit, pop_unit, add_store_item, remove_store_item, bought_unit_add, unit_collection_complete, set_goals, inventory_add, inventory_remove, add_click, activate_item_click, buy_si_help, finish_si, push_dead_unit, resurrect_hero, push_queue_unit, pop_queue_unit, push_queue_unit2, map_move_item, map_lose_units, fast_forward
+from command_payload import CommandBatch
 from math import ceil
 
-def command(USERID, data):
-    first_number = data["first_number"]
-    publishActions = data["publishActions"]
-    timestamp = data["ts"]
-    tries = data["tries"]
-    accessToken = data["accessToken"]
-    commands = data["commands"]
+def command(USERID, batch: CommandBatch):
+    # batch: parsed by command_payload.parse_batch()
+
+    # print(f"Number of commands to execute: {len(batch.commands)}")
+
+    # Consecutive fast forwards are added up and applied in a single pass over the map.
+    # Only adjacent ones are merged (any other command in between flushes them), and that pass is
+    # still engine.fast_forward's loop over every item.
+    fast_forwards = {} # map_id -> seconds
 
-    # print(f"Number of commands to execute: {len(commands)}")
+    for map_id, cmd, args, resources_changed in batch.commands:
+        # map_id: I think this is map ID, in SW this is always 0
+        # resources_changed: So this seems to be resource modifications, because some commands don't send any args, like weekly_reward and set_variables
 
-    for i, comm in enumerate(commands):
-        map_id = comm[0]
-        cmd = comm[1]
-        args = comm[2]
-        resources_changed = comm[3]
+        if cmd == "fast_forward" and args and isinstance(args[0], int) and args[0] >= 0 and not any(resources_changed):
+            fast_forwards[map_id] = fast_forwards.get(map_id, 0) + args[0]
+            continue
 
-        # print(f"map_id = {comm[0]}") # I think this is map ID, in SW this is always 0
-        # print(f"cmd = {comm[1]}")
-        # print(f"args = {comm[2]}")
-        # print(f"resources_changed = {comm[3]}") # So this seems to be resource modifications, because some commands don't send any args, like weekly_reward and set_variables
+        flush_fast_forwards(USERID, fast_forwards)
+        with span(f"command {cmd}"):
+            do_command(USERID, map_id, cmd, args, resources_changed)
 
-        do_command(USERID, map_id, cmd, args, resources_changed)
+    flush_fast_forwards(USERID, fast_forwards)
+    with span("save"):
+        save_session(USERID) # Save session
 
-    save_session(USERID) # Save session
+def flush_fast_forwards(USERID, fast_forwards: dict):
+    # Clamping at 0 makes N forwards of s1..sN seconds the same as one forward of s1+..+sN seconds
+    for map_id in fast_forwards:
+        with span("command fast_forward"):
+            do_command(USERID, map_id, "fast_forward", [fast_forwards[map_id]], [0] * 8)
+    fast_forwards.clear()
+
+commands_total = metrics.counter("sw_commands_total", "Commands run by command.php", ["cmd"])
 
 def do_command(USERID, map_id, cmd, args, resources_changed):
     save = session(USERID)
     time_now = timestamp_now()
     map = save["maps"][map_id]
     print (" [+] COMMAND: ", cmd, "(", args, ") -> ", sep='', end='')
+    commands_total.inc(cmd)
 
-    apply_resources(save, map, resources_changed)
+    with span("apply_resources"):
+        apply_resources(save, map, resources_changed)
 
     if cmd == "buy":
         item_index = args[0]
@@ -67,7 +79,10 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
     
     elif cmd == "set_goals":
         goal_id = args[0]
-        progress = json.loads(args[1]) # format: [visited, currentStep]
+        progress = args[1] # format: [visited, currentStep], decoded by command_payload.py
+        if progress is None:
+            print("Error: Failed to parse command.")
+            return
 
         set_goals(save["privateState"], goal_id, progress)
 
@@ -123,14 +138,12 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
         frame = args[3]
         string = args[4]
 
-        item = map_get_item(map, item_index)
+        # Move item
+        item = map_move_item(map, item_index, x, y)
         if not item:
             print("Error: item not found.")
             return
 
-        # Move item
-        item[1] = x
-        item[2] = y
         print("Move", str(get_name_from_item_id(item[0])), "to", f"({x},{y})")
     
     elif cmd == "collect":
@@ -187,7 +200,7 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
         print("Killed", str(get_name_from_item_id(item_id)))
 
     elif cmd == "batch_remove":
-        index_list = json.loads(args[0])
+        index_list = args[0] or [] # decoded by command_payload.py
 
         # Delete items
         for index in index_list:
@@ -711,7 +724,7 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
         package_id = args[0]
         item_list = args[1]
 
-        items = json.loads(item_list)
+        items = item_list or [] # decoded by command_payload.py
         for item in items:
             add_store_item(map, item)
 
@@ -750,13 +763,7 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
         privateState["questsRank"][str(quest_index)] = difficulty 
 
     elif cmd == "end_quest":
-        response = None
-
-        try:
-            response = json.loads(args[0])
-        except:
-            print("Error: Failed to parse command.")
-            return
+        response = args[0] # decoded by command_payload.py, None if invalid
 
         if not response:
             print("Error: Failed to parse command.")
@@ -786,14 +793,9 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
             quest_id = response["quest_id"]
 
         # Lost units
-        privateState = save["privateState"]
-        for unit in units:
-            # item_id (not on map), sent_to_battle, A, B 
-            lost = max(0, unit[2] - unit[3]) # number of loses is A - B
-            if lost > 0:
-                item = unit[0]
-                print(f"Lost {lost} {get_name_from_item_id(unit[0])}(s)")
-                map_lose_item(map, privateState, unit[0], lost)
+        losses = map_lose_units(map, save["privateState"], units or [])
+        for item in losses:
+            print(f"Lost {losses[item]} {get_name_from_item_id(item)}(s)")
 
         if not quest_id:
             print("Error: No quest played.")
@@ -806,15 +808,9 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
             print(f"Failed quest {quest_id}")
 
     elif cmd == "end_attack":
-        response = None
+        response = args[0] # decoded by command_payload.py, None if invalid
         unknown = args[1]
 
-        try:
-            response = json.loads(args[0])
-        except:
-            print("Error: Failed to parse command.")
-            return
-
         if not response:
             print("Error: Failed to parse command.")
             return
@@ -862,14 +858,9 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
             resources_victim = response["resources_victim"]
         
         # Lost units
-        privateState = save["privateState"]
-        for unit in attacker_units:
-            # item_id (not on map), sent_to_battle, A, B 
-            lost = max(0, unit[2] - unit[3]) # number of loses is A - B
-            if lost > 0:
-                item = unit[0]
-                print(f"Lost {lost} {get_name_from_item_id(unit[0])}(s)")
-                map_lose_item(map, privateState, unit[0], lost)
+        losses = map_lose_units(map, save["privateState"], attacker_units or [])
+        for item in losses:
+            print(f"Lost {losses[item]} {get_name_from_item_id(item)}(s)")
 
         if "name" in victim:
             name = victim["name"]
@@ -903,45 +894,12 @@ def do_command(USERID, map_id, cmd, args, resources_changed):
         print("Seen Auction House")
 
     elif cmd == "fast_forward":
+        if not args or not isinstance(args[0], (int, float)):
+            print("Error: fast_forward without seconds.")
+            return
         seconds = args[0]
 
-        privateState = save["privateState"]
-
-        map["timestamp"] = max(0, map["timestamp"] - seconds)
-        map["timestampLastChapter"] = max(0, map["timestampLastChapter"] - seconds)
-        map["timestampLastTreasure"] = max(0, map["timestampLastTreasure"] - seconds)
-        map["timestampLastTrade"] = max(0, map["timestampLastTrade"] - seconds)
-        privateState["timestampLastBonus"] = max(0, privateState["timestampLastBonus"] - seconds)
-        # privateState["timeStampMondayBonus"] = max(0, privateState["timeStampMondayBonus"] - seconds) # don't process weekly things
-        privateState["timestampLastAllianceBonus"] = max(0, privateState["timestampLastAllianceBonus"] - seconds)
-        # privateState["timeStampDartsReset"] = max(0, privateState["timeStampDartsReset"] - seconds) # don't process weekly things
-        privateState["timeStampDartsNewFree"] = max(0, privateState["timeStampDartsNewFree"] - seconds)
-        privateState["tsAttacksReset"] = max(0, privateState["tsAttacksReset"] - seconds)
-        privateState["tsSpyingsReset"] = max(0, privateState["tsSpyingsReset"] - seconds)
-
-        # research timers
-        research_timers = privateState["timeStampDoResearch"]
-        num_research_timers = len(research_timers)
-        i = 0
-        while i < num_research_timers:
-            research_timers[i] = max(0, research_timers[i] - seconds)
-            i += 1
-
-        # map items
-        items = map["items"]
-        for index in items:
-            data = items[index]
-            data[3] = max(0, data[3] - seconds)
-
-            # building timers (atom fusion)
-            if data[6]:
-                if "ts" in data[6]:
-                    data[6]["ts"] = max(0, data[6]["ts"] - seconds)
-
-        # quest times
-        questTimes = map["questTimes"]
-        for key in questTimes:
-            questTimes[key] = max(0, questTimes[key] - seconds)
+        fast_forward(save, map, seconds)
 
         print(f"Fast forwarded {seconds} seconds")
 
@@ -0,0 +1,58 @@
+import os
+import time
+import queue
+import atexit
+import threading
+
+import codec
+
+# Command stream recorder
+# With COMMAND_LOG=<file>, every command.php request is appended to <file> as one JSON line:
+#   [unix time, USERID, user_key, data]
+# where data is the "hash;payload" string exactly as the client sent it, and user_key the key it
+# was sent with (its hash is checked against it, see command_payload.py).
+# Lines are written by a background thread, requests never wait on the disk. Each batch of
+# complete lines goes out in a single append, so several server processes can share the file.
+# benchmarks/replay_commands.py plays a log back against a server.
+
+COMMAND_LOG = os.environ.get("COMMAND_LOG", "")
+
+class CommandRecorder():
+    def __init__(self, file: str):
+        self.file = file
+        self.lines = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="command recorder", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record(self, USERID: str, user_key: str, data: str):
+        self.lines.put(codec.dumpb([round(time.time(), 3), USERID, user_key, data]) + b"\n")
+
+    def close(self):
+        self.lines.put(None)
+        self.thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            fd = os.open(self.file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as e:
+            print(f" [!] Command recorder could not open {self.file}: {e}")
+            return
+        try:
+            while True:
+                batch = [self.lines.get()]
+                while not self.lines.empty() and batch[-1] is not None:
+                    batch.append(self.lines.get())
+                closing = batch[-1] is None
+                if closing:
+                    batch.pop()
+                if batch:
+                    os.write(fd, b"".join(batch))
+                if closing:
+                    return
+        except OSError as e:
+            print(f" [!] Command recorder stopped: {e}")
+        finally:
+            os.close(fd)
+
+command_recorder = CommandRecorder(COMMAND_LOG) if COMMAND_LOG else None
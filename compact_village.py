@@ -0,0 +1,242 @@
+import os
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+# Optional compact in-memory representation of map["items"]
+# Instead of one [item_id, x, y, timestamp, orientation, store, attr, player] list per item,
+# numeric fields live in typed arrays (one per field) and items are read through ItemView,
+# which behaves like the original list so engine.py helpers work unchanged.
+# Saves and responses are expanded back to the JSON shape through json_default().
+
+COMPACT_VILLAGES = os.environ.get("COMPACT_VILLAGES", "0") == "1"
+
+# Numeric fields of an item stored in typed arrays
+_ARRAY_FIELDS = (0, 1, 2, 3, 4, 7)
+_STORE = 5
+_ATTR = 6
+# Fields read by map_index.MapIndex
+_INDEXED_FIELDS = (0, 1, 2, 7)
+
+class CompactItems(MutableMapping):
+    __slots__ = ("_rows", "_columns", "_stores", "_attrs", "_free", "index")
+
+    def __init__(self, items: dict = None):
+        self._rows = {} # key -> row
+        self._columns = {field: array("q") for field in _ARRAY_FIELDS}
+        self._stores = [] # None for free rows
+        self._attrs = [] # None for free rows
+        self._free = []
+        self.index = None # map_index.MapIndex, kept in step by __setitem__, __delitem__ and ItemView.__setitem__
+        if items:
+            for key, item in items.items():
+                self[key] = item
+
+    def __reduce__(self):
+        # Copies (copy.deepcopy, pickle) leave the map index behind
+        return (CompactItems, (self.to_dict(),))
+
+    # Mapping
+
+    def __getitem__(self, key: str):
+        if key not in self._rows:
+            raise KeyError(key)
+        return ItemView(self, key)
+
+    def __setitem__(self, key: str, item: list):
+        if self.index is not None:
+            with self.index.lock:
+                self.index.remove(key)
+                self._set_item(key, item)
+                self.index.add(key, item)
+            return
+        self._set_item(key, item)
+
+    def _set_item(self, key: str, item: list):
+        row = self._rows.get(key)
+        if row is None:
+            row = self._new_row()
+            self._rows[sys.intern(key)] = row
+        for field in _ARRAY_FIELDS:
+            self._set_field(row, field, item[field])
+        # store and attr are kept by reference, like in a plain item list: callers may fill them after adding the item
+        self._stores[row] = item[_STORE]
+        self._attrs[row] = _intern_attr(item[_ATTR])
+
+    def __delitem__(self, key: str):
+        if self.index is not None and key in self._rows:
+            with self.index.lock:
+                self.index.remove(key)
+                self._delete_item(key)
+            return
+        self._delete_item(key)
+
+    def _delete_item(self, key: str):
+        row = self._rows.pop(key)
+        self._stores[row] = None
+        self._attrs[row] = None
+        self._free.append(row)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def pop(self, key: str, *default):
+        # Popped items leave the compact store, so they are handed out as plain lists
+        if key not in self._rows:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        item = self.item_list(key)
+        del self[key]
+        return item
+
+    # Rows
+
+    def _new_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        for column in self._columns.values():
+            column.append(0)
+        self._stores.append(None)
+        self._attrs.append(None)
+        return len(self._stores) - 1
+
+    def _get_field(self, row: int, field: int):
+        if field == _STORE:
+            store = self._stores[row]
+            if store is None:
+                # Row was added with store None, callers may append to it, so it has to be kept
+                store = self._stores[row] = []
+            return store
+        if field == _ATTR:
+            attr = self._attrs[row]
+            if attr is None:
+                attr = self._attrs[row] = {}
+            return attr
+        return self._columns[field][row]
+
+    def _set_field(self, row: int, field: int, value):
+        if field == _STORE:
+            self._stores[row] = value
+            return
+        if field == _ATTR:
+            self._attrs[row] = value
+            return
+        column = self._columns[field]
+        try:
+            column[row] = value
+        except (TypeError, OverflowError):
+            # Not a 64 bit integer (e.g. a float coordinate), fall back to a list for this field
+            if isinstance(column, array):
+                column = self._columns[field] = list(column)
+            column[row] = value
+
+    def item_list(self, key: str) -> list:
+        row = self._rows[key]
+        columns = self._columns
+        store = self._stores[row]
+        attr = self._attrs[row]
+        return [
+            columns[0][row], columns[1][row], columns[2][row], columns[3][row], columns[4][row],
+            store if store is not None else [],
+            attr if attr is not None else {},
+            columns[7][row]
+        ]
+
+    def to_dict(self) -> dict:
+        return {key: self.item_list(key) for key in self._rows}
+
+    def shift_timestamps(self, seconds: int):
+        # fast_forward over every item: a loop over the timestamp column, then one over the attrs with a "ts"
+        rows = self._rows.values()
+        timestamps = self._columns[3]
+        for row in rows:
+            timestamps[row] = max(0, timestamps[row] - seconds)
+        attrs = self._attrs
+        for row in rows:
+            attr = attrs[row]
+            if attr and "ts" in attr:
+                attr["ts"] = max(0, attr["ts"] - seconds)
+
+class ItemView():
+    # Looks like the [item_id, x, y, timestamp, orientation, store, attr, player] list of an item
+    __slots__ = ("_items", "_key")
+
+    def __init__(self, items: CompactItems, key: str):
+        self._items = items
+        self._key = key
+
+    def _row(self) -> int:
+        return self._items._rows[self._key]
+
+    def __getitem__(self, field: int):
+        if isinstance(field, slice):
+            return self.to_list()[field]
+        return self._items._get_field(self._row(), field % 8)
+
+    def __setitem__(self, field: int, value):
+        items = self._items
+        field %= 8
+        index = items.index
+        if index is not None and field in _INDEXED_FIELDS:
+            with index.lock:
+                items._set_field(self._row(), field, value)
+                index.update(self._key, self)
+            return
+        items._set_field(self._row(), field, value)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __eq__(self, other):
+        if isinstance(other, ItemView):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+    def to_list(self) -> list:
+        return self._items.item_list(self._key)
+
+def _intern_attr(attr: dict) -> dict:
+    # Interns the keys in place, so the caller's dict stays the item's attr
+    if attr:
+        pairs = [(sys.intern(key), value) for key, value in attr.items()]
+        attr.clear()
+        attr.update(pairs)
+    return attr
+
+# Conversion
+
+def compact_village(village: dict) -> dict:
+    # Converts village maps in place, only when enabled
+    if not COMPACT_VILLAGES:
+        return village
+    for map in village["maps"]:
+        if isinstance(map["items"], dict):
+            map["items"] = CompactItems(map["items"])
+    return village
+
+def expand_village(village: dict) -> dict:
+    for map in village["maps"]:
+        if isinstance(map["items"], CompactItems):
+            map["items"] = map["items"].to_dict()
+    return village
+
+def json_default(obj):
+    # default= hook for json.dump(s) so compact villages are written in the original JSON shape
+    if isinstance(obj, CompactItems):
+        return obj.to_dict()
+    if isinstance(obj, ItemView):
+        return obj.to_list()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
@@ -1,6 +1,9 @@
 import time
-import json
+import codec
+from itertools import islice
 from get_game_config import get_attribute_from_item_id
+from map_index import get_index
+from compact_village import CompactItems
 
 def timestamp_now():
     return int(time.time())
@@ -18,7 +21,7 @@ def map_add_item(map: dict, index: int, item: int, x: int, y: int, orientation:
         properties = get_attribute_from_item_id(item, "properties")
         # enable SI (Socially In Construction), because the game expects it
         if properties:
-            properties = json.loads(properties)
+            properties = codec.loads(properties)
             if "friend_assistable" in properties:
                 if int(properties["friend_assistable"]) > 0:
                     attr["si"] = []
@@ -28,7 +31,7 @@ def map_add_item(map: dict, index: int, item: int, x: int, y: int, orientation:
             if int(click_to_build) > 0:
                 attr["nc"] = 0
 
-    map["items"][str(index)] = [item, x, y, timestamp, orientation, store, attr, player]
+    map_add_item_from_item(map, index, [item, x, y, timestamp, orientation, store, attr, player])
 
 def map_add_item_from_item(map: dict, index: int, item: list):
     map["items"][str(index)] = item
@@ -46,10 +49,40 @@ def map_pop_item(map: dict, index: int):
     return map["items"].pop(itemstr)
 
 def map_delete_item(map: dict, index: int):
-    itemstr = str(index)
-    if itemstr not in map["items"]:
+    map_pop_item(map, index)
+
+def map_move_item(map: dict, index: int, x: int, y: int):
+    item = map_get_item(map, index)
+    if not item:
         return None
-    del map["items"][str(itemstr)]
+    item[1] = x
+    item[2] = y
+    # Assigned back so the map index moves it to its new cell
+    map_add_item_from_item(map, index, item)
+    return item
+
+def map_find_items(map: dict, item: int, limit: int = None, owned: bool = True) -> list:
+    # Returns the indexes of the first items with this id (of any team if not owned)
+    _index = get_index(map)
+    with _index.lock:
+        buckets = _index.by_owned_id if owned else _index.by_id
+        return list(islice(buckets.get(item, ()), limit))
+
+def map_find_item(map: dict, item: int, owned: bool = True):
+    found = map_find_items(map, item, 1, owned)
+    return found[0] if found else None
+
+def map_items_at(map: dict, x: int, y: int) -> list:
+    # Indexes of the items at this grid cell
+    _index = get_index(map)
+    with _index.lock:
+        return list(_index.by_cell.get((x, y), ()))
+
+def map_items_of_player(map: dict, player: int) -> list:
+    # Indexes of the items of this player team
+    _index = get_index(map)
+    with _index.lock:
+        return list(_index.by_player.get(player, ()))
 
 def push_unit(unit: dict, building: dict):
     building[5].append(unit)
@@ -146,28 +179,35 @@ def finish_si(item: dict):
     if "si" in attr:
         del attr["si"]
 
+def is_resurrectable(item: int) -> bool:
+    properties = get_attribute_from_item_id(item, "properties")
+    if not properties:
+        return False
+
+    properties = codec.loads(properties)
+    if "resurrectable" not in properties:
+        return False
+
+    return int(properties["resurrectable"]) > 0
+
 def push_dead_unit(privateState: dict, item: list):
     # Tries to push item to deadHeroes if it is ressurectable and on player team
     if item[7] != 1:
         return False
 
-    properties = get_attribute_from_item_id(item[0], "properties")
-    if not properties:
-        return False
-
-    properties = json.loads(properties)
-    if "resurrectable" not in properties:
+    if not is_resurrectable(item[0]):
         return False
 
-    if int(properties["resurrectable"]) > 0:
-        deadHeroes = privateState["deadHeroes"]
-        if str(item[0]) in deadHeroes:
-            deadHeroes[str(item[0])] += 1
-        else:
-            deadHeroes[str(item[0])] = 1
-        return True
+    push_dead_units(privateState, item[0], 1)
+    return True
 
-    return False
+def push_dead_units(privateState: dict, item: int, quantity: int):
+    deadHeroes = privateState["deadHeroes"]
+    itemstr = str(item)
+    if itemstr in deadHeroes:
+        deadHeroes[itemstr] += quantity
+    else:
+        deadHeroes[itemstr] = quantity
 
 def resurrect_hero(privateState: dict, item: int):
     deadHeroes = privateState["deadHeroes"]
@@ -214,40 +254,85 @@ def push_queue_unit2(item: dict, unit_id: int):
 
 def map_lose_item(map: dict, privateState: dict, item: int, quantity: int):
     qty = quantity
-    map_items = map["items"]
     while qty > 0:
-        deleted = False
-        for index in map_items:
-            if map_items[index][0] == item and map_items[index][7]:
-                _item = map_pop_item(map, index)
-                push_dead_unit(privateState, _item)
-                deleted = True
-                break
-        if not deleted:
+        index = map_find_item(map, item)
+        if index is None:
             return
+        _item = map_pop_item(map, index)
+        push_dead_unit(privateState, _item)
         qty -= 1
 
-def reset_stuff(save: dict):
+def map_lose_units(map: dict, privateState: dict, units: list) -> dict:
+    # Bulk map_lose_item for battle results, units are [item_id, sent_to_battle, A, B] and number of loses is A - B
+    losses = {}
+    for unit in units:
+        lost = max(0, unit[2] - unit[3])
+        if lost > 0:
+            losses[unit[0]] = losses.get(unit[0], 0) + lost
+
+    for item, lost in losses.items():
+        dead = 0
+        for index in map_find_items(map, item, lost):
+            _item = map_pop_item(map, index)
+            if _item[7] == 1:
+                dead += 1
+        # Resurrectable check is done once per unit type
+        if dead > 0 and is_resurrectable(item):
+            push_dead_units(privateState, item, dead)
+
+    return losses
+
+def reset_stuff(save: dict, day_start: int, week_start: int):
     # This function performs some resets in save whenever the game loads the map
-    # Resets market trades if it's a new day
-    # 1 week = 604800 seconds
-    # 1 day = 86400 seconds
+    # day_start / week_start are the last day and week (monday) boundaries, see maintenance.py
 
-    now = timestamp_now()
+    # Resets market trades if it's a new day
     for map in save["maps"]:
-        last_trade = map["timestampLastTrade"]
-        if now // 86400 != last_trade // 86400:
+        if map["timestampLastTrade"] < day_start:
             map["numTradesDone"] = 0
     # Reset targets if start of a new week, game will call darts_reset if timestamp is 0
     privateState = save["privateState"]
     if "timeStampDartsReset" in privateState:
-        # take away 3 days since timestamp 0 is thursday, we want reset to happen on monday
-        # 3 days = 259200 seconds
-        last_darts_reset = privateState["timeStampDartsReset"] + 259200
-        temp = now + 259200
-        if temp // 604800 != last_darts_reset // 604800:
+        if privateState["timeStampDartsReset"] < week_start:
             privateState["timeStampDartsReset"] = 0
 
+def fast_forward(save: dict, map: dict, seconds: int):
+    privateState = save["privateState"]
+
+    map["timestamp"] = max(0, map["timestamp"] - seconds)
+    map["timestampLastChapter"] = max(0, map["timestampLastChapter"] - seconds)
+    map["timestampLastTreasure"] = max(0, map["timestampLastTreasure"] - seconds)
+    map["timestampLastTrade"] = max(0, map["timestampLastTrade"] - seconds)
+    privateState["timestampLastBonus"] = max(0, privateState["timestampLastBonus"] - seconds)
+    # privateState["timeStampMondayBonus"] = max(0, privateState["timeStampMondayBonus"] - seconds) # don't process weekly things
+    privateState["timestampLastAllianceBonus"] = max(0, privateState["timestampLastAllianceBonus"] - seconds)
+    # privateState["timeStampDartsReset"] = max(0, privateState["timeStampDartsReset"] - seconds) # don't process weekly things
+    privateState["timeStampDartsNewFree"] = max(0, privateState["timeStampDartsNewFree"] - seconds)
+    privateState["tsAttacksReset"] = max(0, privateState["tsAttacksReset"] - seconds)
+    privateState["tsSpyingsReset"] = max(0, privateState["tsSpyingsReset"] - seconds)
+
+    # research timers
+    research_timers = privateState["timeStampDoResearch"]
+    research_timers[:] = [max(0, ts - seconds) for ts in research_timers]
+
+    # map items
+    items = map["items"]
+    if isinstance(items, CompactItems):
+        items.shift_timestamps(seconds)
+    else:
+        for data in items.values():
+            data[3] = max(0, data[3] - seconds)
+
+            # building timers (atom fusion)
+            attr = data[6]
+            if attr and "ts" in attr:
+                attr["ts"] = max(0, attr["ts"] - seconds)
+
+    # quest times
+    questTimes = map["questTimes"]
+    for key, ts in questTimes.items():
+        questTimes[key] = max(0, ts - seconds)
+
 def apply_resources(save: dict, map: dict, resource: list):
     # So these will be negative if the user used resources and positive if the user gained resources, we can detect cheats by checking if any are less than 0 after applying
     unknown = resource[0]
@@ -14,13 +14,19 @@ import json
 import copy
 import uuid
 import os
+import time
 
 from firebase_config import get_firestore_db, get_firebase_auth, is_firebase_enabled
 from version import version_code
 from engine import timestamp_now
-from version import migrate_loaded_save
-from constants import Quests
-from bundle import VILLAGES_DIR, QUESTS_DIR
+from parallel_loader import load_json_files, prefetch, LoadStats
+from compact_village import compact_village, json_default
+import static_villages as static
+import codec
+import metrics
+from tracing import span
+from version import migrate_loaded_save, migrate_on_access
+from bundle import VILLAGES_DIR
 
 # ============================================================
 # COLEÇÕES DO FIRESTORE
@@ -31,8 +37,7 @@ SAVES_COLLECTION = "saves"          # Vilas dos jogadores
 # ============================================================
 # CACHE EM MEMÓRIA (para performance)
 # ============================================================
-__villages = {}   # Vilas estáticas (NPCs) - carregadas do disco
-__quests = {}     # Quests estáticas - carregadas do disco
+# Vilas estáticas (NPCs) e quests ficam em static_villages.py (somente leitura)
 __saves = {}      # Cache das vilas dos jogadores (sincronizado com Firestore)
 
 __initial_village = json.load(open(os.path.join(VILLAGES_DIR, "initial.json")))
@@ -48,8 +53,8 @@ def _village_to_firestore(village: dict) -> dict:
     """Converte uma vila para formato compatível com o Firestore."""
     return {
         "playerInfo": village["playerInfo"],  # dict simples, OK para Firestore
-        "maps_json": json.dumps(village["maps"]),  # serializar como string
-        "privateState_json": json.dumps(village["privateState"]),  # serializar como string
+        "maps_json": codec.dumps(village["maps"], default=json_default),  # serializar como string
+        "privateState_json": codec.dumps(village["privateState"]),  # serializar como string
         "version": village.get("version", "0.02a"),
     }
 
@@ -58,8 +63,8 @@ def _firestore_to_village(doc_data: dict) -> dict:
     """Converte dados do Firestore de volta para o formato de vila."""
     return {
         "playerInfo": doc_data["playerInfo"],
-        "maps": json.loads(doc_data["maps_json"]),
-        "privateState": json.loads(doc_data["privateState_json"]),
+        "maps": codec.loads(doc_data["maps_json"]),
+        "privateState": codec.loads(doc_data["privateState_json"]),
         "version": doc_data.get("version", "0.02a"),
     }
 
@@ -192,6 +197,7 @@ def _create_village_for_user(uid: str, display_name: str) -> str:
 
     # Migrar se necessário
     migrate_loaded_save(village)
+    compact_village(village)
 
     # Salvar no Firestore (serializado)
     db = get_firestore_db()
@@ -216,6 +222,7 @@ def new_village() -> str:
     village["privateState"]["timeStampDartsReset"] = 0
 
     migrate_loaded_save(village)
+    compact_village(village)
 
     # Salvar no Firestore (serializado)
     if is_firebase_enabled():
@@ -248,7 +255,7 @@ def _load_single_save(userid: str):
             else:
                 village = doc_data  # formato antigo
             if is_valid_village(village):
-                __saves[str(userid)] = village
+                __saves[str(userid)] = compact_village(village)
                 print(f" * FIREBASE: Vila {userid} carregada com sucesso.")
             else:
                 print(f" [!] FIREBASE: Vila {userid} encontrada mas é inválida.")
@@ -258,15 +265,18 @@ def _load_single_save(userid: str):
         print(f" [!] FIREBASE: Erro ao carregar vila {userid}: {e}")
 
 
-def load_saves():
-    """Carrega todas as vilas salvas do Firestore (ou do disco se Firebase não estiver ativo)."""
+def load_saves(parallel: bool = False):
+    """Carrega todas as vilas salvas do Firestore (ou do disco se Firebase não estiver ativo).
+    parallel: só na inicialização do servidor (ver parallel_loader.py)."""
     global __saves
     __saves = {}
 
     if is_firebase_enabled():
         try:
             db = get_firestore_db()
-            docs = db.collection(SAVES_COLLECTION).stream()
+            stats = LoadStats("vilas do Firestore")
+            # Os próximos documentos são baixados enquanto os atuais são convertidos
+            docs = prefetch(db.collection(SAVES_COLLECTION).stream())
             for doc in docs:
                 doc_data = doc.to_dict()
                 # Verificar se é formato novo (serializado) ou antigo
@@ -278,20 +288,19 @@ def load_saves():
                     print(f" * FIREBASE: Vila inválida ignorada: {doc.id}")
                     continue
                 USERID = save["playerInfo"]["pid"]
-                __saves[str(USERID)] = save
-                modified = migrate_loaded_save(save)
-                if modified:
-                    save_session(USERID)
+                __saves[str(USERID)] = compact_village(save)  # migrada no primeiro acesso
+                stats.count += 1
+            stats.report()
             print(f" [+] FIREBASE: {len(__saves)} vila(s) carregada(s) do Firestore.")
         except Exception as e:
             print(f" [!] FIREBASE: Erro ao carregar vilas: {e}")
             print(f" [!] FIREBASE: Tentando carregar do disco...")
-            _load_saves_from_disk()
+            _load_saves_from_disk(parallel)
     else:
-        _load_saves_from_disk()
+        _load_saves_from_disk(parallel)
 
 
-def _load_saves_from_disk():
+def _load_saves_from_disk(parallel: bool = False):
     """Fallback: carrega vilas do disco (pasta saves/)."""
     global __saves
     from bundle import SAVES_DIR
@@ -303,47 +312,28 @@ def _load_saves_from_disk():
             print(f"Could not create '{SAVES_DIR}' folder.")
             return
 
-    for file in os.listdir(SAVES_DIR):
-        try:
-            save = json.load(open(os.path.join(SAVES_DIR, file)))
-        except json.decoder.JSONDecodeError:
-            print(f"Corrupted JSON: {file}")
-            continue
-        if not is_valid_village(save):
+    # Arquivos lidos em paralelo só na inicialização (parallel_loader.py)
+    stats = LoadStats("saves")
+    files = [os.path.join(SAVES_DIR, file) for file in os.listdir(SAVES_DIR)]
+    for path, save, error in load_json_files(files, is_valid_village, parallel):
+        if error:
+            if error != "Invalid":
+                print(f"{error} {os.path.basename(path)}")
             continue
         USERID = save["playerInfo"]["pid"]
-        __saves[str(USERID)] = save
-        modified = migrate_loaded_save(save)
-        if modified:
-            save_session(USERID)
+        __saves[str(USERID)] = compact_village(save)  # migrada no primeiro acesso
+        stats.count += 1
+    stats.report()
 
 
 def load_static_villages():
     """Carrega vilas estáticas (NPCs) do disco."""
-    global __villages
-    __villages = {}
-
-    for file in os.listdir(VILLAGES_DIR):
-        if file == "initial.json" or not file.endswith(".json"):
-            continue
-        village = json.load(open(os.path.join(VILLAGES_DIR, file)))
-        if not is_valid_village(village):
-            continue
-        USERID = village["playerInfo"]["pid"]
-        __villages[str(USERID)] = village
+    static.load_static_villages(is_valid_village)
 
 
 def load_quests():
     """Carrega quests estáticas do disco."""
-    global __quests
-    __quests = {}
-
-    for file in os.listdir(QUESTS_DIR):
-        village = json.load(open(os.path.join(QUESTS_DIR, file)))
-        if not is_valid_village(village):
-            continue
-        QUESTID = village["playerInfo"]["pid"]
-        __quests[str(QUESTID)] = village
+    static.load_quests(is_valid_village)
 
 
 # ============================================================
@@ -357,7 +347,7 @@ def all_saves_userid() -> list:
 
 def all_userid() -> list:
     """Retorna lista de USERIDs de todas as vilas."""
-    return list(__villages.keys()) + list(__saves.keys()) + list(__quests.keys())
+    return list(static.static_villages().keys()) + list(__saves.keys()) + list(static.static_quests().keys())
 
 
 def save_info(USERID: str) -> dict:
@@ -390,38 +380,32 @@ def all_saves_info() -> list:
 def session(USERID: str) -> dict:
     """Retorna os dados completos de uma vila."""
     assert isinstance(USERID, str)
-    if USERID not in __saves:
+    if USERID in __saves:
+        metrics.cache_requests.inc("session", "hit")
+        return migrate_on_access(__saves[USERID])
+    with span("storage read"):
         _load_single_save(USERID)
-    return __saves[USERID] if USERID in __saves else None
+    metrics.cache_requests.inc("session", "load" if USERID in __saves else "miss")
+    return migrate_on_access(__saves[USERID]) if USERID in __saves else None
 
 
 def neighbor_session(USERID: str) -> dict:
     """Retorna os dados de uma vila vizinha."""
     assert isinstance(USERID, str)
     if USERID in __saves:
-        return __saves[USERID]
-    if USERID in __quests:
-        return __quests[USERID]
-    if USERID in __villages:
-        return __villages[USERID]
-    
+        return migrate_on_access(__saves[USERID])
+    village = static.static_quest(USERID) or static.static_village(USERID)
+    if village:
+        return village
+
     # Tentar carregar do Firestore se for um save
     _load_single_save(USERID)
-    return __saves.get(USERID)
+    return migrate_on_access(__saves[USERID]) if USERID in __saves else None
 
 
 def fb_friends_str(USERID: str) -> list:
     """Retorna lista de amigos (vizinhos) para o jogo."""
-    friends = []
-    for key in __villages:
-        vill = __villages[key]
-        if vill["playerInfo"]["pid"] in ["100000030", "100000031"]:
-            continue
-        frie = {
-            "uid": vill["playerInfo"]["pid"],
-            "pic_square": vill["playerInfo"]["pic"]
-        }
-        friends.append(frie)
+    friends = static.static_friends()
     for key in __saves:
         vill = __saves[key]
         if vill["playerInfo"]["pid"] == USERID:
@@ -436,31 +420,12 @@ def fb_friends_str(USERID: str) -> list:
 
 def neighbors(USERID: str):
     """Retorna lista de vizinhos para o jogo."""
-    neighbor_list = []
-    for key in __villages:
-        vill = __villages[key]
-        if vill["playerInfo"]["pid"] in ["100000030", "100000031"]:
-            continue
-        neigh = json.loads(json.dumps(vill["playerInfo"]))
-        neigh["xp"] = vill["maps"][0]["xp"]
-        neigh["level"] = vill["maps"][0]["level"]
-        neigh["gold"] = vill["maps"][0]["gold"]
-        neigh["wood"] = vill["maps"][0]["wood"]
-        neigh["oil"] = vill["maps"][0]["oil"]
-        neigh["steel"] = vill["maps"][0]["steel"]
-        neighbor_list.append(neigh)
+    neighbor_list = list(static.static_neighbors())
     for key in __saves:
         vill = __saves[key]
         if vill["playerInfo"]["pid"] == USERID:
             continue
-        neigh = json.loads(json.dumps(vill["playerInfo"]))
-        neigh["xp"] = vill["maps"][0]["xp"]
-        neigh["level"] = vill["maps"][0]["level"]
-        neigh["gold"] = vill["maps"][0]["gold"]
-        neigh["wood"] = vill["maps"][0]["wood"]
-        neigh["oil"] = vill["maps"][0]["oil"]
-        neigh["steel"] = vill["maps"][0]["steel"]
-        neighbor_list.append(neigh)
+        neighbor_list.append(static.neighbor_entry(vill))
     return neighbor_list
 
 
@@ -493,8 +458,13 @@ def save_session(USERID: str):
 
     if is_firebase_enabled():
         try:
+            start = time.perf_counter()
             db = get_firestore_db()
-            db.collection(SAVES_COLLECTION).document(USERID).set(_village_to_firestore(village))
+            with span("serialize"):
+                document = _village_to_firestore(village)
+            with span("storage write"):
+                db.collection(SAVES_COLLECTION).document(USERID).set(document)
+            metrics.save_seconds.observe(time.perf_counter() - start, "firestore")
             print(f" * FIREBASE: Vila {USERID} salva no Firestore.")
         except Exception as e:
             print(f" [!] FIREBASE: Erro ao salvar vila {USERID}: {e}")
@@ -507,8 +477,10 @@ def _save_session_to_disk(USERID: str, village: dict):
     """Fallback: salva vila no disco."""
     from bundle import SAVES_DIR
     file = f"{USERID}.save.json"
-    with open(os.path.join(SAVES_DIR, file), 'w') as f:
-        json.dump(village, f, indent=4)
+    start = time.perf_counter()
+    with span("storage write"), open(os.path.join(SAVES_DIR, file), 'w') as f:
+        codec.dump_pretty(village, f, default=json_default)
+    metrics.save_seconds.observe(time.perf_counter() - start, "disk")
 
 
 # ============================================================
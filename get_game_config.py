@@ -4,9 +4,11 @@ import jsonpatch
 import time
 import datetime
 
+import codec
+
 from bundle import MODS_DIR, CONFIG_DIR, CONFIG_PATCH_DIR
 
-__game_config = json.load(open(os.path.join(CONFIG_DIR, "main.json"), 'r', encoding='utf-8'))
+__game_config = codec.load(open(os.path.join(CONFIG_DIR, "main.json"), 'rb'))
 
 def remove_duplicate_items():
     indexes = {}
@@ -87,7 +89,7 @@ print (" [+] Cleaning config duplicates...")
 remove_duplicate_items()
 
 def get_game_config() -> dict:
-    make_dynamic(__game_config)
+    # Darts dates are kept up to date by the scheduler (see maintenance.py)
     return __game_config
 
 def game_config() -> dict:
@@ -210,94 +212,88 @@ def get_weekly_reward_length() -> int:
 def timestamp_now():
     return int(time.time())
 
-def make_dynamic(config):
+# The darts calendar is the last game's start date (the wrap point), moved to monday 00:00,
+# followed by one game per week. Every len(darts_items) - 1 weeks it wraps: the whole list starts
+# again at the wrap point. Dates are local wall-clock dates, so DST changes don't move them.
+
+__darts_first = None # start of the first darts game in the current cycle
+
+def make_dynamic(config) -> int:
     # darts
+    # returns the timestamp of the next wrap
+    global __darts_first
     if "darts_items" in config:
         # 0 no debug
         # 1 debug wrap dates
         # 2 debug all start dates and prizes
-        # 3 debug everything
         debug = 0
 
-        # grab start date of last item as it is used as the wrap point
         darts_items = config["darts_items"]
-        last_game = darts_items[-1]
-        ts_last = time.mktime(datetime.datetime.strptime(last_game["start_date"], "%Y-%m-%d %H:%M:%S").timetuple())
-        ts_now = timestamp_now()
-
-        # this has to be a loop because working with dates is stupid, and this ensures correct wrapping
-        last_ts = ts_last
-        wraps = 0
-        while ts_now >= last_ts:
-            last_ts = update_darts(darts_items, last_ts, 0, ts_now, debug - 1)
-            wraps += 1
-            if debug > 0:
-                next_wrap = datetime.datetime.fromtimestamp(last_ts).strftime("%Y-%m-%d %H:%M:%S")
-                print(f"[DEBUG] Next darts date wrap is on {next_wrap}")
-
-        if wraps > 0:
+        weeks = len(darts_items) - 1
+        if weeks < 1:
+            return None
+        cycle = datetime.timedelta(weeks=weeks)
+
+        if __darts_first is None:
+            # dates as they are in config: wrap at the last game's start date
+            trigger = datetime.datetime.strptime(darts_items[-1]["start_date"], "%Y-%m-%d %H:%M:%S")
+            wrap_point = darts_base_date(darts_items[-1]["start_date"])
+        else:
+            wrap_point = trigger = __darts_first + cycle
+
+        # how many times it has wrapped since, computed at once
+        now = datetime.datetime.fromtimestamp(timestamp_now())
+        next_wrap = trigger
+        if now >= trigger:
+            wraps = max(0, (now - wrap_point) // cycle) + 1
+            __darts_first = wrap_point + cycle * (wraps - 1)
+            next_wrap = __darts_first + cycle # always after now
+            update_darts(darts_items, __darts_first, debug)
             print(f"[CONFIG] Darts minigame is now dynamic again! - Wrapped {wraps} time(s)!")
 
-# updates darts start dates
-def update_darts(darts_items, ts_first, seconds, ts_now, debug = 0):
-    week_length = 604800
-    shift = seconds
-    last_ts = 0
-    for game in darts_items:
-        # we ignore the date in config and just rebuild dates based on first date in config starting on monday
-        ts = time.mktime(datetime.datetime.strptime(game["start_date"], "%Y-%m-%d %H:%M:%S").timetuple())
-        new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-
-        # account for daylight savings
-        if new_date.hour == 23:
-            shift += 3600
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif new_date.hour == 1:
-            shift -= 3600
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-            
-        # fix to nearest monday
-        weekday = new_date.isoweekday()
-        if weekday == 2:
-            shift -= 86400
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif weekday == 3:
-            shift -= 86400 * 2
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif weekday == 4:
-            shift -= 86400 * 3
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif weekday == 5:
-            shift += 86400 * 3
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif weekday == 6:
-            shift += 86400 * 2
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-        elif weekday == 7:
-            shift += 86400
-            new_date = datetime.datetime.fromtimestamp(ts_first + shift)
-
-        weekday = new_date.isoweekday()
-        new_date = new_date.strftime("%Y-%m-%d %H:%M:%S")
-        if debug >= 1:
+        if debug > 0:
+            print(f"[DEBUG] Next darts date wrap is on {next_wrap}")
+        return int(time.mktime(next_wrap.timetuple()))
+
+def darts_base_date(start_date: str) -> datetime.datetime:
+    date = datetime.datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
+
+    # account for daylight savings
+    if date.hour == 23:
+        date += datetime.timedelta(hours=1)
+    elif date.hour == 1:
+        date -= datetime.timedelta(hours=1)
+
+    # fix to nearest monday
+    weekday = date.isoweekday()
+    if weekday <= 4:
+        date -= datetime.timedelta(days=weekday - 1)
+    else:
+        date += datetime.timedelta(days=8 - weekday)
+    return date
+
+# updates darts start dates, one week apart from first
+def update_darts(darts_items, first: datetime.datetime, debug = 0):
+    for i, game in enumerate(darts_items):
+        new_date = (first + datetime.timedelta(weeks=i)).strftime("%Y-%m-%d %H:%M:%S")
+        if debug >= 2:
             test = game["start_date"]
-            
+
             # output minor prizes
-            if debug >= 2:
-                game_id = game["id"]
-                print(f"Darts minigame ID: {game_id}")
-
-                idx = 1
-                for unit in game["items"]:
-                    item_id = int(unit)
-                    item = get_item_from_id(item_id)
-                    if item:
-                        item_name = item["name"]
-                    else:
-                        item_name = "INVALID UNIT"
-
-                    print(f"[DEBUG] Minor Prize {idx} = ({item_id}) {item_name}")
-                    idx += 1
+            game_id = game["id"]
+            print(f"Darts minigame ID: {game_id}")
+
+            idx = 1
+            for unit in game["items"]:
+                item_id = int(unit)
+                item = get_item_from_id(item_id)
+                if item:
+                    item_name = item["name"]
+                else:
+                    item_name = "INVALID UNIT"
+
+                print(f"[DEBUG] Minor Prize {idx} = ({item_id}) {item_name}")
+                idx += 1
 
             # output major prize and date change
             major_prize = int(game["extra_item"])
@@ -306,14 +302,8 @@ def update_darts(darts_items, ts_first, seconds, ts_now, debug = 0):
             if item:
                 item_name = item["name"]
 
-            print(f"[DEBUG] {test} -> {new_date} (weekday = {weekday}) -> ({major_prize}) {item_name}")
+            print(f"[DEBUG] {test} -> {new_date} -> ({major_prize}) {item_name}")
 
         game["start_date"] = new_date
 
-        # make sure each one lasts exactly 7 days from first one
-        last_ts = ts_first + shift
-        shift += week_length
-
-    return last_ts
-
 make_dynamic(__game_config)
\ No newline at end of file
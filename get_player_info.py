@@ -1,8 +1,10 @@
-from firebase_sessions import session, neighbors, neighbor_session
-from engine import timestamp_now, reset_stuff
+from sessions import session, neighbors, neighbor_session
+from engine import timestamp_now
+from maintenance import apply_resets
+from static_villages import prepared_response
 
 def get_player_info(USERID):
-    # Agora session() vem do firebase_sessions.py e tenta carregar do Firestore
+    # session() vem do firebase_sessions.py quando o Firebase está ativo (server.py substitui sessions)
     user_session = session(str(USERID))
 
     if not user_session:
@@ -19,7 +21,7 @@ def get_player_info(USERID):
     user_session["playerInfo"]["last_logged_in"] = ts_now
 
     # Reset things as some things are taken care of by the server side
-    reset_stuff(user_session)
+    apply_resets(user_session)
 
     # player
     player_info = {
@@ -61,3 +63,19 @@ def get_neighbor_info(userid, map_number):
         "privateState": _session["privateState"]
     }
     return neighbor_info
+
+
+def get_prepared_neighbor_info(userid, map_number):
+    # Static villages and quests never change, their responses are serialized once at load (see static_villages.py)
+    _session = neighbor_session(str(userid))
+    if not _session:
+        return None
+
+    _map_number = map_number if map_number is not None else 0
+    if _map_number >= len(_session["maps"]):
+        _map_number = 0
+
+    prepared = prepared_response(str(userid), _map_number)
+    if not prepared or prepared.village is not _session:
+        return None  # player village
+    return prepared
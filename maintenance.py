@@ -0,0 +1,60 @@
+import threading
+
+from engine import timestamp_now, reset_stuff
+from get_game_config import get_game_config, make_dynamic
+
+# Periodic world maintenance, run by the background scheduler (scheduler.py)
+# - New day (00:00 UTC): market trades are reset
+# - New week (Monday 00:00 UTC): darts targets are reset
+# - Darts calendar wrap: game config darts dates are moved forward
+# Villages are not touched at the boundary, they are only marked as stale and
+# get their resets the next time they are loaded (apply_resets).
+# Each save is stamped with the day it was last reset (privateState["timestampLastReset"]), so a save
+# is only reset once a day even when several gunicorn workers, each with its own scheduler, load it.
+# The stamp is the only record: a save reloaded from disk before it was saved again gets its resets again.
+# Auction settlement runs on the same scheduler (see auctions.py).
+
+DAY = 86400
+WEEK = 604800
+MONDAY = 259200 # timestamp 0 is a thursday
+
+def day_start(ts: int) -> int:
+    return ts - ts % DAY
+
+def week_start(ts: int) -> int:
+    return ts - (ts + MONDAY) % WEEK
+
+__day_start = day_start(timestamp_now())
+__week_start = week_start(timestamp_now())
+__lock = threading.Lock()
+
+def apply_resets(save: dict):
+    with __lock:
+        privateState = save["privateState"]
+        if privateState.get("timestampLastReset", 0) < __day_start:
+            reset_stuff(save, __day_start, __week_start)
+            privateState["timestampLastReset"] = __day_start
+
+# Jobs
+
+def _new_day(scheduler):
+    global __day_start, __week_start
+    now = timestamp_now()
+    with __lock:
+        __day_start = day_start(now)
+        __week_start = week_start(now)
+    scheduler.schedule(__day_start + DAY, "new day", _new_day, scheduler)
+
+def _darts_wrap(scheduler):
+    next_wrap = make_dynamic(get_game_config())
+    if not next_wrap:
+        return
+    if next_wrap <= timestamp_now():
+        # Would run again right away, forever
+        print(f" [!] Next darts wrap ({next_wrap}) is not in the future, checking again in an hour")
+        next_wrap = timestamp_now() + 3600
+    scheduler.schedule(next_wrap, "darts wrap", _darts_wrap, scheduler)
+
+def start_maintenance(scheduler):
+    _new_day(scheduler)
+    _darts_wrap(scheduler)
@@ -0,0 +1,197 @@
+import threading
+
+# Secondary indexes for map["items"]
+# Items are stored as map["items"][str(index)] = [item_id, x, y, timestamp, orientation, store, attr, player]
+# Lookups by item id, by player team and by grid cell would otherwise need a full scan of the items.
+# The index lives on the items container itself: the first lookup swaps a plain dict for an
+# IndexedItems (a dict, so saves and responses stay plain JSON), and CompactItems has a slot for it.
+# The container keeps the index in step with every assignment and deletion, and the index goes
+# away with its map.
+# Items are also edited in place (item[1] = x). Each indexed entry remembers the fields it was
+# indexed with, IndexedItems marks every item it hands out as touched, and the next lookup
+# re-checks the touched items (all of them after values() or items()). CompactItems items are
+# ItemViews, which update the index themselves. An item reference kept across a lookup and
+# edited after it must be assigned back (map["items"][key] = item), as map_move_item does.
+
+class MapIndex():
+    __slots__ = ("items", "indexed", "touched", "everything", "by_id", "by_owned_id", "by_player", "by_cell", "lock")
+
+    def __init__(self, items):
+        self.items = items
+        self.lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            # Buckets are dicts used as insertion-ordered sets of item keys
+            self.indexed = {} # key -> fields it is indexed with
+            self.by_id = {}
+            self.by_owned_id = {}
+            self.by_player = {}
+            self.by_cell = {}
+            for key, item in self.items.items():
+                self.add(key, item)
+            self.touched = set()
+            self.everything = False
+
+    def add(self, key: str, item):
+        fields = (item[0], item[1], item[2], item[7])
+        with self.lock:
+            self.indexed[key] = fields
+            _bucket(self.by_id, fields[0])[key] = None
+            if fields[3]:
+                _bucket(self.by_owned_id, fields[0])[key] = None
+            _bucket(self.by_player, fields[3])[key] = None
+            _bucket(self.by_cell, (fields[1], fields[2]))[key] = None
+
+    def remove(self, key: str):
+        with self.lock:
+            fields = self.indexed.pop(key, None)
+            if fields is None:
+                return
+            _discard(self.by_id, fields[0], key)
+            if fields[3]:
+                _discard(self.by_owned_id, fields[0], key)
+            _discard(self.by_player, fields[3], key)
+            _discard(self.by_cell, (fields[1], fields[2]), key)
+
+    def update(self, key: str, item):
+        # Item edited in place
+        with self.lock:
+            if self.indexed.get(key) != (item[0], item[1], item[2], item[7]):
+                self.remove(key)
+                self.add(key, item)
+
+    def sync(self):
+        # Re-checks the items handed out since the last lookup
+        if not self.touched and not self.everything:
+            return
+        with self.lock:
+            keys = list(self.indexed) if self.everything else list(self.touched)
+            self.touched = set()
+            self.everything = False
+            items = self.items
+            get = dict.get if isinstance(items, dict) else type(items).get # dict.get doesn't touch the item again
+            for key in keys:
+                item = get(items, key)
+                if item is None:
+                    self.remove(key)
+                else:
+                    self.update(key, item)
+
+def _bucket(buckets: dict, value) -> dict:
+    bucket = buckets.get(value)
+    if bucket is None:
+        bucket = {}
+        buckets[value] = bucket
+    return bucket
+
+def _discard(buckets: dict, value, key: str):
+    bucket = buckets.get(value)
+    if bucket is None:
+        return
+    bucket.pop(key, None)
+    if not bucket:
+        del buckets[value]
+
+class IndexedItems(dict):
+    # map["items"] once it has been indexed
+    __slots__ = ("index",)
+
+    def __init__(self, items: dict):
+        super().__init__(items)
+        self.index = None
+
+    def __reduce__(self):
+        # Copies (copy.deepcopy, pickle) are plain items, indexed again on their first lookup
+        return (IndexedItems, (dict(self),))
+
+    def __getitem__(self, key: str):
+        item = dict.__getitem__(self, key)
+        if self.index is not None:
+            self.index.touched.add(key)
+        return item
+
+    def get(self, key: str, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        if self.index is not None:
+            self.index.everything = True
+        return dict.values(self)
+
+    def items(self):
+        if self.index is not None:
+            self.index.everything = True
+        return dict.items(self)
+
+    def __setitem__(self, key: str, item: list):
+        index = self.index
+        if index is not None:
+            with index.lock:
+                index.remove(key)
+                index.add(key, item)
+                dict.__setitem__(self, key, item)
+                # The caller still holds the item
+                index.touched.add(key)
+            return
+        dict.__setitem__(self, key, item)
+
+    def __delitem__(self, key: str):
+        self.pop(key)
+
+    def pop(self, key: str, *default):
+        index = self.index
+        if index is not None and key in self:
+            with index.lock:
+                item = dict.pop(self, key)
+                index.remove(key)
+                return item
+        return dict.pop(self, key, *default)
+
+    # Not used by engine.py, but they must not bypass the index either
+    def update(self, *args, **kwargs):
+        for key, item in dict(*args, **kwargs).items():
+            self[key] = item
+
+    def clear(self):
+        dict.clear(self)
+        if self.index is not None:
+            self.index.rebuild()
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key: str, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> dict:
+        # Shares the item lists
+        if self.index is not None:
+            self.index.everything = True
+        return dict(dict.items(self))
+
+# Lookup
+
+__swap_lock = threading.Lock()
+
+def get_index(map: dict, build: bool = True) -> MapIndex:
+    items = map["items"]
+    index = getattr(items, "index", None)
+    if index is None:
+        if not build:
+            return None
+        with __swap_lock:
+            items = map["items"]
+            if type(items) == dict:
+                items = map["items"] = IndexedItems(items)
+            if items.index is None:
+                items.index = MapIndex(items)
+            index = items.index
+    index.sync()
+    return index
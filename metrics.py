@@ -0,0 +1,144 @@
+import os
+import hmac
+import bisect
+import threading
+
+from flask import request
+
+# Server metrics in the Prometheus text exposition format, served at /metrics (see server.py)
+# Modules create their metrics once, at import time, and update them on the request path:
+#   commands = metrics.counter("sw_commands_total", "Commands run by command.php", ["cmd"])
+#   commands.inc("buy")
+# Values that already live somewhere else (queue lengths, codec.stats...) are read when
+# /metrics is rendered, through callback().
+# Values are per process: under gunicorn each worker reports its own.
+# /metrics is off unless METRICS_TOKEN is set, and scrapes must send it as a bearer token
+# (Prometheus: authorization: {credentials: ...}). The client address is not trusted: behind
+# a reverse proxy on the same host every request comes from 127.0.0.1.
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+__metrics = [] # in registration order
+
+def authorized() -> bool:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(METRICS_TOKEN) and scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != float("inf") else "+Inf"
+    return str(value)
+
+class Counter():
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: list = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {} # label values -> count
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            yield self.name + _labels(self.labels, label_values), value
+
+class Histogram():
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: list = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {} # label values -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * len(self.buckets), 0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = [(label_values, (list(counts), total, count)) for label_values, (counts, total, count) in self.values.items()]
+        for label_values, (counts, total, count) in values:
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + _labels(self.labels, label_values, f'le="{_number(float(bucket))}"'), cumulative
+            yield self.name + "_bucket" + _labels(self.labels, label_values, 'le="+Inf"'), count
+            yield self.name + "_sum" + _labels(self.labels, label_values), total
+            yield self.name + "_count" + _labels(self.labels, label_values), count
+
+class Callback():
+    def __init__(self, name: str, help: str, fn, labels: list = (), kind: str = "gauge"):
+        # fn() returns the value, or {label values: value} when there are labels
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        values = self.fn()
+        if not self.labels:
+            values = {(): values}
+        for label_values, value in values.items():
+            yield self.name + _labels(self.labels, label_values), value
+
+def _register(metric):
+    __metrics.append(metric)
+    return metric
+
+def counter(name: str, help: str, labels: list = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+def histogram(name: str, help: str, labels: list = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+def callback(name: str, help: str, fn, labels: list = (), kind: str = "gauge") -> Callback:
+    return _register(Callback(name, help, fn, labels, kind))
+
+def render() -> str:
+    lines = []
+    for metric in __metrics:
+        try:
+            samples = list(metric.samples())
+        except Exception as e:
+            print(f" [!] Metric {metric.name} failed: {e}")
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in samples:
+            lines.append(f"{sample} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# Shared metrics
+# Every cache (sessions, neighbor responses, asset mirror) counts its lookups here: hit ratio = hit / (hit + miss)
+cache_requests = counter("sw_cache_requests_total", "Cache lookups by cache and result (hit, miss, load)", ["cache", "result"])
+save_seconds = histogram("sw_save_seconds", "Time to write a village, by backend (disk, firestore)", ["backend"])
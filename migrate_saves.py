@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import codec
+from bundle import SAVES_DIR
+from version import version_code, needs_migration, migrate_loaded_save
+
+# Offline save migrator
+# Upgrades every save to the current version at once, instead of lazily when each save is accessed.
+# Run it with the server stopped:
+#   python migrate_saves.py [--workers N] [--dry-run]          saves/ folder
+#   python migrate_saves.py --firestore [--workers N] [--dry-run]   Firestore "saves" collection
+
+def is_valid_save(save: dict) -> bool:
+    return isinstance(save, dict) and "playerInfo" in save and "maps" in save and "privateState" in save
+
+def _write_save(file: str, save: dict):
+    # Same format as sessions.save_session()
+    tmp = file + ".tmp"
+    with open(tmp, 'w', encoding="utf-8") as f:
+        codec.dump_pretty(save, f, ensure_ascii=False)
+    os.replace(tmp, file)
+
+def migrate_file(file: str, dry_run: bool) -> str:
+    try:
+        with open(file, "rb") as f:
+            save = codec.load(f)
+    except (OSError, ValueError) as e: # ValueError: corrupted JSON, NaN/Infinity or bad UTF-8
+        return f"error: {e}"
+    if not is_valid_save(save):
+        return "invalid"
+    if not needs_migration(save):
+        return "current"
+    migrate_loaded_save(save)
+    if not dry_run:
+        _write_save(file, save)
+    return "migrated"
+
+def migrate_document(doc, dry_run: bool) -> str:
+    from firebase_sessions import _firestore_to_village, _village_to_firestore
+    doc_data = doc.to_dict()
+    save = _firestore_to_village(doc_data) if "maps_json" in doc_data else doc_data
+    if not is_valid_save(save):
+        return "invalid"
+    if not needs_migration(save):
+        return "current"
+    migrate_loaded_save(save)
+    if not dry_run:
+        doc.reference.set(_village_to_firestore(save))
+    return "migrated"
+
+class Progress():
+    def __init__(self, total: int = None):
+        self.total = total
+        self.counts = {}
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = 0
+
+    def add(self, name: str, status: str):
+        self.done += 1
+        key = status.split(":")[0]
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if key == "error" or key == "invalid":
+            print(f" [!] {name}: {status}")
+        now = time.perf_counter()
+        if now - self.last >= 1:
+            self.last = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        total = f"/{self.total}" if self.total is not None else ""
+        counts = ", ".join(f"{count} {key}" for key, count in sorted(self.counts.items()))
+        print(f" * {self.done}{total} saves ({counts}) - {self.done / elapsed:.0f} saves/s")
+
+def migrate_saves_dir(workers: int, dry_run: bool):
+    files = [os.path.join(SAVES_DIR, file) for file in os.listdir(SAVES_DIR) if file.endswith(".save.json")]
+    progress = Progress(len(files))
+    # Parsing and dumping JSON is CPU bound: one process per core
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file, status in zip(files, pool.map(migrate_file, files, [dry_run] * len(files), chunksize=16)):
+            progress.add(os.path.basename(file), status)
+    progress.report()
+
+def migrate_firestore(workers: int, dry_run: bool):
+    from firebase_config import init_firebase, get_firestore_db
+    from firebase_sessions import SAVES_COLLECTION
+    if not init_firebase():
+        print(" [!] Could not initialize Firebase.")
+        sys.exit(1)
+    docs = get_firestore_db().collection(SAVES_COLLECTION).stream()
+    progress = Progress()
+    # Mostly waiting on the network: threads, with a bounded number of documents in flight
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for doc in docs:
+            pending.append((doc.id, pool.submit(migrate_document, doc, dry_run)))
+            if len(pending) >= workers * 4:
+                name, future = pending.pop(0)
+                progress.add(name, _result(future))
+        for name, future in pending:
+            progress.add(name, _result(future))
+    progress.report()
+
+def _result(future) -> str:
+    try:
+        return future.result()
+    except Exception as e:
+        return f"error: {e}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Migrate every save to version {version_code}")
+    parser.add_argument("--firestore", action="store_true", help="migrate the Firestore saves collection instead of saves/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallel workers")
+    parser.add_argument("--dry-run", action="store_true", help="don't write anything")
+    args = parser.parse_args()
+
+    print(f" [+] Migrating saves to version {version_code}{' (dry run)' if args.dry_run else ''}...")
+    if args.firestore:
+        migrate_firestore(args.workers, args.dry_run)
+    else:
+        migrate_saves_dir(args.workers, args.dry_run)
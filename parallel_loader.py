@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import codec
+
+# Parallel loading of JSON files at startup (saves, static villages, quests)
+# Files are parsed and validated by a pool of LOADER_WORKERS workers and handed back in order.
+# Pools are only for the startup load (parallel=True); loads done while serving (e.g. the login
+# page reloading the saves) run serially on the calling thread.
+# - LOADER_POOL=process (default): real parallel parsing, one process per worker. Only with the fork
+#   start method: spawn (Windows) would run server.py again in every worker. Falls back to threads
+#   elsewhere, and inside a worker process.
+# - LOADER_POOL=thread: overlaps disk reads only, JSON parsing holds the GIL
+# - LOADER_WORKERS=1: everything on the calling thread, as before
+
+LOADER_WORKERS = int(os.environ.get("LOADER_WORKERS", os.cpu_count() or 1))
+LOADER_POOL = os.environ.get("LOADER_POOL", "process")
+CHUNK_SIZE = 16 # files per process task
+MIN_PARALLEL_FILES = 32 # below this, starting the pool costs more than it saves
+
+def _load_json(file: str, validate=None):
+    # Returns (data, error)
+    try:
+        with open(file, "rb") as f:
+            data = codec.load(f)
+    except json.decoder.JSONDecodeError:
+        return None, "Corrupted JSON."
+    except Exception as e:
+        return None, f"Error: {e}"
+    if validate and not validate(data):
+        return None, "Invalid"
+    return data, None
+
+def _can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods() and multiprocessing.parent_process() is None
+
+def load_json_files(files: list, validate=None, parallel: bool = False, workers: int = None):
+    # Yields (file, data, error) in the order of files
+    workers = workers or LOADER_WORKERS
+    if not parallel or workers <= 1 or len(files) < MIN_PARALLEL_FILES:
+        for file in files:
+            yield (file, *_load_json(file, validate))
+        return
+
+    if LOADER_POOL == "process" and _can_fork():
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        results = pool.map(_load_json, files, [validate] * len(files), chunksize=CHUNK_SIZE)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        results = pool.map(_load_json, files, [validate] * len(files))
+    with pool:
+        for file, (data, error) in zip(files, results):
+            yield file, data, error
+
+def prefetch(iterable, size: int = 64):
+    # Pulls items from iterable (e.g. a Firestore stream) on a background thread,
+    # so the network fetch of the next documents overlaps with processing the current ones
+    items = queue.Queue(maxsize=size)
+    done = object()
+
+    def producer():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        items.put(done)
+
+    threading.Thread(target=producer, name="prefetch", daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+class LoadStats():
+    def __init__(self, what: str):
+        self.what = what
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        print(f" * Loaded {self.count} {self.what} in {elapsed:.2f}s ({self.count / elapsed:.0f} files/s)")
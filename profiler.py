@@ -0,0 +1,187 @@
+import os
+import sys
+import hmac
+import math
+import time
+import threading
+import functools
+from collections import Counter
+
+from flask import current_app, request
+
+# Profiling of the live server, off unless PROFILER_TOKEN is set
+# Requests must carry the token in the X-Profiler-Token header. Reports are collapsed stacks
+# ("frame;frame;frame count" lines), the input of flamegraph.pl, speedscope, inferno...
+# - Sampling profile of the whole process (server.py, /admin/profile):
+#     POST /admin/profile?seconds=10[&interval=10][&wait=1]   start one (interval in ms)
+#     GET  /admin/profile                                       last report (202 while running)
+#   A background thread samples the stacks of every thread, the worker keeps serving meanwhile.
+#   With wait=1 the report is returned when done, only useful on a threaded server.
+#   Under gunicorn each worker process profiles itself (see the X-Profile-Pid header).
+# - Single request profile: a profiled route called with "X-Profile: 1" runs normally, but the
+#   response is its profile (time per stack, in microseconds) instead of its result.
+#   The original status is in the X-Profiled-Status header.
+
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN", "")
+MAX_SECONDS = 120
+MIN_INTERVAL = 0.001
+
+def enabled() -> bool:
+    return bool(PROFILER_TOKEN)
+
+def authorized() -> bool:
+    token = request.headers.get("X-Profiler-Token", "")
+    return enabled() and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _stack(frame) -> list:
+    # root first
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+def folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+# Sampling profiler
+
+class Sampler():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.report = None # (folded text, samples, seconds) of the last profile
+
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds: float, interval: float) -> bool:
+        with self.lock:
+            if self.running():
+                return False
+            self.thread = threading.Thread(target=self._run, args=(seconds, interval), name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def wait(self):
+        if self.thread:
+            self.thread.join()
+
+    def _run(self, seconds: float, interval: float):
+        stacks = Counter()
+        samples = 0
+        me = threading.get_ident()
+        start = time.perf_counter()
+        end = start + seconds
+        while time.perf_counter() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stacks[";".join([names.get(ident, str(ident))] + _stack(frame))] += 1
+            samples += 1
+            time.sleep(interval)
+        self.report = (folded(stacks), samples, time.perf_counter() - start)
+        print(f" * Profile done: {samples} samples in {self.report[2]:.1f}s")
+
+sampler = Sampler()
+
+def profile_route():
+    # /admin/profile, see server.py
+    if not authorized():
+        return ("Not found", 404)
+
+    if request.method == "POST":
+        seconds = _positive_number("seconds", 10)
+        interval = _positive_number("interval", 10)
+        if seconds is None or interval is None:
+            return _text("seconds and interval must be positive numbers\n", 400)
+        seconds = min(seconds, MAX_SECONDS)
+        interval = max(interval / 1000, MIN_INTERVAL)
+        if not sampler.start(seconds, interval):
+            return ("A profile is already running", 409)
+        print(f" [+] Profiling for {seconds:.0f}s, one sample every {interval * 1000:.0f} ms...")
+        if request.values.get("wait") != "1":
+            return _text(f"Profiling for {seconds:.0f}s\n", 202)
+        sampler.wait()
+
+    if sampler.running():
+        return _text("Profile running\n", 202)
+    if sampler.report is None:
+        return ("No profile yet", 404)
+    text, samples, seconds = sampler.report
+    response = _text(text, 200)
+    response.headers["X-Profile-Samples"] = str(samples)
+    response.headers["X-Profile-Seconds"] = f"{seconds:.3f}"
+    return response
+
+def _positive_number(name: str, default: float):
+    # None if the argument is not a finite number above 0 ("abc", "nan", "inf", "-1"...)
+    try:
+        value = float(request.values.get(name, default))
+    except ValueError:
+        return None
+    return value if math.isfinite(value) and value > 0 else None
+
+def _text(text: str, status: int):
+    response = current_app.response_class(text, status=status, mimetype="text/plain")
+    response.headers["X-Profile-Pid"] = str(os.getpid())
+    return response
+
+# Single request profiler
+
+class StackTracer():
+    # Time spent in each stack of the current thread (sys.setprofile), in microseconds.
+    # Exact but slow, only used for one request at a time.
+    def __init__(self):
+        self.stacks = Counter()
+        self.path = []  # frame names, root first
+        self.last = 0
+
+    def start(self):
+        self.last = time.perf_counter_ns()
+        sys.setprofile(self._event)
+
+    def stop(self):
+        sys.setprofile(None)
+        self._charge(time.perf_counter_ns())
+
+    def _charge(self, now: int):
+        if self.path:
+            self.stacks[";".join(self.path)] += (now - self.last) // 1000
+        self.last = now
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        self._charge(now)
+        if event == "call":
+            self.path.append(_frame_name(frame.f_code))
+        elif event == "c_call":
+            self.path.append(f"{getattr(arg, '__qualname__', arg)} (builtin)")
+        elif event in ("return", "c_return", "c_exception") and self.path:
+            self.path.pop()
+
+def profiled(view):
+    # Route decorator for the X-Profile mode
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.headers.get("X-Profile") != "1" or not authorized():
+            return view(*args, **kwargs)
+        tracer = StackTracer()
+        tracer.start()
+        try:
+            result = view(*args, **kwargs)
+        finally:
+            tracer.stop()
+        status = current_app.make_response(result).status_code
+        tracer.stacks = Counter({stack: us for stack, us in tracer.stacks.items() if us > 0})
+        response = _text(folded(tracer.stacks), 200)
+        response.headers["X-Profiled-Status"] = str(status)
+        return response
+    return wrapper
@@ -0,0 +1,41 @@
+import time
+import heapq
+import itertools
+import threading
+import traceback
+
+# Background scheduler
+# One daemon thread runs jobs at their due time (unix timestamp), in order, off the request path.
+# Jobs that need to run again schedule themselves again.
+
+class Scheduler():
+    def __init__(self):
+        self.jobs = [] # heap of (when, seq, name, fn, args)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def schedule(self, when: float, name: str, fn, *args):
+        with self.cond:
+            heapq.heappush(self.jobs, (when, next(self.seq), name, fn, args))
+            self.cond.notify()
+
+    def start(self):
+        if self.thread:
+            return
+        self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.jobs or self.jobs[0][0] > time.time():
+                    self.cond.wait(self.jobs[0][0] - time.time() if self.jobs else None)
+                when, seq, name, fn, args = heapq.heappop(self.jobs)
+            try:
+                fn(*args)
+            except Exception:
+                print(f" [!] Scheduled job {name} failed:")
+                traceback.print_exc()
+
+scheduler = Scheduler()
@@ -9,8 +9,6 @@ import os
 import logging
 import json
 import urllib
-import requests
-import io
 
 if os.name == 'nt':
     os.system("color")
@@ -37,8 +35,6 @@ print(" [+] Loading game config...")
 from get_game_config import get_game_config
 
 print(" [+] Loading players...")
-from get_player_info import get_player_info, get_neighbor_info
-
 # Usar firebase_sessions se Firebase estiver ativo, senão usar sessions original
 if is_firebase_enabled():
     from firebase_sessions import (
@@ -59,19 +55,22 @@ else:
         new_village, fb_friends_str
     )
 
-load_saves()
+from get_player_info import get_player_info, get_neighbor_info, get_prepared_neighbor_info
+
+load_saves(parallel=True)
 print(" [+] Loading static villages...")
 load_static_villages()
 print(" [+] Loading quests...")
 load_quests()
 
 print(" [+] Loading server...")
-from flask import Flask, render_template, send_from_directory, request, redirect, session, send_file, jsonify
+from flask import Flask, render_template, send_from_directory, request, redirect, session, send_file, jsonify, abort, g
 from flask.debughelpers import attach_enctype_error_multidict
 from command import command
+from command_payload import split_data, parse_batch, verify_checksum, PayloadError, COMMAND_CHECKSUM
 from engine import timestamp_now
 from version import version_name
-from bundle import ASSETS_DIR, STUB_DIR, TEMPLATES_DIR, BASE_DIR
+from bundle import ASSETS_DIR, STUB_DIR, TEMPLATES_DIR, BASE_DIR, ASSETS_CACHE_DIR
 from constants import Quests
 
 host = '0.0.0.0'
@@ -81,7 +80,78 @@ app = Flask(__name__)
 import os
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-only")
 
+# JSON responses go through codec.py (same bytes as Flask's provider, faster encoder if available)
+import codec
+from tracing import span
+from flask.json.provider import DefaultJSONProvider
+class CodecJSONProvider(DefaultJSONProvider):
+    def _codec_compatible(self, kwargs: dict) -> bool:
+        return self.ensure_ascii and self.sort_keys and kwargs in ({}, {"separators": (",", ":")})
+
+    def dumps(self, obj, **kwargs):
+        if self._codec_compatible(kwargs):
+            return codec.dumps(obj, default=self.default)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if not kwargs:
+            return codec.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with span("encode"):
+            body = codec.dumpb(obj, default=self.default) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+app.json = CodecJSONProvider(app)
+
+# Compact villages are expanded back to their JSON shape in responses
+from compact_village import json_default
+__flask_json_default = app.json.default
+def __json_default(obj):
+    try:
+        return json_default(obj)
+    except TypeError:
+        return __flask_json_default(obj)
+app.json.default = __json_default
+
+
 
+from static_assets import AssetServer, ASSETS_MAX_AGE
+from asset_mirror import AssetMirror, ASSETS_UPSTREAM, ASSETS_CACHE_MAX_MB
+assets_server = None
+assets_mirror = None
+if ASSETS_UPSTREAM:
+    # LITE-WEIGHT BUILD: assets fetched from upstream and cached on disk
+    print(" [+] Using asset mirror...")
+    assets_mirror = AssetMirror(ASSETS_UPSTREAM, ASSETS_CACHE_DIR, ASSETS_CACHE_MAX_MB * 1048576, ASSETS_MAX_AGE)
+else:
+    # OFFLINE BUILD
+    print(" [+] Building static assets manifest...")
+    from asset_manifest import check_config_assets
+    assets_server = AssetServer("assets", ASSETS_DIR)
+    check_config_assets(assets_server.load_manifest(), get_game_config())
+
+print(" [+] Loading Auction House...")
+from auctions import AuctionHouse
+from sessions import session as player_session
+from scheduler import scheduler
+from maintenance import start_maintenance
+auction_house = AuctionHouse()
+auction_house.start_settlement(scheduler)
+start_maintenance(scheduler)
+scheduler.start()
+
+from command_recorder import command_recorder, COMMAND_LOG
+if command_recorder:
+    print(f" [+] Recording command.php requests to {COMMAND_LOG}")
+
+import profiler
+from profiler import profiled
+if profiler.enabled():
+    print(" [+] Profiler enabled (PROFILER_TOKEN)")
 
 print(" [+] Configuring server routes...")
 
@@ -256,13 +326,12 @@ def css(path):
 
 # Ruffle self-hosted files
 RUFFLE_DIR = os.path.join(BASE_DIR, "ruffle")
+ruffle_server = AssetServer("ruffle", RUFFLE_DIR)
+ruffle_server.load_manifest()
 
 @app.route("/ruffle/<path:path>")
 def ruffle_files(path):
-    response = send_from_directory(RUFFLE_DIR, path)
-    if path.endswith('.wasm'):
-        response.headers['Content-Type'] = 'application/wasm'
-    return response
+    return ruffle_server.send(path, request.accept_encodings)
 
 
 @app.route("/play-ruffle.html")
@@ -284,18 +353,11 @@ def play_ruffle():
 
 @app.route(__STATIC_ROOT + "/<path:path>")
 def static_assets_loader(path):
-    # LITE-WEIGHT BUILD: ASSETS FROM GITHUB
-    if False:
-        cdn = "https://raw.githubusercontent.com/AcidCaos/socialwarriors/main/assets/"
-        try:
-            r = requests.get(cdn + path)
-        except requests.exceptions:
-            return ""
-        m = io.BytesIO(r.content)
-        m.seek(0)
-        return send_file(m, download_name=path.split("/")[-1:][0])
+    # LITE-WEIGHT BUILD: ASSETS FROM UPSTREAM (e.g. ASSETS_UPSTREAM=https://raw.githubusercontent.com/AcidCaos/socialwarriors/main/assets/)
+    if assets_mirror:
+        return assets_mirror.send(path)
     # OFFLINE BUILD
-    return send_from_directory(ASSETS_DIR, path)
+    return assets_server.send(path, request.accept_encodings)
 
 
 ## GAME DYNAMIC
@@ -319,6 +381,7 @@ def get_game_config_response():
 
 
 @app.route(__DYNAMIC_ROOT + "/get_player_info.php", methods=['POST'])
+@profiled
 def get_player_info_response():
     USERID = request.values['USERID']
     user_key = request.values['user_key']
@@ -335,16 +398,26 @@ def get_player_info_response():
     # General Mike
     elif user in ["100000030", "100000031"]:
         app.logger.info(f"[VISIT] USERID {USERID} visiting General Mike ({user}).")
-        return (get_neighbor_info("100000030", map), 200)
+        return neighbor_info_response("100000030", map)
     # Quest Maps
     elif user.startswith("100000"):
         app.logger.info(f"[QUEST] USERID {USERID} loading {Quests.QUEST[user] if user in Quests.QUEST else '?'}({user}).")
-        return (get_neighbor_info(user, map), 200)
+        return neighbor_info_response(user, map)
     # Static Neighbours
     else:
         app.logger.info(f"[VISIT] USERID {USERID} visiting user: {user}.")
+        return neighbor_info_response(user, map)
+
+
+def neighbor_info_response(user, map):
+    prepared = get_prepared_neighbor_info(user, map)
+    metrics.cache_requests.inc("neighbor", "hit" if prepared else "miss")
+    if not prepared:
         return (get_neighbor_info(user, map), 200)
 
+    # Static village or quest: pre-serialized bytes with only the timestamp added
+    return prepared.send(timestamp_now(), request.accept_encodings)
+
 
 @app.route(__DYNAMIC_ROOT + "/sync_error_track.php", methods=['POST'])
 def sync_error_track_response():
@@ -370,18 +443,26 @@ def flash_sync_error_response():
 
 
 @app.route(__DYNAMIC_ROOT + "/command.php", methods=['POST'])
+@profiled
 def command_response():
     USERID = request.values['USERID']
     user_key = request.values['user_key']
     language = request.values['language']
 
     data_str = request.values['data']
-    data_hash = data_str[:64]
-    assert data_str[64] == ';'
-    data_payload = data_str[65:]
-    data = json.loads(data_payload)
+    if command_recorder:
+        command_recorder.record(USERID, user_key, data_str)
+    try:
+        with span("parse"):
+            data_hash, data_payload = split_data(data_str)
+            if COMMAND_CHECKSUM == "log" and not verify_checksum(user_key, data_str):
+                print(f" [!] command.php batch from {USERID}: checksum mismatch")
+            batch = parse_batch(data_payload)
+    except PayloadError as e:
+        print(f" [!] Rejected command.php payload from {USERID}: {e}")
+        return ({"result": "error", "error": str(e)}, 400)
 
-    command(USERID, data)
+    command(USERID, batch)
 
     return ({"result": "success"}, 200)
 
@@ -398,6 +479,99 @@ def alliance():
     return (response, 200)
 
 
+# Auction House (Marketplace)
+@app.route(__DYNAMIC_ROOT + "/auctionhouse/", methods=['POST'])
+def auctionhouse():
+    USERID = request.values['USERID']
+    user_key = request.values['user_key']
+    language = request.values['language']
+    method = request.values['method']
+
+    if method == "get_auctions":
+        level = request.values.get('level', 1, type=int)
+        return ({"result": "ok", "bets": auction_house.get_auctions(USERID, level)}, 200)
+
+    if method == "get_auction_detail":
+        uuid = request.values['uuid']
+        check_finish = request.values.get('checkFinish', 0, type=int)
+        bet = auction_house.get_auction_detail(USERID, uuid, check_finish)
+        if bet is None:
+            return ({"result": "error", "error": "unknown auction"}, 200)
+        return ({"result": "ok", "bet": bet}, 200)
+
+    if method == "set_bet":
+        uuid = request.values['uuid']
+        bet_amount = request.values.get('bet', type=int)
+        bet_round = request.values.get('round', type=int)
+        if bet_amount is None:
+            return ({"result": "error", "error": "invalid bid"}, 200)
+        if bet_round is None:
+            return ({"result": "error", "error": "invalid round"}, 200)
+        save = player_session(USERID)
+        name = save["playerInfo"]["name"] if save else ""
+        pic = save["playerInfo"]["pic"] if save else ""
+        error = auction_house.set_bet(USERID, uuid, bet_amount, bet_round, name, pic)
+        if error:
+            return ({"result": "error", "error": error}, 200)
+        return ({"result": "ok", "bet": auction_house.get_auction_detail(USERID, uuid, 0)}, 200)
+
+    return ({"result": "error", "error": "unknown method"}, 200)
+
+
+#####################
+# METRICS & TRACING #
+#####################
+
+import time
+import metrics
+import tracing
+
+requests_total = metrics.counter("sw_http_requests_total", "HTTP requests by route and status", ["route", "status"])
+request_seconds = metrics.histogram("sw_http_request_seconds", "HTTP request latency by route", ["route"])
+response_bytes = metrics.histogram("sw_http_response_bytes", "HTTP response body size by route", ["route"], metrics.SIZE_BUCKETS)
+metrics.callback("sw_json_codec_total", "JSON codec calls, bytes, seconds and fallbacks (codec.py)", lambda: {(stat,): value for stat, value in codec.stats.items()}, ["stat"], "counter")
+metrics.callback("sw_saves_loaded", "Player villages in memory", lambda: len(all_saves_userid()))
+metrics.callback("sw_scheduler_jobs", "Jobs waiting in the background scheduler", lambda: len(scheduler.jobs))
+metrics.callback("sw_command_log_queue", "command.php records waiting to be written to COMMAND_LOG", lambda: command_recorder.lines.qsize() if command_recorder else 0)
+metrics.callback("sw_auction_state_pending", "1 while an auction state write is waiting", lambda: int(auction_house.dirty))
+if metrics.METRICS_TOKEN:
+    print(" [+] /metrics enabled (METRICS_TOKEN)")
+
+@app.before_request
+def metrics_before_request():
+    g.request_start = time.perf_counter()
+    g.trace = tracing.start_trace()
+
+@app.after_request
+def metrics_after_request(response):
+    route = request.endpoint or "unmatched"
+    requests_total.inc(route, str(response.status_code))
+    if "request_start" in g:
+        request_seconds.observe(time.perf_counter() - g.request_start, route)
+    if response.content_length is not None:
+        response_bytes.observe(response.content_length, route)
+
+    # Tracing (tracing.py)
+    trace = tracing.end_trace() or g.get("trace")
+    if trace:
+        response.headers["X-Trace-Id"] = trace.id
+        app.logger.info(f"[TRACE {trace.id}] {request.method} {request.path} -> {response.status_code} in {trace.elapsed_ms():.1f} ms")
+        tracing.report_slow(trace, f"{request.method} {request.path}")
+    return response
+
+@app.route("/metrics")
+def metrics_response():
+    if not metrics.authorized():
+        abort(404)
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Sampling profiler, off unless PROFILER_TOKEN is set (see profiler.py)
+@app.route("/admin/profile", methods=['GET', 'POST'])
+def profile_response():
+    return profiler.profile_route()
+
+
 ########
 # MAIN #
 ########
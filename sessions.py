@@ -1,14 +1,21 @@
 import json
 import os
+import time
 import copy
 import uuid
 import random
+from collections.abc import Mapping
 from flask import session  # (não usado aqui, mas mantive igual seu)
 from version import version_code
 from engine import timestamp_now
-from version import migrate_loaded_save
-from constants import Quests
-from bundle import VILLAGES_DIR, QUESTS_DIR, SAVES_DIR
+from parallel_loader import load_json_files, LoadStats
+from compact_village import compact_village, json_default
+import static_villages as static
+import codec
+import metrics
+from tracing import span
+from version import migrate_loaded_save, migrate_on_access
+from bundle import VILLAGES_DIR, SAVES_DIR
 
 # === Firebase fallback (novo) ===
 try:
@@ -17,15 +24,14 @@ except Exception:
     load_village_from_firestore = None
 
 
-__villages = {}  # ALL static neighbors
-__quests = {}    # ALL static quests
 __saves = {}     # ALL saved villages
 
 __initial_village = json.load(open(os.path.join(VILLAGES_DIR, "initial.json")))
 
 # Load saved villages
 
-def load_saves():
+def load_saves(parallel: bool = False):
+    # parallel: startup only, see parallel_loader.py
     global __saves
 
     # Empty in memory
@@ -45,68 +51,28 @@ def load_saves():
         exit(1)
 
     # Saves in /saves
-    for file in os.listdir(SAVES_DIR):
+    stats = LoadStats("saves")
+    files = [os.path.join(SAVES_DIR, file) for file in os.listdir(SAVES_DIR)]
+    for path, save, error in load_json_files(files, is_valid_village, parallel):
+        file = os.path.basename(path)
         print(f" * Loading SAVE: village at {file}... ", end='')
-        try:
-            save = json.load(open(os.path.join(SAVES_DIR, file), encoding="utf-8"))
-        except json.decoder.JSONDecodeError:
-            print("Corrupted JSON.")
-            continue
-        except Exception as e:
-            print(f"Error: {e}")
-            continue
-
-        if not is_valid_village(save):
-            print("Invalid Save")
+        if error:
+            print("Invalid Save" if error == "Invalid" else error)
             continue
 
         USERID = str(save["playerInfo"]["pid"])
         print("PLAYER USERID:", USERID)
-        __saves[USERID] = save
-
-        modified = migrate_loaded_save(save)  # check save version for migration
-        if modified:
-            save_session(USERID)
+        __saves[USERID] = compact_village(save) # migrated on first access
+        stats.count += 1
+    stats.report()
 
 
 def load_static_villages():
-    global __villages
-
-    # Empty in memory
-    __villages = {}
-
-    # Static neighbors in /villages
-    for file in os.listdir(VILLAGES_DIR):
-        if file == "initial.json" or not file.endswith(".json"):
-            continue
-        print(f" * Loading STATIC NEIGHBOUR: village at {file}... ", end='')
-        village = json.load(open(os.path.join(VILLAGES_DIR, file), encoding="utf-8"))
-        if not is_valid_village(village):
-            print("Invalid neighbour")
-            continue
-        USERID = str(village["playerInfo"]["pid"])
-        print("STATIC USERID:", USERID)
-        __villages[USERID] = village
+    static.load_static_villages(is_valid_village)
 
 
 def load_quests():
-    global __quests
-
-    # Empty in memory
-    __quests = {}
-
-    # Static quests in /villages/quest
-    for file in os.listdir(QUESTS_DIR):
-        print(f" * Loading ", end='')
-        village = json.load(open(os.path.join(QUESTS_DIR, file), encoding="utf-8"))
-        if not is_valid_village(village):
-            print("Invalid Quest")
-            continue
-        QUESTID = str(village["playerInfo"]["pid"])
-        assert file.split(".")[0] == QUESTID
-        quest_name = Quests.QUEST[QUESTID] if QUESTID in Quests.QUEST else "?"
-        print(quest_name)
-        __quests[QUESTID] = village
+    static.load_quests(is_valid_village)
 
 
 # New village
@@ -129,6 +95,7 @@ def new_village() -> str:
 
     # Migrate it if needed
     migrate_loaded_save(village)
+    compact_village(village)
 
     # Memory saves
     __saves[USERID] = village
@@ -148,7 +115,7 @@ def all_saves_userid() -> list:
 
 def all_userid() -> list:
     "Returns a list of the USERID of every village."
-    return list(__villages.keys()) + list(__saves.keys()) + list(__quests.keys())
+    return list(static.static_villages().keys()) + list(__saves.keys()) + list(static.static_quests().keys())
 
 
 def save_info(USERID: str) -> dict:
@@ -173,37 +140,31 @@ def session(USERID: str) -> dict:
 
     # 1) cache local
     if USERID in __saves:
-        return __saves[USERID]
+        metrics.cache_requests.inc("session", "hit")
+        return migrate_on_access(__saves[USERID])
 
     # 2) fallback Firestore (coleção "saves")
     if load_village_from_firestore:
         vill = load_village_from_firestore(USERID)
         if vill and is_valid_village(vill):
-            __saves[USERID] = vill
-            return vill
+            metrics.cache_requests.inc("session", "load")
+            __saves[USERID] = compact_village(vill)
+            return migrate_on_access(vill)
 
+    metrics.cache_requests.inc("session", "miss")
     return None
 
 
 def neighbor_session(USERID: str) -> dict:
     assert isinstance(USERID, str)
     if USERID in __saves:
-        return __saves[USERID]
-    if USERID in __quests:
-        return __quests[USERID]
-    if USERID in __villages:
-        return __villages[USERID]
+        return migrate_on_access(__saves[USERID])
+    return static.static_quest(USERID) or static.static_village(USERID)
 
 
 def fb_friends_str(USERID: str) -> list:
-    friends = []
     # static villages
-    for key in __villages:
-        vill = __villages[key]
-        if vill["playerInfo"]["pid"] == "100000030" or vill["playerInfo"]["pid"] == "100000031":  # general Mike
-            continue
-        frie = {"uid": vill["playerInfo"]["pid"], "pic_square": vill["playerInfo"]["pic"]}
-        friends += [frie]
+    friends = static.static_friends()
 
     # other players
     for key in __saves:
@@ -217,35 +178,15 @@ def fb_friends_str(USERID: str) -> list:
 
 
 def neighbors(USERID: str):
-    neighbors = []
-
-    # static villages
-    for key in __villages:
-        vill = __villages[key]
-        if vill["playerInfo"]["pid"] == "100000030" or vill["playerInfo"]["pid"] == "100000031":  # general Mike
-            continue
-        neigh = json.loads(json.dumps(vill["playerInfo"]))
-        neigh["xp"] = vill["maps"][0]["xp"]
-        neigh["level"] = vill["maps"][0]["level"]
-        neigh["gold"] = vill["maps"][0]["gold"]
-        neigh["wood"] = vill["maps"][0]["wood"]
-        neigh["oil"] = vill["maps"][0]["oil"]
-        neigh["steel"] = vill["maps"][0]["steel"]
-        neighbors += [neigh]
+    # static villages, built once at load
+    neighbors = list(static.static_neighbors())
 
     # other players
     for key in __saves:
         vill = __saves[key]
         if vill["playerInfo"]["pid"] == USERID:
             continue
-        neigh = json.loads(json.dumps(vill["playerInfo"]))
-        neigh["xp"] = vill["maps"][0]["xp"]
-        neigh["level"] = vill["maps"][0]["level"]
-        neigh["gold"] = vill["maps"][0]["gold"]
-        neigh["wood"] = vill["maps"][0]["wood"]
-        neigh["oil"] = vill["maps"][0]["oil"]
-        neigh["steel"] = vill["maps"][0]["steel"]
-        neighbors += [neigh]
+        neighbors += [static.neighbor_entry(vill)]
 
     return neighbors
 
@@ -266,7 +207,7 @@ def is_valid_village(save: dict):
             return False
         if "items" not in m:
             return False
-        if type(m["items"]) != dict:
+        if not isinstance(m["items"], Mapping): # dict, or CompactItems once loaded
             return False
 
     return True
@@ -285,6 +226,8 @@ def save_session(USERID: str):
     if not village:
         print("Skipped (no session).")
         return
-    with open(os.path.join(SAVES_DIR, file), 'w', encoding="utf-8") as f:
-        json.dump(village, f, indent=4, ensure_ascii=False)
+    start = time.perf_counter()
+    with span("storage write"), open(os.path.join(SAVES_DIR, file), 'w', encoding="utf-8") as f:
+        codec.dump_pretty(village, f, default=json_default, ensure_ascii=False) # serialized while written
+    metrics.save_seconds.observe(time.perf_counter() - start, "disk")
     print("Done.")
@@ -0,0 +1,118 @@
+import os
+import sys
+import gzip
+
+from flask import current_app, request, abort
+from werkzeug.wsgi import wrap_file
+
+from bundle import ASSETS_VARIANTS_DIR, ASSETS_MANIFEST_DIR
+from asset_manifest import build_manifest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static files (game assets, ruffle) with long-lived caching
+# - Files are served from the manifest built at startup (asset_manifest.py), without a stat per request
+# - ETags are content hashes, so they survive redeploys and differ when a file is replaced
+# - Cache-Control: "public, no-cache": clients revalidate with the ETag and get a 304 while the file is unchanged.
+#   Fingerprinted URLs (?v=<content hash, or at least its first 8 characters>) can't change, so they
+#   get "public, max-age=ASSETS_MAX_AGE, immutable" instead
+# - If-None-Match and Range requests are answered by werkzeug's make_conditional
+# - Pre-built .br/.gz variants (python static_assets.py --precompress) are sent when the client accepts
+#   them (q > 0), the one with the highest q first, br on a tie
+# Files added after startup are not served until the next restart.
+
+ASSETS_MAX_AGE = int(os.environ.get("ASSETS_MAX_AGE", 31536000)) # 1 year
+
+COMPRESSIBLE = (".swf", ".js", ".wasm", ".xml", ".json", ".map", ".css", ".html", ".txt")
+MIN_SAVINGS = 0.05 # Variants that don't save at least 5% are not written
+MIN_FINGERPRINT = 8 # characters of the content hash a ?v= fingerprint must have
+
+class AssetServer():
+    def __init__(self, name: str, root: str):
+        self.name = name
+        self.root = root
+        self.variants_root = os.path.join(ASSETS_VARIANTS_DIR, name)
+        self.manifest_file = os.path.join(ASSETS_MANIFEST_DIR, f"{name}.json")
+        self.entries = {} # URL path -> AssetEntry
+
+    def load_manifest(self):
+        os.makedirs(ASSETS_MANIFEST_DIR, exist_ok=True)
+        self.entries = build_manifest(self.root, self.manifest_file, self.variants_root)
+        return self.entries
+
+    def send(self, path: str, accept_encodings):
+        entry = self.entries.get(path)
+        if entry is None:
+            abort(404)
+
+        file, size, etag, encoding = entry.file, entry.size, entry.hash, None
+        quality = 0
+        for _encoding in ("br", "gzip"):
+            _quality = accept_encodings.quality(_encoding)
+            if _encoding in entry.variants and _quality > quality:
+                file, size = entry.variants[_encoding]
+                etag = f"{entry.hash}-{_encoding}"
+                encoding = _encoding
+                quality = _quality
+
+        try:
+            f = open(file, "rb")
+        except OSError:
+            abort(404)
+        response = current_app.response_class(wrap_file(request.environ, f), mimetype=entry.mimetype, direct_passthrough=True)
+        response.content_length = size
+        response.last_modified = entry.mtime / 1e9
+        response.set_etag(etag)
+        response.cache_control.public = True
+        fingerprint = request.args.get("v", "")
+        if len(fingerprint) >= MIN_FINGERPRINT and entry.hash.startswith(fingerprint):
+            response.cache_control.max_age = ASSETS_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        response.headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+
+    def all_paths(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                file = os.path.join(dirpath, filename)
+                yield os.path.relpath(file, self.root).replace(os.sep, "/"), file
+
+    def precompress(self):
+        written = 0
+        skipped = 0
+        for path, file in self.all_paths():
+            if not path.endswith(COMPRESSIBLE):
+                continue
+            with open(file, "rb") as f:
+                data = f.read()
+            variants = [(".gz", gzip.compress(data, 9, mtime=0))]
+            if brotli:
+                variants.append((".br", brotli.compress(data, quality=11)))
+            for ext, compressed in variants:
+                if len(compressed) > len(data) * (1 - MIN_SAVINGS):
+                    skipped += 1
+                    continue
+                variant = os.path.join(self.variants_root, path + ext)
+                os.makedirs(os.path.dirname(variant), exist_ok=True)
+                with open(variant, "wb") as f:
+                    f.write(compressed)
+                written += 1
+        print(f" * {self.name}: {written} variant(s) written, {skipped} skipped (not worth it).")
+
+if __name__ == "__main__":
+    # python static_assets.py --precompress
+    from bundle import ASSETS_DIR, BASE_DIR
+    if "--precompress" not in sys.argv:
+        print("Usage: python static_assets.py --precompress")
+        sys.exit(1)
+    if not brotli:
+        print(" [!] brotli not installed, only writing .gz variants")
+    AssetServer("assets", ASSETS_DIR).precompress()
+    AssetServer("ruffle", os.path.join(BASE_DIR, "ruffle")).precompress()
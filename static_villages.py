@@ -0,0 +1,168 @@
+import os
+import json
+import zlib
+import struct
+import hashlib
+
+from flask import current_app
+
+import codec
+
+from constants import Quests
+from bundle import VILLAGES_DIR, QUESTS_DIR
+from parallel_loader import load_json_files, LoadStats
+
+# Static neighbours (/villages) and quests (/villages/quest)
+# Loaded once per process and shared by sessions.py and firebase_sessions.py.
+# This content is READ-ONLY: it is handed out to every request as is, never copy or modify it.
+# Identical maps and privateState are stored once (e.g. General Mike 100000030 and 100000031
+# only differ in their pid), and the neighbour entries are built once at load time.
+# Each gunicorn worker loads its own copy: the app is not preloaded, because the Firestore client
+# and the scheduler threads are created at import time and don't survive a fork.
+
+GENERAL_MIKE = ["100000030", "100000031"]
+
+__villages = {}  # ALL static neighbors
+__quests = {}    # ALL static quests
+__neighbors = [] # neighbour entries of static villages
+__shared = {}    # digest -> shared map/privateState
+__responses = {} # (USERID, map number) -> PreparedResponse
+
+def _shared(obj):
+    digest = hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).digest()
+    return __shared.setdefault(digest, obj)
+
+def _share_village(village: dict) -> dict:
+    if "maps" in village and isinstance(village["maps"], list):
+        village["maps"] = [_shared(map) for map in village["maps"]]
+    if "privateState" in village:
+        village["privateState"] = _shared(village["privateState"])
+    return village
+
+def load_static_villages(is_valid_village):
+    global __villages, __neighbors
+
+    # Empty in memory
+    __villages = {}
+
+    stats = LoadStats("static villages")
+    files = [os.path.join(VILLAGES_DIR, file) for file in sorted(os.listdir(VILLAGES_DIR)) if file != "initial.json" and file.endswith(".json")]
+    for path, village, error in load_json_files(files, is_valid_village, parallel=True):
+        print(f" * Loading STATIC NEIGHBOUR: village at {os.path.basename(path)}... ", end='')
+        if error:
+            print("Invalid neighbour" if error == "Invalid" else error)
+            continue
+        village = _share_village(village)
+        USERID = str(village["playerInfo"]["pid"])
+        print("STATIC USERID:", USERID)
+        __villages[USERID] = village
+        prepare_responses(USERID, village)
+        stats.count += 1
+    stats.report()
+
+    __neighbors = [neighbor_entry(__villages[key]) for key in __villages if key not in GENERAL_MIKE]
+
+def load_quests(is_valid_village):
+    global __quests
+
+    # Empty in memory
+    __quests = {}
+
+    stats = LoadStats("quests")
+    files = [os.path.join(QUESTS_DIR, file) for file in sorted(os.listdir(QUESTS_DIR)) if file.endswith(".json")]
+    for path, village, error in load_json_files(files, is_valid_village, parallel=True):
+        print(f" * Loading ", end='')
+        if error:
+            print("Invalid Quest" if error == "Invalid" else error)
+            continue
+        village = _share_village(village)
+        QUESTID = str(village["playerInfo"]["pid"])
+        assert os.path.basename(path).split(".")[0] == QUESTID
+        quest_name = Quests.QUEST[QUESTID] if QUESTID in Quests.QUEST else "?"
+        print(quest_name)
+        __quests[QUESTID] = village
+        prepare_responses(QUESTID, village)
+        stats.count += 1
+    stats.report()
+
+# Access functions
+
+def static_village(USERID: str) -> dict:
+    return __villages.get(USERID)
+
+def static_quest(QUESTID: str) -> dict:
+    return __quests.get(QUESTID)
+
+def static_villages() -> dict:
+    return __villages
+
+def static_quests() -> dict:
+    return __quests
+
+def static_neighbors() -> list:
+    return __neighbors
+
+def static_friends() -> list:
+    return [{"uid": __villages[key]["playerInfo"]["pid"], "pic_square": __villages[key]["playerInfo"]["pic"]} for key in __villages if key not in GENERAL_MIKE]
+
+def neighbor_entry(vill: dict) -> dict:
+    neigh = codec.loads(codec.dumpb(vill["playerInfo"]))
+    neigh["xp"] = vill["maps"][0]["xp"]
+    neigh["level"] = vill["maps"][0]["level"]
+    neigh["gold"] = vill["maps"][0]["gold"]
+    neigh["wood"] = vill["maps"][0]["wood"]
+    neigh["oil"] = vill["maps"][0]["oil"]
+    neigh["steel"] = vill["maps"][0]["steel"]
+    return neigh
+
+# Pre-serialized get_player_info.php?user=... responses
+# Same bytes Flask would send for get_neighbor_info() (sorted keys, compact separators, ASCII, trailing newline).
+# "timestamp" sorts last, so a response is a fixed prefix + the timestamp + "}\n".
+# The gzip variant is the prefix deflated once (ending on a full flush, so nothing refers back into it)
+# followed by the deflated tail, and the CRC of the whole body is combined from the prefix CRC.
+
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+class PreparedResponse():
+    __slots__ = ("village", "prefix", "gzip_prefix", "crc", "size")
+
+    def __init__(self, village: dict, map_number: int):
+        self.village = village
+        body = codec.dumpb({
+            "result": "ok",
+            "processed_errors": 0,
+            "playerInfo": village["playerInfo"],
+            "map": village["maps"][map_number],
+            "privateState": village["privateState"]
+        })
+        self.prefix = body[:-1] + b',"timestamp":'
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -15)
+        self.gzip_prefix = _GZIP_HEADER + deflate.compress(self.prefix) + deflate.flush(zlib.Z_FULL_FLUSH)
+        self.crc = zlib.crc32(self.prefix)
+        self.size = len(self.prefix)
+
+    def body(self, timestamp: int) -> bytes:
+        return self.prefix + b"%d}\n" % timestamp
+
+    def gzip_body(self, timestamp: int) -> bytes:
+        tail = b"%d}\n" % timestamp
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -15)
+        trailer = struct.pack("<II", zlib.crc32(tail, self.crc), (self.size + len(tail)) & 0xffffffff)
+        return self.gzip_prefix + deflate.compress(tail) + deflate.flush() + trailer
+
+    def send(self, timestamp: int, accept_encodings):
+        # gzip unless the client refuses it (absent, or q=0)
+        if accept_encodings.quality("gzip") > 0:
+            response = current_app.response_class(self.gzip_body(timestamp), mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = current_app.response_class(self.body(timestamp), mimetype="application/json")
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+def prepare_responses(USERID: str, village: dict):
+    for map_number in range(len(village["maps"])):
+        __responses[(USERID, map_number)] = PreparedResponse(village, map_number)
+
+def prepared_response(USERID: str, map_number: int) -> PreparedResponse:
+    return __responses.get((USERID, map_number))
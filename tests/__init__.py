@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The server modules read ./config, ./villages... at import time: tests run from the repository root
+# python -m pytest tests   or   python -m unittest discover tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,87 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import tests
+import asset_manifest
+from asset_manifest import build_manifest, check_config_assets
+
+class BuildManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.root = os.path.join(self.dir, "files")
+        self.variants = os.path.join(self.dir, "variants")
+        self.manifest = os.path.join(self.dir, "manifest.json")
+        os.makedirs(os.path.join(self.root, "sounds"))
+        self.write("files/a.js", b"a" * 100)
+        self.write("files/sounds/click.mp3", b"mp3")
+
+    def write(self, file: str, data: bytes, mtime_ns: int = None):
+        file = os.path.join(self.dir, file)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "wb") as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(file, ns=(mtime_ns, mtime_ns))
+
+    def build(self) -> dict:
+        return build_manifest(self.root, self.manifest, self.variants)
+
+    def test_entries(self):
+        entries = self.build()
+        self.assertEqual(sorted(entries), ["a.js", "sounds/click.mp3"])
+        entry = entries["a.js"]
+        self.assertEqual(entry.size, 100)
+        self.assertEqual(entry.hash, hashlib.sha1(b"a" * 100).hexdigest())
+        self.assertEqual(entry.mimetype, "text/javascript")
+        self.assertEqual(entries["sounds/click.mp3"].mimetype, "audio/mpeg")
+
+    def test_hashes_are_reused(self):
+        self.build()
+        with open(self.manifest) as f:
+            self.assertEqual(sorted(json.load(f)), ["a.js", "sounds/click.mp3"])
+
+        with mock.patch.object(asset_manifest, "hash_file", side_effect=asset_manifest.hash_file) as hash_file:
+            entries = self.build()
+            hash_file.assert_not_called()
+            self.assertEqual(entries["a.js"].hash, hashlib.sha1(b"a" * 100).hexdigest())
+
+            # Changed file: hashed again
+            self.write("files/a.js", b"b" * 100, mtime_ns=entries["a.js"].mtime + 10 ** 9)
+            entries = self.build()
+            self.assertEqual([call.args[0] for call in hash_file.call_args_list], [entries["a.js"].file])
+            self.assertEqual(entries["a.js"].hash, hashlib.sha1(b"b" * 100).hexdigest())
+
+    def test_corrupted_manifest(self):
+        self.write("manifest.json", b"{not json")
+        self.assertEqual(self.build()["a.js"].hash, hashlib.sha1(b"a" * 100).hexdigest())
+
+    def test_variants_older_than_the_file_are_ignored(self):
+        mtime = os.stat(os.path.join(self.root, "a.js")).st_mtime_ns
+        self.write("variants/a.js.gz", b"gz", mtime_ns=mtime + 10 ** 9)
+        self.write("variants/a.js.br", b"br", mtime_ns=mtime - 10 ** 9)
+        variants = self.build()["a.js"].variants
+        self.assertEqual(variants, {"gzip": (os.path.join(self.variants, "a.js.gz"), 2)})
+
+class CheckConfigAssetsTest(unittest.TestCase):
+    def test_missing(self):
+        entries = dict.fromkeys(["sprites/house.swf", "thumbs/house.jpg", "images/en/chapters/1.jpg", "images/es/banner.png", "sounds/click.mp3"])
+        config = {
+            "items": [{"img_name": "house"}, {"img_name": "tank"}, {"img_name": None}, {}],
+            "images": {"/chapters/1.jpg": "", "/banner.png": "es", "/chapters/2.jpg": "en"},
+            "sounds": [{"file": "click"}, {"file": "boom"}],
+        }
+        self.assertEqual(check_config_assets(entries, config), {
+            "sprites": ["tank"],
+            "thumbs": ["tank"],
+            "images": ["/chapters/2.jpg"],
+            "sounds": ["boom"],
+        })
+
+if __name__ == "__main__":
+    unittest.main()
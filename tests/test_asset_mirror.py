@@ -0,0 +1,110 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from flask import Flask
+
+import tests
+from asset_mirror import AssetMirror, STALE_PART_SECONDS
+
+class AssetMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.upstream = os.path.join(self.dir, "upstream")
+        self.cache = os.path.join(self.dir, "cache")
+        for path, size in (("sprites/a.swf", 1000), ("sprites/b.swf", 1000), ("sounds/c.mp3", 1000)):
+            self.write(os.path.join(self.upstream, path), path.encode() * (size // len(path) + 1))
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/assets/<path:path>", view_func=lambda path: self.mirror.send(path))
+        self.client = self.app.test_client()
+        self.mirror = self.new_mirror()
+
+    def new_mirror(self, max_bytes: int = 10 ** 6) -> AssetMirror:
+        return AssetMirror(self.upstream, self.cache, max_bytes, 3600)
+
+    def write(self, file: str, data: bytes):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "wb") as f:
+            f.write(data)
+
+    def upstream_data(self, path: str) -> bytes:
+        with open(os.path.join(self.upstream, path), "rb") as f:
+            return f.read()
+
+    def cache_files(self) -> list:
+        return sorted(os.path.relpath(os.path.join(dirpath, filename), self.cache).replace(os.sep, "/") for dirpath, dirnames, filenames in os.walk(self.cache) for filename in filenames)
+
+    def test_miss_then_hit(self):
+        response = self.client.get("/assets/sprites/a.swf")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.upstream_data("sprites/a.swf"))
+        self.assertEqual(response.mimetype, "application/x-shockwave-flash")
+        self.assertEqual(response.cache_control.max_age, 3600)
+        response.close()
+        self.assertEqual(self.cache_files(), ["sprites/a.swf"])
+        self.assertEqual(self.mirror.inflight, {})
+
+        # Served from the cache, with an ETag and ranges
+        os.remove(os.path.join(self.upstream, "sprites/a.swf"))
+        response = self.client.get("/assets/sprites/a.swf")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get("/assets/sprites/a.swf", headers={"If-None-Match": etag}).status_code, 304)
+        response = self.client.get("/assets/sprites/a.swf", headers={"Range": "bytes=0-4"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), b"sprit")
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get("/assets/sprites/nope.swf").status_code, 404)
+        self.assertEqual(self.client.get("/assets/../upstream/sprites/a.swf").status_code, 404)
+        self.assertEqual(self.mirror.inflight, {})
+        self.assertEqual(self.cache_files(), [])
+
+    def test_body_never_read(self):
+        # HEAD: the download is released when the response is closed, without a cached file or a .part
+        response = self.client.head("/assets/sprites/a.swf")
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(self.mirror.inflight, {})
+        self.assertEqual(self.cache_files(), [])
+        self.assertEqual(self.client.get("/assets/sprites/a.swf").get_data(), self.upstream_data("sprites/a.swf"))
+
+    def test_waiter_fetches_itself_when_the_leader_fails(self):
+        # Another request is downloading it, and gives up without caching it
+        self.mirror.inflight["sprites/a.swf"] = threading.Event()
+        threading.Timer(0.1, self.mirror._finish, ["sprites/a.swf"]).start()
+        self.assertEqual(self.client.get("/assets/sprites/a.swf").get_data(), self.upstream_data("sprites/a.swf"))
+        self.assertEqual(self.cache_files(), ["sprites/a.swf"])
+
+    def test_least_recently_used_are_evicted(self):
+        self.mirror = self.new_mirror(max_bytes=2500)
+        for path in ("sprites/a.swf", "sprites/b.swf", "sprites/a.swf", "sounds/c.mp3"):
+            self.client.get("/assets/" + path).close()
+        self.assertEqual(self.cache_files(), ["sounds/c.mp3", "sprites/a.swf"])
+        self.assertEqual(list(self.mirror.index), ["sprites/a.swf", "sounds/c.mp3"])
+        self.assertLessEqual(self.mirror.total, 2500)
+
+    def test_cache_is_loaded_at_startup(self):
+        self.client.get("/assets/sprites/a.swf").close()
+        stale = os.path.join(self.cache, "sprites", "b.swf.1.1.part")
+        live = os.path.join(self.cache, "sprites", "c.swf.2.2.part")
+        self.write(stale, b"x")
+        self.write(live, b"x")
+        old = time.time() - STALE_PART_SECONDS - 10
+        os.utime(stale, (old, old))
+
+        mirror = self.new_mirror()
+        self.assertEqual(list(mirror.index), ["sprites/a.swf"])
+        self.assertEqual(mirror.total, len(self.upstream_data("sprites/a.swf")))
+        # Another worker may still be writing the recent one
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(live))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tests import ROOT
+import auctions
+from auctions import AuctionHouse, STATE_WRITE_DELAY, MAX_BID_HISTORY
+
+NOW = 1700000000
+CONFIG = {
+    "uuid": "1",
+    "unit": 1167,
+    "level": 1,
+    "interval": 60, # minutes
+    "price": 1000,
+    "priceIncrement": 200,
+    "betPrice": 2
+}
+
+class AuctionHouseTest(unittest.TestCase):
+    def setUp(self):
+        # AuctionHouse reads ./config and writes ./auctions
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, "config"))
+        with open(os.path.join(self.dir, "config", "auctionhouse.json"), "w") as f:
+            json.dump({"auctions": [CONFIG]}, f)
+        os.chdir(self.dir)
+
+        self.now = NOW
+        self.saves = {}
+        patches = [
+            mock.patch.object(auctions, "timestamp_now", lambda: self.now),
+            mock.patch.object(auctions, "session", self.saves.get),
+            mock.patch.object(auctions, "save_session", lambda user_id: None),
+            mock.patch("atexit.register"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.house = AuctionHouse()
+        self.auction = lambda: self.house.auctions["1"]
+
+    def tearDown(self):
+        os.chdir(ROOT)
+        shutil.rmtree(self.dir)
+
+    def bid(self, user_id: str, amount: int = None, round: int = None):
+        auction = self.auction()
+        amount = auction["currentPrice"] if amount is None else amount
+        round = auction["round"] if round is None else round
+        return self.house.set_bet(user_id, "1", amount, round)
+
+    def add_save(self, user_id: str) -> dict:
+        save = {"playerInfo": {"default_map": 0}, "maps": [{"store": {}}]}
+        self.saves[user_id] = save
+        return save
+
+    def state_file(self) -> dict:
+        with open(self.house.FILE_AH_STATE) as f:
+            return json.load(f)
+
+    def test_created_from_config(self):
+        auction = self.auction()
+        self.assertEqual(auction["round"], 1)
+        self.assertEqual(auction["currentPrice"], 1000)
+        self.assertEqual(auction["endDate"], NOW + 3600)
+        self.assertIn("1", self.state_file()["auctions"])
+
+    def test_state_is_kept_across_restarts(self):
+        self.auction()["round"] = 7
+        self.house.flush() # nothing pending
+        self.assertEqual(self.state_file()["auctions"]["1"]["round"], 1)
+        self.house._write_state()
+        house = AuctionHouse()
+        self.assertEqual(house.auctions["1"]["round"], 7)
+        self.assertEqual(house.due, {"1": NOW + 3600 + 1})
+
+    def test_auctions_not_in_config_are_removed(self):
+        self.auction()["uuid"] = "2"
+        self.house.auctions["2"] = self.house.auctions.pop("1")
+        self.house._write_state()
+        house = AuctionHouse()
+        self.assertEqual(list(house.auctions), ["1"])
+        self.assertEqual(house.auctions["1"]["round"], 1)
+
+    def test_state_writes_are_debounced(self):
+        scheduled = []
+        scheduler = mock.Mock()
+        scheduler.schedule.side_effect = lambda when, name, fn: scheduled.append((when, name, fn))
+        self.house.start_settlement(scheduler)
+        self.assertEqual(scheduled[0][:2], (NOW + 3600 + 1, "auctions"))
+
+        self.auction()["currentPrice"] = 5000
+        with mock.patch("time.time", lambda: NOW):
+            self.house._mark_dirty()
+            self.house._mark_dirty()
+        writes = [entry for entry in scheduled if entry[1] == "auction state"]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(writes[0][0], NOW + STATE_WRITE_DELAY)
+        self.assertEqual(self.state_file()["auctions"]["1"]["currentPrice"], 1000)
+        writes[0][2]()
+        self.assertEqual(self.state_file()["auctions"]["1"]["currentPrice"], 5000)
+        self.assertFalse(self.house.dirty)
+
+    def test_accepted_bid_raises_price(self):
+        self.assertIsNone(self.bid("a", 1000))
+        self.assertEqual(self.auction()["currentPrice"], 1200)
+        self.assertEqual([user["user_id"] for user in self.auction()["betUsers"]], ["a"])
+        self.assertIsNone(self.bid("b", 1500))
+        self.assertEqual(self.auction()["currentPrice"], 1700)
+
+    def test_rejected_bids(self):
+        self.assertEqual(self.house.set_bet("a", "nope", 1000, 1), "unknown auction")
+        self.assertEqual(self.bid("a", round=2), "wrong round")
+        self.assertEqual(self.bid("a", 999), "bid too low")
+        self.assertIsNone(self.bid("a"))
+        self.assertEqual(self.bid("a"), "already winning")
+        self.now = NOW + 3600
+        self.assertEqual(self.bid("b"), "auction finished")
+        self.assertEqual(len(self.auction()["betUsers"]), 1)
+
+    def test_bid_lists_are_replaced_and_capped(self):
+        self.bid("a")
+        bet_users = self.auction()["betUsers"]
+        self.bid("b")
+        self.assertEqual(len(bet_users), 1) # copies handed out before stay as they were
+        for i in range(MAX_BID_HISTORY + 10):
+            self.bid("a" if i % 2 else "b")
+        self.assertEqual(len(self.auction()["betUsers"]), MAX_BID_HISTORY)
+        self.assertEqual(len(self.auction()["bidders"]), MAX_BID_HISTORY)
+
+    def test_concurrent_bids(self):
+        def bidder(user_id: str):
+            for _ in range(200):
+                self.bid(user_id)
+        threads = [threading.Thread(target=bidder, args=(f"user{i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        auction = self.auction()
+        bets = [user["bet"] for user in auction["betUsers"]]
+        users = [user["user_id"] for user in auction["betUsers"]]
+        self.assertTrue(all(b - a >= 200 for a, b in zip(bets, bets[1:])))
+        self.assertTrue(all(a != b for a, b in zip(users, users[1:])))
+        self.assertEqual(auction["currentPrice"], bets[-1] + 200)
+
+    def test_settlement_awards_last_bidder(self):
+        winner = self.add_save("b")
+        self.bid("a")
+        self.bid("b")
+        self.now = NOW + 3600 + 1
+        self.assertTrue(self.house.update_all_auctions(self.now))
+
+        self.assertEqual(winner["maps"][0]["store"], {"1167": 1})
+        auction = self.auction()
+        self.assertEqual(auction["round"], 2)
+        self.assertEqual(auction["currentPrice"], 1000)
+        self.assertEqual(auction["betUsers"], [])
+        self.assertEqual([user["user_id"] for user in auction["betUsersPrev"]], ["a", "b"])
+        self.assertEqual(auction["endDate"], NOW + 2 * 3600)
+        # Written right away, so a restart doesn't give the unit again
+        self.assertEqual(self.state_file()["auctions"]["1"]["round"], 2)
+
+    def test_settlement_only_once(self):
+        winner = self.add_save("a")
+        self.bid("a")
+        self.now = NOW + 3600 + 1
+        self.house.update_all_auctions(self.now)
+        self.assertFalse(self.house.update_all_auctions(self.now))
+        self.assertEqual(winner["maps"][0]["store"], {"1167": 1})
+
+    def test_rounds_missed_while_down(self):
+        self.add_save("a")
+        self.bid("a")
+        self.now = NOW + 3600 + 3 * 3600 + 100 # ended, then 3 more rounds went by
+        self.house.update_all_auctions(self.now)
+        auction = self.auction()
+        self.assertEqual(auction["round"], 5)
+        self.assertEqual(auction["betUsersPrev"], [])
+        self.assertEqual(auction["beginDate"], self.now - 100)
+        self.assertEqual(auction["endDate"], self.now - 100 + 3600)
+
+    def test_not_due_yet(self):
+        self.bid("a")
+        self.assertFalse(self.house.update_all_auctions(NOW + 3600))
+        self.assertEqual(self.auction()["round"], 1)
+
+    def test_detail_flags(self):
+        self.bid("a")
+        self.bid("b")
+        self.assertEqual(self.house.get_auction_detail("b", "1", 0)["isWinning"], 1)
+        self.assertEqual(self.house.get_auction_detail("a", "1", 0)["isWinning"], 0)
+        self.assertIsNone(self.house.get_auction_detail("a", "nope", 0))
+        # Flags go on a copy
+        self.assertNotIn("isWinning", self.auction())
+
+        self.add_save("b")
+        self.now = NOW + 3600 + 1
+        self.house.update_all_auctions(self.now)
+        self.assertEqual(self.house.get_auction_detail("b", "1", 1).get("betWinner"), "b")
+        self.assertIsNone(self.house.get_auction_detail("a", "1", 1).get("betWinner"))
+
+    def test_scheduler_settles_and_reschedules(self):
+        scheduled = []
+        scheduler = mock.Mock()
+        scheduler.schedule.side_effect = lambda when, name, fn: scheduled.append((when, name, fn))
+        winner = self.add_save("a")
+        self.bid("a")
+        self.house.start_settlement(scheduler)
+        when, name, settle = scheduled.pop()
+        self.assertEqual(when, NOW + 3600 + 1)
+
+        self.now = when
+        settle()
+        self.assertEqual(winner["maps"][0]["store"], {"1167": 1})
+        self.assertEqual(self.auction()["round"], 2)
+        self.assertEqual(scheduled[-1][:2], (NOW + 2 * 3600 + 1, "auctions"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import unittest
+from unittest import mock
+
+import tests
+import codec
+
+def reference(obj, default=None) -> str:
+    # What Flask's own provider writes, and what codec.dumps must write
+    return json.dumps(obj, default=default, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+
+BIG_INTS = [2 ** 63 - 1, -2 ** 63, 2 ** 64, -2 ** 64 - 5, 10 ** 30]
+SAMPLES = [
+    {"b": 1, "a": [1, 2.5, None, True, False], "c": {"z": "x", "y": ""}},
+    {"name": "Pequeño guerrero ✓", "emoji": "😀", "del": "\x7f", "ctrl": "\x01\n\t"},
+    [1e-05, 0.0001, 1.5e-07, 1e16, 1.0e22, 123456789.123, -0.0, 0.1, 1 / 3],
+    BIG_INTS,
+    {"1": "string keys", "10": "sorted as strings", "9": "!"},
+    {1: "int keys", 2: "are written as strings"},
+    "text with \"quotes\" and \\ backslashes",
+    [],
+    {},
+    None,
+    "e-5 and 1e+16 inside a string",
+]
+
+class Unserializable():
+    pass
+
+def default(obj):
+    if isinstance(obj, Unserializable):
+        return {"converted": True}
+    raise TypeError("not serializable")
+
+class CodecTest(unittest.TestCase):
+    def modes(self):
+        # stdlib always, orjson when installed
+        yield "stdlib", False
+        if codec.orjson is not None:
+            yield "orjson", True
+
+    def test_dumps_matches_stdlib(self):
+        for mode, use_orjson in self.modes():
+            with mock.patch.object(codec, "USE_ORJSON", use_orjson):
+                for obj in SAMPLES:
+                    with self.subTest(mode=mode, obj=obj):
+                        self.assertEqual(codec.dumps(obj), reference(obj))
+                        self.assertEqual(codec.dumpb(obj), reference(obj).encode())
+
+    def test_default_hook(self):
+        obj = {"x": Unserializable(), "y": [Unserializable()]}
+        for mode, use_orjson in self.modes():
+            with self.subTest(mode=mode), mock.patch.object(codec, "USE_ORJSON", use_orjson):
+                self.assertEqual(codec.dumps(obj, default=default), reference(obj, default))
+                with self.assertRaises(TypeError):
+                    codec.dumps(obj)
+
+    def test_loads_round_trip(self):
+        for mode, use_orjson in self.modes():
+            with mock.patch.object(codec, "USE_ORJSON", use_orjson):
+                for obj in SAMPLES:
+                    if use_orjson and obj is BIG_INTS:
+                        continue # orjson reads integers over 64 bits as floats, see codec.loads
+                    text = reference(obj)
+                    with self.subTest(mode=mode, obj=obj):
+                        self.assertEqual(codec.loads(text), json.loads(text))
+                        self.assertEqual(codec.loads(text.encode()), json.loads(text))
+
+    def test_fallbacks_are_counted(self):
+        if codec.orjson is None:
+            self.skipTest("orjson not installed")
+        with mock.patch.object(codec, "USE_ORJSON", True), mock.patch.dict(codec.stats, {"encode_fallbacks": 0}):
+            codec.dumps({"a": 1})
+            self.assertEqual(codec.stats["encode_fallbacks"], 0)
+            codec.dumps([1e-05])
+            codec.dumps([2 ** 64])
+            self.assertEqual(codec.stats["encode_fallbacks"], 2)
+
+    def test_non_finite_floats_are_rejected(self):
+        for mode, use_orjson in self.modes():
+            with mock.patch.object(codec, "USE_ORJSON", use_orjson):
+                for text in ["NaN", "[Infinity]", '{"a": -Infinity}']:
+                    with self.subTest(mode=mode, text=text), self.assertRaises(ValueError):
+                        codec.loads(text)
+                for value in [float("nan"), float("inf"), float("-inf")]:
+                    with self.subTest(mode=mode, value=value), self.assertRaises(ValueError):
+                        codec.dumps(value)
+        with mock.patch.object(codec, "USE_ORJSON", False), self.assertRaises(ValueError):
+            codec.dumps({"nested": [float("nan")]})
+
+    def test_invalid_json(self):
+        for mode, use_orjson in self.modes():
+            with self.subTest(mode=mode), mock.patch.object(codec, "USE_ORJSON", use_orjson):
+                with self.assertRaises(ValueError):
+                    codec.loads("{")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+import tests
+import command
+import engine
+from command_payload import Command, CommandBatch
+
+NO_RESOURCES = [0] * 8
+
+def sample_save() -> dict:
+    map = {
+        # [item_id, x, y, timestamp, orientation, store, attr, player]
+        "items": {
+            "1": [100, 0, 0, 1000, 0, [], {}, 1],
+            "2": [200, 0, 0, 150, 0, [], {"ts": 900}, 1],
+            "3": [300, 0, 0, 0, 0, [], {"nc": 0}, 1],
+        },
+        "timestamp": 5000,
+        "timestampLastChapter": 5000,
+        "timestampLastTreasure": 5000,
+        "timestampLastTrade": 5000,
+        "questTimes": {"7": 350},
+        "xp": 0, "gold": 0, "wood": 0, "oil": 0, "steel": 0,
+    }
+    return {
+        "playerInfo": {"cash": 0},
+        "maps": [map],
+        "privateState": {
+            "mana": 0,
+            "timestampLastBonus": 5000,
+            "timestampLastAllianceBonus": 5000,
+            "timeStampDartsNewFree": 5000,
+            "tsAttacksReset": 5000,
+            "tsSpyingsReset": 5000,
+            "timeStampDoResearch": [100, 5000],
+        },
+    }
+
+def fast_forward(seconds, resources: list = NO_RESOURCES) -> Command:
+    return Command(0, "fast_forward", [seconds], resources)
+
+def ping() -> Command:
+    return Command(0, "ping", [], NO_RESOURCES)
+
+class FastForwardCoalescingTest(unittest.TestCase):
+    def setUp(self):
+        self.saves = {}
+        patches = [
+            mock.patch.object(command, "session", self.saves.get),
+            mock.patch.object(command, "save_session", lambda USERID: None),
+            mock.patch.object(command, "fast_forward", side_effect=engine.fast_forward),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.fast_forward = command.fast_forward
+
+    def run_batch(self, commands: list) -> dict:
+        self.saves["user"] = sample_save()
+        self.fast_forward.reset_mock()
+        command.command("user", CommandBatch(1, "0", 0, 1, "", commands))
+        return self.saves["user"]
+
+    def run_one_by_one(self, commands: list) -> dict:
+        self.saves["user"] = sample_save()
+        for map_id, cmd, args, resources_changed in commands:
+            command.do_command("user", map_id, cmd, args, resources_changed)
+        return self.saves["user"]
+
+    def test_same_result_as_one_by_one(self):
+        cases = [
+            [fast_forward(100), fast_forward(200)],
+            [fast_forward(100), ping(), fast_forward(50), fast_forward(5000)],
+            [fast_forward(400), fast_forward(400), fast_forward(400)], # clamped at 0 on the way
+            [fast_forward(100), fast_forward(-50), fast_forward(100)], # negative: applied alone
+            [fast_forward(100), fast_forward(100, [0, 0, 5, 0, 0, 0, 0, 0])], # with resources: applied alone
+            [fast_forward(100), Command(0, "fast_forward", [], NO_RESOURCES)], # no seconds: skipped
+        ]
+        for commands in cases:
+            with self.subTest(commands=commands):
+                self.assertEqual(self.run_batch(commands), self.run_one_by_one(commands))
+
+    def test_adjacent_forwards_are_merged(self):
+        self.run_batch([fast_forward(100), fast_forward(200), ping(), fast_forward(50), fast_forward(25)])
+        self.assertEqual([call.args[2] for call in self.fast_forward.call_args_list], [300, 75])
+        self.run_batch([fast_forward(100), fast_forward(-5), fast_forward(100)])
+        self.assertEqual([call.args[2] for call in self.fast_forward.call_args_list], [100, -5, 100])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import hmac
+import hashlib
+import unittest
+from unittest import mock
+
+import tests
+import command_payload
+from command_payload import split_data, parse_batch, payload_checksum, verify_checksum, PayloadError, Command
+
+def batch(*commands, **fields) -> str:
+    return json.dumps({"first_number": 1, "publishActions": "0", "ts": 1700000000, "tries": 1, "accessToken": "", **fields, "commands": list(commands)})
+
+def data(user_key: str, payload: str) -> str:
+    return hmac.new(user_key.encode(), payload.encode(), hashlib.sha256).hexdigest() + ";" + payload
+
+class SplitDataTest(unittest.TestCase):
+    def test_split(self):
+        payload = batch()
+        self.assertEqual(split_data("a" * 64 + ";" + payload), ("a" * 64, payload))
+
+    def test_missing_hash(self):
+        for bad in ["", "{}", "a" * 64, "a" * 63 + ";{}", "a" * 64 + "{}"]:
+            with self.subTest(data=bad), self.assertRaises(PayloadError):
+                split_data(bad)
+
+class ParseBatchTest(unittest.TestCase):
+    def test_fields_and_commands(self):
+        result = parse_batch(batch([0, "buy", [1, 2], [0] * 8], [0, "ping", [], [0] * 8], ts=5))
+        self.assertEqual(result.ts, 5)
+        self.assertEqual(result.first_number, 1)
+        self.assertEqual(result.commands, [Command(0, "buy", [1, 2], [0] * 8), Command(0, "ping", [], [0] * 8)])
+
+    def test_nested_json_arguments(self):
+        result = parse_batch(batch(
+            [0, "set_goals", [7, "[1, 2]"], [0] * 8],
+            [0, "batch_remove", ["[3, 4]"], [0] * 8],
+            [0, "end_quest", ['{"win": 1}'], [0] * 8],
+            [0, "end_attack", ["not json"], [0] * 8],
+            [0, "buy", ["[5]"], [0] * 8], # not a nested JSON command: left as it is
+        ))
+        args = [command.args for command in result.commands]
+        self.assertEqual(args, [[7, [1, 2]], [[3, 4]], [{"win": 1}], [None], ["[5]"]])
+        # Already decoded by the client
+        self.assertEqual(parse_batch(batch([0, "batch_remove", [[3, 4]], [0] * 8])).commands[0].args, [[3, 4]])
+
+    def test_rejected_as_a_whole(self):
+        # A bad command anywhere rejects the batch before the good ones before it are run
+        with self.assertRaisesRegex(PayloadError, "invalid arguments"):
+            parse_batch(batch([0, "buy", [1, 2], [0] * 8], [0, "ping", [], [1.5] * 8], [0, "batch_remove", [5], [0] * 8]))
+
+    def test_extra_command_fields_are_ignored(self):
+        self.assertEqual(parse_batch(batch([0, "ping", [], [0] * 8, "extra"])).commands, [Command(0, "ping", [], [0] * 8)])
+
+    def test_invalid(self):
+        cases = {
+            "invalid JSON": ["{", "[NaN]"],
+            "no commands": ["[]", "{}", '{"commands": {}}'],
+            "invalid command": [
+                batch("ping"),
+                batch([0, "ping", []]),
+                batch([0, 5, [], [0] * 8]),
+                batch([0, "ping", "args", [0] * 8]),
+                batch([0, "ping", [], 0]),
+            ],
+            "invalid map id": [
+                batch(["0", "ping", [], [0] * 8]),
+                batch([0.0, "ping", [], [0] * 8]),
+                batch([True, "ping", [], [0] * 8]),
+                batch([-1, "ping", [], [0] * 8]),
+            ],
+            "invalid resources": [
+                batch([0, "ping", [], [0] * 3]),
+                batch([0, "ping", [], [0] * 9]),
+                batch([0, "ping", [], [0] * 7 + ["5"]]),
+                batch([0, "ping", [], [0] * 7 + [None]]),
+                batch([0, "ping", [], [0] * 7 + [False]]),
+            ],
+            "invalid arguments": [
+                batch([0, "batch_remove", [5], [0] * 8]),
+                batch([0, "batch_remove", ["5"], [0] * 8]),
+                batch([0, "batch_remove", [], [0] * 8]),
+                batch([0, "set_goals", [7], [0] * 8]),
+                batch([0, "set_goals", [7, '{"a": 1}'], [0] * 8]),
+                batch([0, "buy_offer_pack", [1, 2], [0] * 8]),
+                batch([0, "end_quest", ["[1]"], [0] * 8]),
+                batch([0, "end_attack", [[]], [0] * 8]),
+            ],
+        }
+        for error, payloads in cases.items():
+            for payload in payloads:
+                with self.subTest(payload=payload), self.assertRaisesRegex(PayloadError, error):
+                    parse_batch(payload)
+
+class ChecksumTest(unittest.TestCase):
+    def test_matches_hmac_of_payload(self):
+        payload = batch([0, "ping", [], [0] * 8])
+        self.assertEqual(payload_checksum("key", "x" * 64 + ";" + payload), data("key", payload)[:64])
+
+    def test_verify(self):
+        payload = batch([0, "ping", [], [0] * 8])
+        good = data("key", payload)
+        self.assertTrue(verify_checksum("key", good))
+        self.assertTrue(verify_checksum("key", good[:64].upper() + good[64:]))
+        self.assertFalse(verify_checksum("other key", good))
+        self.assertFalse(verify_checksum("key", good[:-2] + "}"))
+        self.assertFalse(verify_checksum("key", "0" * 64 + ";" + payload))
+
+    def test_chunks_give_the_same_checksum(self):
+        payload = batch(*[[0, "move", [i, i, i, "é"], [0] * 8] for i in range(200)])
+        expected = data("key", payload)[:64]
+        for chunk in (1, 7, 1000, 1 << 20):
+            with self.subTest(chunk=chunk), mock.patch.object(command_payload, "HASH_CHUNK", chunk):
+                self.assertEqual(payload_checksum("key", "x" * 64 + ";" + payload), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import copy
+import json
+import pickle
+import unittest
+
+import tests
+from compact_village import CompactItems, ItemView, json_default
+from engine import map_add_item_from_item, map_get_item, map_pop_item, map_move_item, map_find_items, map_find_item, fast_forward
+from sessions import is_valid_village
+
+def sample_items() -> dict:
+    # [item_id, x, y, timestamp, orientation, store, attr, player]
+    return {
+        "1": [100, 10, 12, 1000, 0, [], {}, 1],
+        "2": [100, 20, 22, 2000, 1, [[3, 1]], {"ts": 500}, 1],
+        "3": [200, 30, 32, 0, 0, [], {"nc": 0}, 0],
+        "4": [100, 40, 42, 50, 2, [], {}, 0],
+        "5": [300, 50, 52, 4000, 3, [], {"si": [], "ts": 100}, 1],
+    }
+
+def sample_map(items) -> dict:
+    return {
+        "items": items,
+        "timestamp": 5000,
+        "timestampLastChapter": 5000,
+        "timestampLastTreasure": 5000,
+        "timestampLastTrade": 5000,
+        "questTimes": {"7": 3000},
+        "oil": 0,
+        "steel": 0,
+    }
+
+def sample_save(map: dict) -> dict:
+    return {
+        "playerInfo": {"default_map": 0},
+        "maps": [map],
+        "privateState": {
+            "timestampLastBonus": 5000,
+            "timestampLastAllianceBonus": 5000,
+            "timeStampDartsNewFree": 5000,
+            "tsAttacksReset": 5000,
+            "tsSpyingsReset": 5000,
+            "timeStampDoResearch": [100, 5000],
+        },
+    }
+
+class CompactItemsTest(unittest.TestCase):
+    def setUp(self):
+        # The same map twice: one with plain items, one with compact items
+        self.plain = sample_map(sample_items())
+        self.compact = sample_map(CompactItems(sample_items()))
+        self.maps = (self.plain, self.compact)
+
+    def assertSameItems(self):
+        self.assertEqual(self.compact["items"].to_dict(), self.plain["items"])
+
+    def test_to_dict(self):
+        self.assertSameItems()
+        self.assertEqual(len(self.compact["items"]), 5)
+        self.assertEqual(list(self.compact["items"]), list(self.plain["items"]))
+
+    def test_item_access(self):
+        item = self.compact["items"]["2"]
+        self.assertIsInstance(item, ItemView)
+        self.assertEqual(item, self.plain["items"]["2"])
+        self.assertEqual(list(item), self.plain["items"]["2"])
+        self.assertEqual(item[0], 100)
+        self.assertEqual(item[-1], 1)
+        self.assertEqual(item[1:3], [20, 22])
+        self.assertEqual(len(item), 8)
+        self.assertNotIn("9", self.compact["items"])
+        with self.assertRaises(KeyError):
+            self.compact["items"]["9"]
+
+    def test_set_delete_pop(self):
+        for map in self.maps:
+            map_add_item_from_item(map, 6, [400, 60, 62, 10, 0, [], {}, 1])
+            map_add_item_from_item(map, 1, [101, 11, 13, 11, 1, [], {}, 1]) # replaces
+            map_move_item(map, 3, 33, 34)
+            del map["items"]["4"]
+            self.assertIsNone(map_pop_item(map, 9))
+        popped = map_pop_item(self.compact, 2)
+        self.assertEqual(popped, map_pop_item(self.plain, 2))
+        self.assertIsInstance(popped, list)
+        self.assertSameItems()
+        # Freed rows are reused
+        map_add_item_from_item(self.compact, 7, [500, 0, 0, 0, 0, [], {}, 1])
+        self.assertEqual(len(self.compact["items"]._stores), 6)
+
+    def test_float_coordinates(self):
+        for map in self.maps:
+            map_add_item_from_item(map, 6, [400, 60.5, 62, 10, 0, [], {}, 1])
+            map_move_item(map, 1, 1.25, 2 ** 70)
+        self.assertSameItems()
+        self.assertEqual(map_get_item(self.compact, 6)[1], 60.5)
+
+    def test_store_and_attr_are_kept_by_reference(self):
+        for map in self.maps:
+            store = []
+            attr = {}
+            map_add_item_from_item(map, 6, [400, 60, 62, 10, 0, store, attr, 1])
+            # Filled after the item was added
+            store.append([1, 2])
+            attr["nc"] = 1
+            map_get_item(map, 6)[5].append([3, 4])
+            map_get_item(map, 1)[6]["ts"] = 9
+        self.assertEqual(map_get_item(self.compact, 6)[5], [[1, 2], [3, 4]])
+        self.assertSameItems()
+
+    def test_fast_forward(self):
+        plain = sample_save(self.plain)
+        compact = sample_save(self.compact)
+        fast_forward(plain, self.plain, 1000)
+        fast_forward(compact, self.compact, 1000)
+        self.assertSameItems()
+        self.assertEqual(self.plain["items"]["2"][3], 1000)
+        self.assertEqual(self.plain["items"]["2"][6]["ts"], 0)
+        self.assertEqual(self.plain["items"]["5"][6]["ts"], 0)
+        self.assertEqual(compact["privateState"], plain["privateState"])
+        self.assertEqual({k: v for k, v in self.compact.items() if k != "items"}, {k: v for k, v in self.plain.items() if k != "items"})
+
+    def test_find_items(self):
+        for owned in (True, False):
+            for item_id in (100, 200, 300, 999):
+                with self.subTest(owned=owned, item_id=item_id):
+                    self.assertEqual(map_find_items(self.compact, item_id, owned=owned), map_find_items(self.plain, item_id, owned=owned))
+                    self.assertEqual(map_find_item(self.compact, item_id, owned=owned), map_find_item(self.plain, item_id, owned=owned))
+        self.assertEqual(map_find_items(self.plain, 100), ["1", "2"])
+        self.assertEqual(map_find_items(self.plain, 100, owned=False), ["1", "2", "4"])
+        self.assertEqual(map_find_items(self.plain, 100, limit=1), ["1"])
+
+    def test_index_follows_changes(self):
+        for map in self.maps:
+            map_find_items(map, 100) # builds the index
+            map_add_item_from_item(map, 6, [100, 60, 62, 10, 0, [], {}, 1])
+            map_pop_item(map, 1)
+            map["items"]["2"] = [200, 0, 0, 0, 0, [], {}, 1]
+            self.assertEqual(map_find_items(map, 100), ["6"])
+            self.assertEqual(map_find_items(map, 200), ["2"])
+            # Changed in place, behind the index's back
+            map_get_item(map, 6)[0] = 300
+            self.assertIsNone(map_find_item(map, 100))
+            self.assertEqual(map_find_items(map, 300), ["5", "6"])
+        self.assertSameItems()
+
+    def test_json(self):
+        expected = json.dumps(self.plain, sort_keys=True)
+        self.assertEqual(json.dumps(self.compact, default=json_default, sort_keys=True), expected)
+        self.assertEqual(json.dumps(self.compact["items"]["2"], default=json_default), json.dumps(self.plain["items"]["2"]))
+        with self.assertRaises(TypeError):
+            json.dumps({"a": object()}, default=json_default)
+
+    def test_valid_village(self):
+        self.assertTrue(is_valid_village(sample_save(self.compact)))
+
+    def test_copies_leave_the_index_behind(self):
+        for map in self.maps:
+            map_find_items(map, 100)
+            self.assertIsNotNone(map["items"].index)
+            for copied in (copy.deepcopy(map["items"]), pickle.loads(pickle.dumps(map["items"]))):
+                with self.subTest(type=type(copied).__name__):
+                    self.assertIs(type(copied), type(map["items"]))
+                    self.assertIsNone(copied.index)
+                    self.assertEqual(dict(copied.items()), dict(map["items"].items()))
+                    copied["1"] = [999, 0, 0, 0, 0, [], {}, 1]
+                    self.assertEqual(map_find_items(map, 100), ["1", "2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import datetime
+import unittest
+from unittest import mock
+
+import tests
+import get_game_config
+from get_game_config import make_dynamic
+
+WEEK = datetime.timedelta(weeks=1)
+
+def at(date: str) -> int:
+    return int(time.mktime(datetime.datetime.strptime(date, "%Y-%m-%d %H:%M").timetuple()))
+
+def darts_items(last_start: str, count: int = 5) -> list:
+    # Games one week apart, the last one starting at last_start
+    last = datetime.datetime.strptime(last_start, "%Y-%m-%d %H:%M:%S")
+    return [{"start_date": (last - WEEK * (count - 1 - i)).strftime("%Y-%m-%d %H:%M:%S")} for i in range(count)]
+
+def start_dates(items: list) -> list:
+    return [datetime.datetime.strptime(item["start_date"], "%Y-%m-%d %H:%M:%S") for item in items]
+
+class MakeDynamicTest(unittest.TestCase):
+    def setUp(self):
+        # make_dynamic remembers the current cycle, start from the config dates
+        patch = mock.patch.object(get_game_config, "__darts_first", None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def make_dynamic(self, items: list, now: int) -> int:
+        with mock.patch.object(get_game_config, "timestamp_now", lambda: now):
+            return make_dynamic({"darts_items": items})
+
+    def test_no_wrap_returns_the_pending_trigger(self):
+        # Last game starts on a Thursday: the wrap point is moved back to Monday, already past
+        items = darts_items("2026-02-05 10:00:00")
+        before = [item["start_date"] for item in items]
+        now = at("2026-02-04 12:00")
+        self.assertEqual(self.make_dynamic(items, now), at("2026-02-05 10:00"))
+        self.assertEqual([item["start_date"] for item in items], before)
+
+    def test_wrap_moves_the_calendar(self):
+        items = darts_items("2026-02-02 00:00:00") # a Monday, 4 weeks cycle
+        now = at("2026-02-03 12:00")
+        next_wrap = self.make_dynamic(items, now)
+        dates = start_dates(items)
+        self.assertEqual(dates[0], datetime.datetime(2026, 2, 2))
+        self.assertEqual([b - a for a, b in zip(dates, dates[1:])], [WEEK] * 4)
+        self.assertEqual(next_wrap, at("2026-03-02 00:00"))
+
+    def test_several_wraps_at_once(self):
+        items = darts_items("2026-02-02 00:00:00")
+        now = at("2026-05-01 12:00") # 12 weeks and 4 days after the wrap point: 4 wraps
+        next_wrap = self.make_dynamic(items, now)
+        self.assertEqual(start_dates(items)[0], datetime.datetime(2026, 2, 2) + 3 * 4 * WEEK)
+        self.assertEqual(next_wrap, at("2026-05-25 00:00"))
+
+    def test_next_call_continues_the_cycle(self):
+        items = darts_items("2026-02-02 00:00:00")
+        first_wrap = self.make_dynamic(items, at("2026-02-03 12:00"))
+        # Nothing to do until that wrap
+        self.assertEqual(self.make_dynamic(items, at("2026-02-20 12:00")), first_wrap)
+        self.assertEqual(start_dates(items)[0], datetime.datetime(2026, 2, 2))
+        second_wrap = self.make_dynamic(items, first_wrap)
+        self.assertEqual(start_dates(items)[0], datetime.datetime(2026, 3, 2))
+        self.assertEqual(second_wrap, at("2026-03-30 00:00"))
+
+    def test_next_trigger_is_always_later_than_now(self):
+        for weekday in range(7):
+            last_start = (datetime.datetime(2026, 2, 2, 10) + datetime.timedelta(days=weekday)).strftime("%Y-%m-%d %H:%M:%S")
+            for days in range(-10, 120, 3):
+                with self.subTest(last_start=last_start, days=days):
+                    get_game_config.__dict__["__darts_first"] = None
+                    items = darts_items(last_start)
+                    now = at("2026-02-02 00:00") + days * 86400
+                    next_wrap = self.make_dynamic(items, now)
+                    self.assertGreater(next_wrap, now)
+                    # and the scheduler's next run gives a later one again
+                    self.assertGreater(self.make_dynamic(items, next_wrap), next_wrap)
+
+    def test_not_enough_games(self):
+        self.assertIsNone(self.make_dynamic(darts_items("2026-02-02 00:00:00", 1), at("2026-02-03 00:00")))
+
+if __name__ == "__main__":
+    unittest.main()
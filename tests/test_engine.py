@@ -0,0 +1,61 @@
+import unittest
+from unittest import mock
+
+import tests
+import engine
+from engine import map_lose_units, map_lose_item
+
+RESURRECTABLE = 100
+
+def sample_map() -> dict:
+    # [item_id, x, y, timestamp, orientation, store, attr, player]
+    return {"items": {
+        "1": [100, 0, 0, 0, 0, [], {}, 1],
+        "2": [200, 0, 0, 0, 0, [], {}, 1],
+        "3": [100, 0, 0, 0, 0, [], {}, 0], # enemy
+        "4": [100, 0, 0, 0, 0, [], {}, 1],
+        "5": [200, 0, 0, 0, 0, [], {}, 1],
+        "6": [100, 0, 0, 0, 0, [], {}, 2], # owned, other team
+        "7": [300, 0, 0, 0, 0, [], {}, 1],
+    }}
+
+def lose_one_by_one(map: dict, privateState: dict, units: list):
+    # What end_quest and end_attack did before map_lose_units
+    for unit in units:
+        map_lose_item(map, privateState, unit[0], unit[2] - unit[3])
+
+class MapLoseUnitsTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(engine, "is_resurrectable", lambda item: item == RESURRECTABLE)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_same_as_one_by_one(self):
+        cases = [
+            [],
+            [[100, 3, 3, 1]],
+            [[100, 5, 5, 0], [200, 1, 1, 0]],
+            [[100, 1, 1, 0], [100, 2, 2, 1], [300, 1, 1, 0]], # same unit twice
+            [[200, 9, 9, 0], [400, 1, 1, 0]], # more than there are, and none at all
+            [[100, 1, 0, 1], [200, 1, 1, 1]], # nothing lost
+        ]
+        for units in cases:
+            with self.subTest(units=units):
+                bulk, single = sample_map(), sample_map()
+                bulk_state, single_state = {"deadHeroes": {}}, {"deadHeroes": {}}
+                map_lose_units(bulk, bulk_state, units)
+                lose_one_by_one(single, single_state, units)
+                self.assertCountEqual(bulk["items"], single["items"])
+                self.assertEqual(bulk_state, single_state)
+
+    def test_losses(self):
+        map = sample_map()
+        privateState = {"deadHeroes": {"100": 1}}
+        losses = map_lose_units(map, privateState, [[100, 3, 3, 0], [200, 1, 1, 0], [100, 1, 1, 1]])
+        self.assertEqual(losses, {100: 3, 200: 1})
+        # Enemy units are never lost, units of another team aren't resurrectable
+        self.assertEqual(sorted(map["items"]), ["3", "5", "7"])
+        self.assertEqual(privateState["deadHeroes"], {"100": 3})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import copy
+import datetime
+import unittest
+from unittest import mock
+
+import tests
+import maintenance
+from maintenance import apply_resets, day_start, week_start
+
+def at(date: str) -> int:
+    return int(datetime.datetime.strptime(date, "%Y-%m-%d %H:%M").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def sample_save(last_trade: int, darts_reset: int) -> dict:
+    return {
+        "maps": [{"timestampLastTrade": last_trade, "numTradesDone": 3}],
+        "privateState": {"timeStampDartsReset": darts_reset},
+    }
+
+class Scheduler():
+    def __init__(self):
+        self.jobs = []
+
+    def schedule(self, when, name, fn, *args):
+        self.jobs.append((when, name, fn, args))
+
+class MaintenanceTest(unittest.TestCase):
+    def new_day(self, now: int) -> Scheduler:
+        # What the scheduler runs at 00:00 UTC
+        scheduler = Scheduler()
+        with mock.patch.object(maintenance, "timestamp_now", lambda: now):
+            maintenance._new_day(scheduler)
+        return scheduler
+
+    def setUp(self):
+        self.now = at("2026-02-04 15:00") # a Wednesday
+        self.new_day(self.now)
+        self.addCleanup(self.new_day, maintenance.timestamp_now())
+
+    def test_boundaries(self):
+        self.assertEqual(day_start(self.now), at("2026-02-04 00:00"))
+        self.assertEqual(week_start(self.now), at("2026-02-02 00:00"))
+        self.assertEqual(week_start(at("2026-02-02 00:00")), at("2026-02-02 00:00"))
+        self.assertEqual(week_start(at("2026-02-01 23:59")), at("2026-01-26 00:00"))
+
+    def test_next_day_is_scheduled(self):
+        when, name, fn, args = self.new_day(self.now).jobs[0]
+        self.assertEqual(when, at("2026-02-05 00:00"))
+        self.assertEqual(name, "new day")
+
+    def test_reset_once_a_day(self):
+        save = sample_save(at("2026-02-03 20:00"), at("2026-01-28 10:00"))
+        apply_resets(save)
+        self.assertEqual(save["maps"][0]["numTradesDone"], 0)
+        self.assertEqual(save["privateState"]["timeStampDartsReset"], 0)
+        self.assertEqual(save["privateState"]["timestampLastReset"], at("2026-02-04 00:00"))
+
+        # Same day: not again
+        save["maps"][0]["numTradesDone"] = 2
+        apply_resets(save)
+        self.assertEqual(save["maps"][0]["numTradesDone"], 2)
+
+        # Next day
+        self.new_day(at("2026-02-05 00:00"))
+        apply_resets(save)
+        self.assertEqual(save["maps"][0]["numTradesDone"], 0)
+
+    def test_not_due(self):
+        save = sample_save(at("2026-02-04 09:00"), at("2026-02-02 10:00"))
+        apply_resets(save)
+        self.assertEqual(save["maps"][0]["numTradesDone"], 3)
+        self.assertEqual(save["privateState"]["timeStampDartsReset"], at("2026-02-02 10:00"))
+
+    def test_save_reloaded_before_it_was_saved(self):
+        on_disk = sample_save(at("2026-02-03 20:00"), at("2026-02-02 10:00"))
+        save = copy.deepcopy(on_disk)
+        apply_resets(save)
+        # load_saves() reads the save from disk again, without the stamp
+        save = copy.deepcopy(on_disk)
+        apply_resets(save)
+        self.assertEqual(save["maps"][0]["numTradesDone"], 0)
+        self.assertEqual(save["privateState"]["timestampLastReset"], at("2026-02-04 00:00"))
+
+    def test_darts_wrap_in_the_past(self):
+        scheduler = Scheduler()
+        with mock.patch.object(maintenance, "make_dynamic", lambda config: self.now - 10), mock.patch.object(maintenance, "timestamp_now", lambda: self.now):
+            maintenance._darts_wrap(scheduler)
+        self.assertEqual(scheduler.jobs[0][:2], (self.now + 3600, "darts wrap"))
+
+        scheduler = Scheduler()
+        with mock.patch.object(maintenance, "make_dynamic", lambda config: None):
+            maintenance._darts_wrap(scheduler)
+        self.assertEqual(scheduler.jobs, [])
+
+if __name__ == "__main__":
+    unittest.main()
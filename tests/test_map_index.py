@@ -0,0 +1,107 @@
+import copy
+import pickle
+import unittest
+
+import tests
+from map_index import IndexedItems, get_index
+from engine import map_add_item_from_item, map_get_item, map_pop_item, map_delete_item, map_move_item, map_find_items, map_find_item, map_items_at, map_items_of_player
+
+def sample_map() -> dict:
+    # [item_id, x, y, timestamp, orientation, store, attr, player]
+    return {"items": {
+        "1": [100, 10, 12, 1000, 0, [], {}, 1],
+        "2": [100, 20, 22, 2000, 1, [], {}, 1],
+        "3": [200, 30, 32, 0, 0, [], {}, 0],
+        "4": [100, 40, 42, 50, 2, [], {}, 0],
+        "5": [300, 10, 12, 4000, 3, [], {}, 1],
+    }}
+
+def scan(map: dict, item: int, owned: bool = True) -> list:
+    return [key for key, _item in dict.items(map["items"]) if _item[0] == item and (_item[7] or not owned)]
+
+class MapIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.map = sample_map()
+
+    def assertMatchesScan(self):
+        for item in (100, 200, 300, 400, 999):
+            for owned in (True, False):
+                # Same items, the index lists them in the order they were indexed
+                self.assertCountEqual(map_find_items(self.map, item, owned=owned), scan(self.map, item, owned))
+
+    def test_lookups(self):
+        self.assertEqual(map_find_items(self.map, 100), ["1", "2"])
+        self.assertEqual(map_find_items(self.map, 100, owned=False), ["1", "2", "4"])
+        self.assertEqual(map_find_items(self.map, 100, limit=1), ["1"])
+        self.assertEqual(map_find_item(self.map, 200), None)
+        self.assertEqual(map_find_item(self.map, 200, owned=False), "3")
+        self.assertEqual(map_items_at(self.map, 10, 12), ["1", "5"])
+        self.assertEqual(map_items_at(self.map, 0, 0), [])
+        self.assertEqual(map_items_of_player(self.map, 0), ["3", "4"])
+        # The first lookup swaps in the indexed container, still a dict
+        self.assertIsInstance(self.map["items"], IndexedItems)
+        self.assertIsInstance(self.map["items"], dict)
+
+    def test_helpers_keep_the_index(self):
+        map_find_items(self.map, 100)
+        map_add_item_from_item(self.map, 6, [100, 60, 62, 10, 0, [], {}, 1])
+        map_add_item_from_item(self.map, 2, [400, 20, 22, 10, 0, [], {}, 1]) # replaces
+        map_pop_item(self.map, 1)
+        map_delete_item(self.map, 4)
+        self.assertEqual(map_find_items(self.map, 100, owned=False), ["6"])
+        self.assertEqual(map_find_items(self.map, 400), ["2"])
+        map_move_item(self.map, 5, 1, 2)
+        self.assertEqual(map_items_at(self.map, 10, 12), [])
+        self.assertEqual(map_items_at(self.map, 1, 2), ["5"])
+        self.assertMatchesScan()
+
+    def test_dict_methods_keep_the_index(self):
+        map_find_items(self.map, 100)
+        items = self.map["items"]
+        del items["1"]
+        items.update({"7": [100, 0, 0, 0, 0, [], {}, 1]})
+        items.setdefault("8", [200, 0, 0, 0, 0, [], {}, 1])
+        items.popitem()
+        self.assertMatchesScan()
+        items.clear()
+        self.assertEqual(map_find_items(self.map, 100, owned=False), [])
+
+    def test_items_changed_in_place(self):
+        map_find_items(self.map, 100)
+        # Changed to the searched id, and away from it
+        self.map["items"]["1"][0] = 300
+        self.assertCountEqual(map_find_items(self.map, 300), ["1", "5"])
+        self.assertEqual(map_find_items(self.map, 100), ["2"])
+        self.map["items"].get("3")[7] = 1
+        self.assertEqual(map_find_items(self.map, 200), ["3"])
+        self.assertEqual(map_items_of_player(self.map, 0), ["4"])
+        for item in self.map["items"].values():
+            item[1] += 1
+        self.assertCountEqual(map_items_at(self.map, 11, 12), ["1", "5"])
+        # Added, then edited by the caller
+        item = [500, 0, 0, 0, 0, [], {}, 0]
+        map_add_item_from_item(self.map, 9, item)
+        item[7] = 1
+        self.assertEqual(map_find_items(self.map, 500), ["9"])
+        self.assertMatchesScan()
+
+    def test_copies_leave_the_index_behind(self):
+        map_find_items(self.map, 100)
+        items = self.map["items"]
+        for copied in (copy.deepcopy(items), pickle.loads(pickle.dumps(items))):
+            with self.subTest(copied=type(copied).__name__):
+                self.assertIsInstance(copied, IndexedItems)
+                self.assertIsNone(copied.index)
+                self.assertEqual(copied, items)
+                copied["1"] = [999, 0, 0, 0, 0, [], {}, 1]
+                self.assertEqual(map_find_items(self.map, 100), ["1", "2"])
+
+    def test_no_index_without_lookup(self):
+        self.assertIsNone(get_index(self.map, build=False))
+        self.assertIs(type(self.map["items"]), dict)
+        map_move_item(self.map, 1, 5, 5)
+        self.assertEqual(map_get_item(self.map, 1)[1:3], [5, 5])
+        self.assertIs(type(self.map["items"]), dict)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import tests
+import metrics
+from metrics import Histogram, Callback, render, authorized
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        # Metrics registered by a test are dropped after it
+        patch = mock.patch.object(metrics, "__metrics", [])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_counter(self):
+        counter = metrics.counter("test_total", "Test counter", ["cmd"])
+        counter.inc("buy")
+        counter.inc("buy", amount=2)
+        counter.inc('say "hi"\n')
+        self.assertEqual(render(), "\n".join([
+            "# HELP test_total Test counter",
+            "# TYPE test_total counter",
+            'test_total{cmd="buy"} 3',
+            'test_total{cmd="say \\"hi\\"\\n"} 1',
+        ]) + "\n")
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.samples()), [
+            ('test_seconds_bucket{le="0.1"}', 2),
+            ('test_seconds_bucket{le="1.0"}', 3),
+            ('test_seconds_bucket{le="+Inf"}', 4),
+            ("test_seconds_sum", 3.65),
+            ("test_seconds_count", 4),
+        ])
+
+    def test_callback(self):
+        gauge = metrics.callback("test_queue", "Test gauge", lambda: 7)
+        self.assertIsInstance(gauge, Callback)
+        metrics.callback("test_stats", "Test labels", lambda: {("a",): 1, ("b",): 2.5}, ["stat"], "counter")
+        self.assertEqual(render().splitlines()[2:], [
+            "test_queue 7",
+            "# HELP test_stats Test labels",
+            "# TYPE test_stats counter",
+            'test_stats{stat="a"} 1',
+            'test_stats{stat="b"} 2.5',
+        ])
+
+    def test_failing_metric_is_skipped(self):
+        metrics.callback("test_broken", "Broken", lambda: 1 / 0)
+        metrics.counter("test_total", "Test counter").inc()
+        self.assertEqual(render(), "# HELP test_total Test counter\n# TYPE test_total counter\ntest_total 1\n")
+
+class AuthorizedTest(unittest.TestCase):
+    app = Flask(__name__)
+
+    def check(self, headers: dict, remote_addr: str = "127.0.0.1") -> bool:
+        with self.app.test_request_context("/metrics", headers=headers, environ_base={"REMOTE_ADDR": remote_addr}):
+            return authorized()
+
+    def test_off_without_token(self):
+        with mock.patch.object(metrics, "METRICS_TOKEN", ""):
+            self.assertFalse(self.check({}))
+            self.assertFalse(self.check({"Authorization": "Bearer "}))
+
+    def test_bearer_token(self):
+        with mock.patch.object(metrics, "METRICS_TOKEN", "s3cret"):
+            self.assertTrue(self.check({"Authorization": "Bearer s3cret"}, remote_addr="203.0.113.9"))
+            self.assertTrue(self.check({"Authorization": "bearer s3cret"}))
+            # Loopback is not enough: a local reverse proxy forwards everyone from there
+            self.assertFalse(self.check({}))
+            self.assertFalse(self.check({"Authorization": "Bearer wrong"}))
+            self.assertFalse(self.check({"Authorization": "Basic s3cret"}))
+
+if __name__ == "__main__":
+    unittest.main()
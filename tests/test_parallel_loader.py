@@ -0,0 +1,105 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import tests
+import parallel_loader
+from parallel_loader import load_json_files, prefetch, MIN_PARALLEL_FILES
+
+def is_valid(data) -> bool:
+    # Module level, so process workers can unpickle it
+    return isinstance(data, dict) and "n" in data
+
+class LoadJsonFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.files = []
+        for i in range(MIN_PARALLEL_FILES + 8):
+            file = os.path.join(self.dir, f"{i}.json")
+            with open(file, "w") as f:
+                if i == 3:
+                    f.write("{") # corrupted
+                elif i == 5:
+                    json.dump({"other": i}, f) # invalid
+                else:
+                    json.dump({"n": i, "name": "Zé"}, f)
+            self.files.append(file)
+        self.files.append(os.path.join(self.dir, "missing.json"))
+
+    def check(self, results: list):
+        self.assertEqual([file for file, data, error in results], self.files)
+        for i, (file, data, error) in enumerate(results):
+            if i == 3:
+                self.assertEqual((data, error), (None, "Corrupted JSON."))
+            elif i == 5:
+                self.assertEqual((data, error), (None, "Invalid"))
+            elif i == len(self.files) - 1:
+                self.assertIsNone(data)
+                self.assertTrue(error.startswith("Error:"))
+            else:
+                self.assertEqual((data, error), ({"n": i, "name": "Zé"}, None))
+
+    def load(self, pool: str, **kwargs) -> list:
+        with mock.patch.object(parallel_loader, "LOADER_POOL", pool):
+            return list(load_json_files(self.files, is_valid, **kwargs))
+
+    def test_serial(self):
+        with mock.patch.object(parallel_loader, "ThreadPoolExecutor") as threads, mock.patch.object(parallel_loader, "ProcessPoolExecutor") as processes:
+            self.check(self.load("process", workers=4))
+            self.check(self.load("process", parallel=True, workers=1))
+            threads.assert_not_called()
+            processes.assert_not_called()
+
+    def test_thread_pool(self):
+        self.check(self.load("thread", parallel=True, workers=4))
+
+    def test_process_pool(self):
+        if not parallel_loader._can_fork():
+            self.skipTest("no fork start method")
+        with mock.patch.object(parallel_loader, "ProcessPoolExecutor", wraps=parallel_loader.ProcessPoolExecutor) as processes:
+            self.check(self.load("process", parallel=True, workers=2))
+            processes.assert_called_once()
+
+    def test_process_pool_falls_back_to_threads(self):
+        with mock.patch.object(parallel_loader, "_can_fork", lambda: False), mock.patch.object(parallel_loader, "ProcessPoolExecutor") as processes:
+            self.check(self.load("process", parallel=True, workers=4))
+            processes.assert_not_called()
+
+    def test_few_files_are_loaded_serially(self):
+        self.files = self.files[:MIN_PARALLEL_FILES - 1]
+        with mock.patch.object(parallel_loader, "ThreadPoolExecutor") as threads, mock.patch.object(parallel_loader, "ProcessPoolExecutor") as processes:
+            results = self.load("process", parallel=True, workers=4)
+            threads.assert_not_called()
+            processes.assert_not_called()
+        self.assertEqual(len(results), MIN_PARALLEL_FILES - 1)
+        self.assertEqual(results[5][2], "Invalid")
+
+class PrefetchTest(unittest.TestCase):
+    def test_order(self):
+        self.assertEqual(list(prefetch(range(500), size=8)), list(range(500)))
+
+    def test_runs_ahead_on_another_thread(self):
+        threads = []
+        def source():
+            for i in range(3):
+                threads.append(threading.current_thread())
+                yield i
+        self.assertEqual(list(prefetch(source())), [0, 1, 2])
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_errors_are_raised_by_the_consumer(self):
+        def source():
+            yield 1
+            raise RuntimeError("stream broken")
+        items = prefetch(source())
+        self.assertEqual(next(items), 1)
+        with self.assertRaisesRegex(RuntimeError, "stream broken"):
+            next(items)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import tests
+import profiler
+from profiler import profiled, profile_route, MAX_SECONDS, MIN_INTERVAL
+
+HEADERS = {"X-Profiler-Token": "s3cret"}
+
+class ProfilerRouteTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(profiler, "PROFILER_TOKEN", "s3cret")
+        patch.start()
+        self.addCleanup(patch.stop)
+        # The sampler is not started, only the arguments it gets are checked
+        self.sampler = mock.Mock(spec=profiler.Sampler, report=None)
+        self.sampler.running.return_value = False
+        self.sampler.start.return_value = True
+        patch = mock.patch.object(profiler, "sampler", self.sampler)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        app = Flask(__name__)
+        app.add_url_rule("/admin/profile", view_func=profile_route, methods=["GET", "POST"])
+        app.add_url_rule("/hello", view_func=profiled(lambda: ("hello", 201)))
+        self.client = app.test_client()
+
+    def test_start(self):
+        response = self.client.post("/admin/profile?seconds=1000&interval=0.01", headers=HEADERS)
+        self.assertEqual(response.status_code, 202)
+        self.sampler.start.assert_called_once_with(MAX_SECONDS, MIN_INTERVAL)
+
+        self.sampler.start.reset_mock()
+        self.client.post("/admin/profile", headers=HEADERS)
+        self.sampler.start.assert_called_once_with(10, 0.01)
+
+    def test_bad_arguments(self):
+        for query in ("seconds=abc", "interval=", "seconds=nan", "interval=inf", "seconds=-5", "seconds=0"):
+            with self.subTest(query):
+                response = self.client.post("/admin/profile?" + query, headers=HEADERS)
+                self.assertEqual(response.status_code, 400)
+        self.sampler.start.assert_not_called()
+
+    def test_token_required(self):
+        self.assertEqual(self.client.post("/admin/profile?seconds=abc").status_code, 404)
+        self.assertEqual(self.client.get("/admin/profile", headers={"X-Profiler-Token": "wrong"}).status_code, 404)
+        with mock.patch.object(profiler, "PROFILER_TOKEN", ""):
+            self.assertEqual(self.client.get("/admin/profile", headers={"X-Profiler-Token": ""}).status_code, 404)
+
+    def test_report(self):
+        self.assertEqual(self.client.get("/admin/profile", headers=HEADERS).status_code, 404)
+        self.sampler.report = ("a;b 3\n", 3, 0.5)
+        response = self.client.get("/admin/profile", headers=HEADERS)
+        self.assertEqual(response.get_data(as_text=True), "a;b 3\n")
+        self.assertEqual(response.headers["X-Profile-Samples"], "3")
+        self.sampler.running.return_value = True
+        self.assertEqual(self.client.get("/admin/profile", headers=HEADERS).status_code, 202)
+
+    def test_profiled_route(self):
+        self.assertEqual(self.client.get("/hello", headers={"X-Profile": "1"}).get_data(as_text=True), "hello")
+        response = self.client.get("/hello", headers={"X-Profile": "1", **HEADERS})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Profiled-Status"], "201")
+
+if __name__ == "__main__":
+    unittest.main()
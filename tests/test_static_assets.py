@@ -0,0 +1,106 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask, request
+
+from tests import ROOT
+import static_assets
+from static_assets import AssetServer, ASSETS_MAX_AGE
+
+SCRIPT = b"function house() { return 'House I'; }\n" * 200
+
+class AssetServerTest(unittest.TestCase):
+    def setUp(self):
+        # Variants and manifests are written under ./assets_precompressed and ./assets_manifest
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+        os.makedirs(os.path.join("files", "sprites"))
+        self.write("files/game.js", SCRIPT)
+        self.write("files/sprites/0001_house_1_m.swf", os.urandom(4096)) # doesn't compress
+
+        self.assets = AssetServer("test", "files")
+        self.assets.precompress()
+        self.assets.load_manifest()
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/assets/<path:path>", view_func=lambda path: self.assets.send(path, request.accept_encodings))
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        os.chdir(ROOT)
+        shutil.rmtree(self.dir)
+
+    def write(self, file: str, data: bytes):
+        with open(file, "wb") as f:
+            f.write(data)
+
+    def get(self, path: str, **headers):
+        return self.client.get("/assets/" + path, headers=headers)
+
+    def test_plain_file(self):
+        entry = self.assets.entries["game.js"]
+        response = self.get("game.js", **{"Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), SCRIPT)
+        self.assertEqual(response.content_length, len(SCRIPT))
+        self.assertEqual(response.headers["ETag"], f'"{entry.hash}"')
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertTrue(response.cache_control.public)
+        self.assertTrue(response.cache_control.no_cache)
+        self.assertEqual(self.get("sprites/0001_house_1_m.swf").mimetype, "application/x-shockwave-flash")
+
+    def test_missing(self):
+        self.assertEqual(self.get("nope.js").status_code, 404)
+        self.assertEqual(self.get("../files/game.js").status_code, 404)
+
+    def test_fingerprinted_urls_are_immutable(self):
+        digest = self.assets.entries["game.js"].hash
+        response = self.client.get(f"/assets/game.js?v={digest[:8]}")
+        self.assertEqual(response.cache_control.max_age, ASSETS_MAX_AGE)
+        self.assertTrue(response.cache_control.immutable)
+        for fingerprint in (digest[:7], "0" * 40):
+            response = self.client.get(f"/assets/game.js?v={fingerprint}")
+            self.assertTrue(response.cache_control.no_cache)
+            self.assertIsNone(response.cache_control.max_age)
+
+    def test_revalidation(self):
+        etag = self.get("game.js").headers["ETag"]
+        response = self.get("game.js", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertEqual(self.get("game.js", **{"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_range(self):
+        response = self.get("game.js", **{"Range": "bytes=10-19", "Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), SCRIPT[10:20])
+        self.assertEqual(response.headers["Content-Range"], f"bytes 10-19/{len(SCRIPT)}")
+
+    def test_precompressed_variants(self):
+        entry = self.assets.entries["game.js"]
+        self.assertIn("gzip", entry.variants)
+        self.assertEqual(self.assets.entries["sprites/0001_house_1_m.swf"].variants, {}) # not worth it, and not compressible
+
+        response = self.get("game.js", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["ETag"], f'"{entry.hash}-gzip"')
+        self.assertEqual(gzip.decompress(response.get_data()), SCRIPT)
+
+        for accept_encoding in ("gzip;q=0, identity", "identity", "deflate"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get("game.js", **{"Accept-Encoding": accept_encoding})
+                self.assertNotIn("Content-Encoding", response.headers)
+                self.assertEqual(response.get_data(), SCRIPT)
+
+    def test_brotli_preferred_on_a_tie(self):
+        if not static_assets.brotli:
+            self.skipTest("brotli not installed")
+        self.assertEqual(self.get("game.js", **{"Accept-Encoding": "gzip, br"}).headers["Content-Encoding"], "br")
+        self.assertEqual(self.get("game.js", **{"Accept-Encoding": "gzip, br;q=0.5"}).headers["Content-Encoding"], "gzip")
+
+if __name__ == "__main__":
+    unittest.main()
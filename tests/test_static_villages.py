@@ -0,0 +1,80 @@
+import os
+import gzip
+import json
+import unittest
+
+from flask import Flask, jsonify
+
+import tests
+from bundle import VILLAGES_DIR
+from static_villages import PreparedResponse
+
+TIMESTAMPS = [0, 7, 1700000000, 10 ** 12]
+
+def sample_village() -> dict:
+    map = {"items": {"1": [100, 1, 2, 3, 0, [], {"ts": 5}, 1]}, "xp": 10, "gold": 0.5, "name": "Vila São João ✓", "questTimes": {}}
+    return {"playerInfo": {"pid": "100000099", "name": "Zé"}, "maps": [map, {**map, "xp": 20}], "privateState": {"b": [], "a": None}}
+
+def expected(village: dict, map_number: int, timestamp: int) -> dict:
+    # get_player_info.get_neighbor_info()
+    return {
+        "result": "ok",
+        "processed_errors": 0,
+        "timestamp": timestamp,
+        "playerInfo": village["playerInfo"],
+        "map": village["maps"][map_number],
+        "privateState": village["privateState"]
+    }
+
+class PreparedResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        with open(os.path.join(VILLAGES_DIR, "General_Mike_30.json")) as f:
+            self.villages = [sample_village(), json.load(f)]
+
+    def cases(self):
+        for village in self.villages:
+            for map_number in range(len(village["maps"])):
+                prepared = PreparedResponse(village, map_number)
+                for timestamp in TIMESTAMPS:
+                    with self.subTest(pid=village["playerInfo"]["pid"], map_number=map_number, timestamp=timestamp):
+                        yield prepared, expected(village, map_number, timestamp), timestamp
+
+    def test_body_is_jsonify_output(self):
+        with self.app.app_context():
+            for prepared, response, timestamp in self.cases():
+                self.assertEqual(prepared.body(timestamp), jsonify(response).get_data())
+
+    def test_gzip_body_decompresses_to_body(self):
+        for prepared, response, timestamp in self.cases():
+            # gzip.decompress checks the CRC and the length in the trailer
+            self.assertEqual(gzip.decompress(prepared.gzip_body(timestamp)), prepared.body(timestamp))
+
+    def test_send_honours_accept_encoding(self):
+        prepared = PreparedResponse(self.villages[0], 0)
+        body = prepared.body(1700000000)
+        cases = {
+            "gzip": True,
+            "gzip, deflate, br": True,
+            "br, gzip;q=0.5": True,
+            "*": True,
+            "gzip;q=0, identity": False,
+            "identity": False,
+            "br": False,
+            None: False,
+        }
+        for accept_encoding, gzipped in cases.items():
+            headers = {"Accept-Encoding": accept_encoding} if accept_encoding is not None else {}
+            with self.subTest(accept_encoding=accept_encoding), self.app.test_request_context(headers=headers) as context:
+                response = prepared.send(1700000000, context.request.accept_encodings)
+                self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+                self.assertEqual(response.mimetype, "application/json")
+                if gzipped:
+                    self.assertEqual(response.headers["Content-Encoding"], "gzip")
+                    self.assertEqual(gzip.decompress(response.get_data()), body)
+                else:
+                    self.assertNotIn("Content-Encoding", response.headers)
+                    self.assertEqual(response.get_data(), body)
+
+if __name__ == "__main__":
+    unittest.main()
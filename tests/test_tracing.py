@@ -0,0 +1,90 @@
+import io
+import threading
+import contextlib
+import unittest
+from unittest import mock
+
+import tests
+import tracing
+from tracing import span, start_trace, end_trace, report_slow
+
+class Clock():
+    # time.perf_counter() that moves only when told to
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class TracingTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patch = mock.patch.object(tracing.time, "perf_counter", self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(end_trace)
+
+    def test_nested_spans(self):
+        trace = start_trace()
+        with span("parse"):
+            self.clock.now += 0.002
+        with span("command"):
+            self.clock.now += 0.001
+            with span("save"):
+                self.clock.now += 0.010
+        self.assertIs(end_trace(), trace)
+        self.assertEqual([(name, depth) for name, start, duration, depth in trace.spans], [("parse", 0), ("command", 0), ("save", 1)])
+        self.assertEqual(trace.depth, 0)
+        self.assertAlmostEqual(trace.elapsed_ms(), 13)
+        self.assertEqual(trace.breakdown(), "\n".join([
+            "    parse: 2.00 ms (at +0.00 ms)",
+            "    command: 11.00 ms (at +2.00 ms)",
+            "        save: 10.00 ms (at +3.00 ms)",
+        ]))
+
+    def test_span_closed_by_an_exception(self):
+        trace = start_trace()
+        with self.assertRaises(KeyError):
+            with span("lookup"):
+                self.clock.now += 0.001
+                raise KeyError("x")
+        self.assertEqual(trace.depth, 0)
+        self.assertAlmostEqual(trace.spans[0][2], 0.001)
+
+    def test_no_trace(self):
+        # Outside a request spans do nothing
+        self.assertIsNone(end_trace())
+        with span("startup"):
+            pass
+        # Nor on other threads
+        def job():
+            with span("job"):
+                pass
+        trace = start_trace()
+        thread = threading.Thread(target=job)
+        thread.start()
+        thread.join()
+        self.assertEqual(trace.spans, [])
+        self.assertIs(end_trace(), trace)
+
+    def test_ids_are_unique(self):
+        self.assertNotEqual(start_trace().id, start_trace().id)
+
+    def report(self, slow_ms: float, elapsed_ms: float) -> str:
+        trace = start_trace()
+        with span("save"):
+            self.clock.now += elapsed_ms / 1000
+        out = io.StringIO()
+        with mock.patch.object(tracing, "SLOW_REQUEST_MS", slow_ms), contextlib.redirect_stdout(out):
+            report_slow(trace, "POST /command.php")
+        return out.getvalue()
+
+    def test_report_slow(self):
+        self.assertEqual(self.report(0, 5000), "")
+        self.assertEqual(self.report(100, 99), "")
+        text = self.report(100, 250)
+        self.assertRegex(text.splitlines()[0], r"SLOW REQUEST \[[0-9a-f]{16}\] POST /command.php: 250.0 ms$")
+        self.assertEqual(text.splitlines()[1], "    save: 250.00 ms (at +0.00 ms)")
+
+if __name__ == "__main__":
+    unittest.main()
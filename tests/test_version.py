@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import tests
+import version
+from version import migration, needs_migration, migrate_loaded_save, migrate_on_access, version_code
+from migrate_saves import migrate_file
+
+def old_save() -> dict:
+    # A save from before versions existed
+    return {"playerInfo": {}, "maps": [{"items": {}}], "privateState": {"inventoryItems": []}}
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        # Migrations registered by a test are dropped after it
+        patch = mock.patch.dict(version.__dict__["__migrations"])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_chain_to_current_version(self):
+        save = old_save()
+        self.assertTrue(needs_migration(save))
+        self.assertTrue(migrate_loaded_save(save))
+        self.assertEqual(save["version"], version_code)
+        self.assertEqual(save["privateState"], {"inventoryItems": {}, "deadHeroes": {}, "magics": {}})
+        self.assertEqual(save["maps"][0]["questTimes"], {})
+        # Nothing left to do
+        self.assertFalse(needs_migration(save))
+        self.assertFalse(migrate_loaded_save(save))
+
+    def test_registry(self):
+        steps = []
+
+        @migration(version_code, "test-b")
+        def _to_b(save):
+            steps.append("b")
+            save["b"] = True
+
+        @migration("test-b", "test-c")
+        def _to_c(save):
+            steps.append("c")
+
+        save = old_save()
+        migrate_loaded_save(save)
+        self.assertEqual(steps, ["b", "c"])
+        self.assertEqual(save["version"], "test-c")
+        self.assertTrue(save["b"])
+
+    def test_migrated_on_access_once(self):
+        calls = []
+
+        @migration(version_code, "test-b")
+        def _step(save):
+            calls.append(1)
+
+        save = old_save()
+        save["version"] = version_code
+        threads = [threading.Thread(target=migrate_on_access, args=(save,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(save["version"], "test-b")
+        # Current saves are handed back as they are
+        self.assertIs(migrate_on_access(save), save)
+
+class MigrateFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write(self, name: str, text: str) -> str:
+        file = os.path.join(self.dir, name)
+        with open(file, "w", encoding="utf-8") as f:
+            f.write(text)
+        return file
+
+    def read(self, file: str) -> dict:
+        with open(file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_statuses(self):
+        old = self.write("old.save.json", json.dumps(old_save()))
+        current = self.write("current.save.json", json.dumps({**old_save(), "version": version_code}))
+        invalid = self.write("invalid.save.json", json.dumps({"maps": []}))
+        broken = self.write("broken.save.json", "{")
+        nan = self.write("nan.save.json", json.dumps({**old_save(), "coins": float("nan")}))
+
+        self.assertEqual(migrate_file(old, dry_run=True), "migrated")
+        self.assertNotIn("version", self.read(old))
+        self.assertEqual(migrate_file(old, dry_run=False), "migrated")
+        self.assertEqual(self.read(old)["version"], version_code)
+        self.assertEqual(migrate_file(old, dry_run=False), "current")
+        self.assertEqual(migrate_file(current, dry_run=False), "current")
+        self.assertEqual(migrate_file(invalid, dry_run=False), "invalid")
+        self.assertTrue(migrate_file(broken, dry_run=False).startswith("error"))
+        self.assertTrue(migrate_file(nan, dry_run=False).startswith("error"))
+        self.assertTrue(migrate_file(os.path.join(self.dir, "missing.save.json"), dry_run=False).startswith("error"))
+        self.assertEqual(sorted(os.listdir(self.dir)), ["broken.save.json", "current.save.json", "invalid.save.json", "nan.save.json", "old.save.json"])
+
+    def test_non_ascii_is_kept(self):
+        save = old_save()
+        save["playerInfo"]["name"] = "Zé ✓"
+        file = self.write("old.save.json", json.dumps(save, ensure_ascii=False))
+        migrate_file(file, dry_run=False)
+        self.assertEqual(self.read(file)["playerInfo"]["name"], "Zé ✓")
+
+if __name__ == "__main__":
+    unittest.main()
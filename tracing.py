@@ -0,0 +1,77 @@
+import os
+import time
+import uuid
+import contextvars
+import contextlib
+
+# Request tracing
+# server.py starts a trace for every request; code on the request path marks its steps with
+#   with span("parse"):
+#       ...
+# Spans nest, and cost nothing outside a request (scheduler jobs, startup).
+# Every request gets a trace id (logged, and sent back in X-Trace-Id). With SLOW_REQUEST_MS set,
+# requests slower than that are printed with their span breakdown.
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+
+class Trace():
+    __slots__ = ("id", "start", "spans", "depth")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans = [] # [name, start, duration, depth], in start order
+        self.depth = 0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def breakdown(self) -> str:
+        lines = []
+        for name, start, duration, depth in self.spans:
+            lines.append(f"{'    ' * (depth + 1)}{name}: {duration * 1000:.2f} ms (at +{(start - self.start) * 1000:.2f} ms)")
+        return "\n".join(lines)
+
+class _Span():
+    __slots__ = ("trace", "entry")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.entry = [name, 0, 0, 0]
+
+    def __enter__(self):
+        trace = self.trace
+        self.entry[1] = time.perf_counter()
+        self.entry[3] = trace.depth
+        trace.spans.append(self.entry)
+        trace.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.entry[2] = time.perf_counter() - self.entry[1]
+        self.trace.depth -= 1
+        return False
+
+__current = contextvars.ContextVar("trace", default=None)
+__no_span = contextlib.nullcontext()
+
+def start_trace() -> Trace:
+    trace = Trace()
+    __current.set(trace)
+    return trace
+
+def end_trace() -> Trace:
+    trace = __current.get()
+    __current.set(None)
+    return trace
+
+def span(name: str):
+    trace = __current.get()
+    return _Span(trace, name) if trace is not None else __no_span
+
+def report_slow(trace: Trace, request_line: str):
+    elapsed = trace.elapsed_ms()
+    if SLOW_REQUEST_MS and elapsed >= SLOW_REQUEST_MS:
+        print(f" [!] SLOW REQUEST [{trace.id}] {request_line}: {elapsed:.1f} ms")
+        if trace.spans:
+            print(trace.breakdown())
@@ -1,51 +1,73 @@
+import threading
+
 from engine import timestamp_now
 
 version_name = "alpha 0.02"
 version_code = "0.02a"
 
+# Save migrations
+# Each step upgrades a save from one version to the next, steps are applied in a chain
+# until the save is at version_code. Saves are migrated lazily, the first time they are
+# accessed (see sessions.py), and written with the new version the next time they are saved.
+# To upgrade every save at once, use: python migrate_saves.py
+
+__migrations = {} # from version -> (to version, step)
+__lock = threading.Lock()
+
+def migration(from_version: str, to_version: str):
+    def register(step):
+        __migrations[from_version] = (to_version, step)
+        return step
+    return register
+
+def needs_migration(save: dict) -> bool:
+    return save.get("version") in __migrations
+
 def migrate_loaded_save(save: dict):
-    
-    # 0.01a saves
     _changed = False
-    if "version" not in save or save["version"] is None:
+    while save.get("version") in __migrations:
+        to_version, step = __migrations[save.get("version")]
+        step(save)
+        save["version"] = to_version
         _changed = True
-        save["version"] = "0.01a"
-        print(" [!] Applied version to save")
 
+    return _changed
+
+def migrate_on_access(save: dict) -> dict:
+    if needs_migration(save):
+        with __lock:
+            migrate_loaded_save(save)
+    return save
+
+# 0.01a saves
+@migration(None, "0.01a")
+def _apply_version(save: dict):
+    print(" [!] Applied version to save")
+
+# 0.01a fixes, 0.02a migration
+@migration("0.01a", "0.02a")
+def _migrate_0_01a(save: dict):
     privateState = save["privateState"]
     maps = save["maps"]
 
-    # 0.01a fixes
-    if save["version"] == "0.01a":
-        if "inventoryItems" not in privateState:
-            privateState["inventoryItems"] = None
-        if type(privateState["inventoryItems"]) != dict:
-            _changed = True
-            privateState["inventoryItems"] = {}
-            print(" [!] Applied inventory fix")
-        if "deadHeroes" not in privateState:
-            privateState["deadHeroes"] = None
-        if type(privateState["deadHeroes"]) != dict:
-            _changed = True
-            privateState["deadHeroes"] = {}
-            print(" [!] Applied hospital fix")
-        if "magics" not in privateState:
-            privateState["magics"] = None
-        if type(privateState["magics"]) != dict:
-            _changed = True
-            privateState["magics"] = {}
-            print(" [!] Applied magics fix")
-        for map in maps:
-            if "questTimes" not in map:
-                map["questTimes"] = None
-            if type(map["questTimes"]) != dict:
-                _changed = True
-                map["questTimes"] = {}
-                print(" [!] Applied quest fix")
-    
-    # 0.02a migration
-    if save["version"] == "0.01a":
-        _changed = True
-        save["version"] = "0.02a"
-
-    return _changed
\ No newline at end of file
+    if "inventoryItems" not in privateState:
+        privateState["inventoryItems"] = None
+    if type(privateState["inventoryItems"]) != dict:
+        privateState["inventoryItems"] = {}
+        print(" [!] Applied inventory fix")
+    if "deadHeroes" not in privateState:
+        privateState["deadHeroes"] = None
+    if type(privateState["deadHeroes"]) != dict:
+        privateState["deadHeroes"] = {}
+        print(" [!] Applied hospital fix")
+    if "magics" not in privateState:
+        privateState["magics"] = None
+    if type(privateState["magics"]) != dict:
+        privateState["magics"] = {}
+        print(" [!] Applied magics fix")
+    for map in maps:
+        if "questTimes" not in map:
+            map["questTimes"] = None
+        if type(map["questTimes"]) != dict:
+            map["questTimes"] = {}
+            print(" [!] Applied quest fix")